@@ -0,0 +1,316 @@
+import os
+import random
+import signal
+
+import pygame
+
+from config import (
+    SCREEN_WIDTH, SCREEN_HEIGHT,
+    WHITE, BLACK, RED, GREEN, BLUE,
+    FPS
+)
+from tilemap import TileMap
+from characters import Player, AIPlayer
+from enemies import Enemy
+from knight import Knight
+from bird import Bird
+from rogue import Rogue
+from observation import Observation, PLAYER, ENEMY, KNIGHT, ROGUE
+from sarsa import SARSA
+from snapshot import Snapshotter
+import game_clock
+
+
+def init_headless():
+    # Sprites need a video mode for convert_alpha(); the dummy driver gives
+    # us one without a window. Must be called before any Arena is built.
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pygame.display.quit()
+    pygame.display.init()
+    game_clock.use_simulated_time()
+    return pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+
+def init_worker():
+    # Pool initializer for headless worker processes. SDL turns SIGTERM into
+    # a QUIT event, which would leave Pool.terminate() waiting on the workers.
+    # Workers install the tables they are given, so results never depend on
+    # whichever checkpoints happen to be on disk.
+    init_headless()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    SARSA.load_checkpoints = False
+
+
+class Arena:
+    # One player against the archer, the knight and the bird (and, when
+    # asked for, the rogue). main() drives it with the keyboard; headless
+    # runs use an AIPlayer instead.
+    def __init__(self, ai_player=False, enemy=True, knight=True, bird=True, decision_interval=1,
+                 advance_clock=True, rogue=False):
+        self.tile_map = TileMap()
+        if ai_player:
+            self.player = AIPlayer(250, SCREEN_HEIGHT - 100)
+        else:
+            self.player = Player(250, SCREEN_HEIGHT - 100)
+        self.enemy = Enemy(500, SCREEN_HEIGHT - 100, decision_interval) if enemy else None
+        self.knight = Knight(700, SCREEN_HEIGHT - 100, decision_interval) if knight else None
+        self.bird = Bird(400, SCREEN_HEIGHT - 150, decision_interval) if bird else None
+        self.rogue = Rogue(600, SCREEN_HEIGHT - 100, decision_interval) if rogue else None
+        self.agents = [a for a in (self.enemy, self.knight, self.bird, self.rogue) if a is not None]
+        self.all_sprites = pygame.sprite.Group(self.player, *self.agents)
+        # Shared per-tick snapshot; agents keep a reference to it
+        self.observation = Observation(self.player, self.enemy, self.knight, self.bird, self.rogue)
+        for agent in self.agents:
+            agent.observation = self.observation
+        self.tick = 0
+        self.font = None
+        self.background_surface = None
+        # Arenas stepped side by side share one clock and let their owner advance it
+        self.advance_clock = advance_clock
+        # Built on the first snapshot() or restore()
+        self.snapshotter = None
+
+    def attach_scheduler(self, scheduler):
+        # Share a DecisionScheduler's time budget (the owner calls its
+        # begin_frame() before each step)
+        for agent in self.agents:
+            scheduler.register(agent)
+
+    def seed(self, seed):
+        # Give the scripted player and every agent a random stream of its
+        # own, so that runs (and forks of them, see snapshot.py) replay the
+        # same whatever else draws from the random module
+        if hasattr(self.player, "rng"):
+            self.player.rng = random.Random(f"{seed}/player")
+        for agent in self.agents:
+            if hasattr(agent.sarsa, "seed_rng"):
+                agent.sarsa.seed_rng(f"{seed}/{agent.sarsa.character_type}")
+
+    def snapshot(self):
+        if self.snapshotter is None:
+            self.snapshotter = Snapshotter(self)
+        return self.snapshotter.capture()
+
+    def restore(self, snapshot):
+        if self.snapshotter is None:
+            self.snapshotter = Snapshotter(self)
+        self.snapshotter.restore(snapshot)
+
+    def ai_target(self):
+        # The scripted player goes after the nearest opponent still standing
+        targets = [a for a in self.hostiles() if a.alive]
+        if not targets:
+            return None
+        return min(targets, key=lambda a: abs(a.rect.centerx - self.player.rect.centerx))
+
+    def step(self):
+        # Every entity goes through each phase exactly once per tick:
+        # decide (timers, the previous decision's reward, a new action),
+        # physics (gravity, collisions and carrying out the action), then
+        # combat for everyone at once, learning, and finally animation for
+        # the frame about to be drawn.
+        player, enemy, knight, bird = self.player, self.enemy, self.knight, self.bird
+        rogue = self.rogue
+        tile_map = self.tile_map
+
+        # Decide
+        if isinstance(player, AIPlayer):
+            player.decide(self.ai_target())
+        else:
+            player.decide()
+        if enemy:
+            enemy.decide(player)
+        if knight:
+            knight.decide(player)
+        if bird:
+            bird.decide(player, enemy, knight, over=self.is_over())
+        if rogue:
+            rogue.decide(player)
+
+        # Physics
+        player.physics(tile_map)
+        if enemy:
+            enemy.physics(tile_map)
+        if knight:
+            knight.physics(player, tile_map)
+        if bird:
+            bird.physics(player)
+        if rogue:
+            rogue.physics(tile_map)
+
+        # Combat. Everything has moved: snapshot the world once for the
+        # checks below and for the agents' next decisions
+        obs = self.observation
+        obs.update()
+        cdx, cdy = obs.cdx[PLAYER], obs.cdy[PLAYER]
+
+        # Arrows the bird's shield stops earn it a reward
+        if enemy and bird:
+            bird.check_shield_block(player, enemy)
+
+        # Collisions: player vs. enemy arrows
+        if enemy:
+            for arrow in enemy.arrow_group:
+                if pygame.sprite.collide_rect(arrow, player):
+                    health = player.health
+                    player.take_damage(5, 1 if arrow.direction > 0 else -1)
+                    if player.health < health:
+                        enemy.hit_player = True
+                        enemy.killed_player = not player.alive
+                    arrow.kill()
+
+        # Check if player's attack hits enemy, knight or rogue
+        if player.attacking and not player.has_hit_enemy:
+            if (enemy and abs(cdx[ENEMY]) < player.attack_range and
+                abs(cdy[ENEMY]) < 50):
+                knockback_direction = 1 if player.facing_right else -1
+                enemy.take_damage(10, knockback_direction)
+                player.has_hit_enemy = True
+            elif (knight and abs(cdx[KNIGHT]) < player.attack_range and
+                  abs(cdy[KNIGHT]) < 50):
+                knockback_direction = 1 if player.facing_right else -1
+                knight.take_damage(10, knockback_direction)
+                player.has_hit_enemy = True
+            elif (rogue and abs(cdx[ROGUE]) < player.attack_range and
+                  abs(cdy[ROGUE]) < 50):
+                knockback_direction = 1 if player.facing_right else -1
+                rogue.take_damage(10, knockback_direction)
+                player.has_hit_enemy = True
+
+        # Check if knight's attack hits player: a facing hit credits the
+        # knight, any other overlap still lands
+        if knight:
+            knight.check_melee_hit(player)
+        if knight and knight.attacking and not knight.attack_landed:
+            if (abs(cdx[KNIGHT]) < knight.attack_range and
+                abs(cdy[KNIGHT]) < 50):
+                knockback_direction = 1 if knight.direction > 0 else -1
+                player.take_damage(10, knockback_direction)
+                knight.attack_landed = True
+
+        # Rogue: thrown daggers as arrows, then the stab
+        if rogue:
+            for dagger in rogue.arrow_group:
+                if pygame.sprite.collide_rect(dagger, player):
+                    health = player.health
+                    player.take_damage(5, 1 if dagger.direction > 0 else -1)
+                    if player.health < health:
+                        rogue.hit_player = True
+                        rogue.killed_player = not player.alive
+                    dagger.kill()
+            rogue.check_melee_hit(player)
+
+        # Combat moves health and flags but not positions
+        obs.update_status()
+
+        # Learn
+        for agent in self.agents:
+            agent.sarsa.learn()
+
+        self.tick += 1
+        if self.advance_clock:
+            game_clock.advance()
+
+        # Animate
+        player.animate()
+        for agent in self.agents:
+            agent.animate()
+
+    def run_episode(self, max_ticks):
+        # Plays until someone wins or max_ticks pass, plus one more tick so
+        # the agents see their terminal transition. Returns the winning side
+        # ("hostile", "player" or "draw").
+        while self.tick < max_ticks and not self.is_over():
+            self.step()
+        self.step()
+        if not self.player.alive:
+            return "hostile"
+        if self.is_over():
+            return "player"
+        return "draw"
+
+    def hostiles(self):
+        return [a for a in (self.knight, self.enemy, self.rogue) if a is not None]
+
+    def is_over(self):
+        return not self.player.alive or not any(a.alive for a in self.hostiles())
+
+    def reset(self):
+        self.player.reset()
+        for agent in self.agents:
+            agent.reset()
+        self.observation.update()
+        self.tick = 0
+
+    def end_episode(self):
+        for agent in self.agents:
+            agent.end_episode()
+
+    def sprite_positions(self):
+        # Taken before a tick so draw() can interpolate across it
+        return [sprite.rect.topleft for sprite in self.all_sprites]
+
+    def background(self):
+        # The static part of every frame, drawn once
+        if self.background_surface is None:
+            self.background_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.background_surface.fill(WHITE)
+            self.tile_map.draw(self.background_surface)
+        return self.background_surface
+
+    def draw(self, screen, previous=None, alpha=1.0, hud=True):
+        screen.blit(self.background(), (0, 0))
+        self.draw_entities(screen, previous, alpha)
+        if hud:
+            self.draw_hud(screen)
+
+    def draw_hud(self, screen):
+        player, enemy, knight = self.player, self.enemy, self.knight
+        # Info text
+        if self.font is None:
+            self.font = pygame.font.Font(None, 24)
+        lines = [f"Player Health: {player.health}"]
+        if enemy:
+            lines.append(f"Enemy Health: {enemy.health}")
+        if knight:
+            lines.append(f"Knight Health: {knight.health}")
+        if self.rogue:
+            lines.append(f"Rogue Health: {self.rogue.health}")
+        for i, line in enumerate(lines):
+            screen.blit(self.font.render(line, True, BLACK), (10, 10 + 30 * i))
+
+    def draw_entities(self, screen, previous=None, alpha=1.0):
+        # Everything that moves, over whatever is already on `screen`.
+        # Returns the rects drawn to, so a caller can restore just those
+        # from the background next time (see pixels.py).
+        player, enemy, knight, bird = self.player, self.enemy, self.knight, self.bird
+        dirty = []
+        if previous is None or alpha >= 1.0:
+            for sprite in self.all_sprites:
+                dirty.append(screen.blit(sprite.image, sprite.rect))
+        else:
+            # Part way between the positions in `previous` and the current ones
+            for sprite, (x, y) in zip(self.all_sprites, previous):
+                dirty.append(screen.blit(sprite.image, (round(x + (sprite.rect.x - x) * alpha),
+                                                        round(y + (sprite.rect.y - y) * alpha))))
+        if enemy:
+            dirty.extend(enemy.draw_arrows(screen))
+        if self.rogue:
+            dirty.extend(self.rogue.draw_arrows(screen))
+        if bird:
+            rect = bird.draw_shield(screen, player)
+            if rect:
+                dirty.append(rect)
+
+        # Health bars
+        for character in (player, enemy, knight, self.rogue):
+            if character is None:
+                continue
+            dirty.append(pygame.draw.rect(screen, RED,
+                                          (character.rect.x, character.rect.y - 20, character.rect.width, 5)))
+            pygame.draw.rect(screen, GREEN, (
+                character.rect.x, character.rect.y - 20,
+                character.rect.width * character.health / character.max_health,
+                5
+            ))
+        return dirty
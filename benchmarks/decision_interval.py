@@ -0,0 +1,63 @@
+import argparse
+import random
+import time
+
+from arena import Arena, init_headless
+
+# Trains a cold-started Knight against the scripted AIPlayer at several
+# decision intervals and compares learning speed and per-tick AI cost.
+#
+#   python -m benchmarks.decision_interval --episodes 200 --intervals 1 2 4 8
+
+
+def run(decision_interval, episodes, max_ticks, epsilon, seed):
+    random.seed(seed)
+    arena = Arena(ai_player=True, enemy=False, bird=False, decision_interval=decision_interval)
+    knight = arena.knight
+    knight.sarsa.q_table = {}
+    knight.sarsa.epsilon = epsilon
+
+    rewards = []
+    step_time = 0.0
+    ticks = 0
+    wall_start = time.perf_counter()
+    for _ in range(episodes):
+        arena.reset()
+        start = time.perf_counter()
+        arena.run_episode(max_ticks)
+        step_time += time.perf_counter() - start
+        ticks += arena.tick
+        rewards.append(knight.total_reward)
+        arena.end_episode()
+    return {
+        "k": decision_interval,
+        "ticks": ticks,
+        "step_us": step_time / ticks * 1e6,
+        "wall": time.perf_counter() - wall_start,
+        "states": len(knight.sarsa.q_table),
+        "rewards": rewards,
+    }
+
+
+def window_mean(values, start, stop):
+    window = values[start:stop]
+    return sum(window) / len(window) if window else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decision interval benchmark")
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--max-ticks", type=int, default=3000)
+    parser.add_argument("--intervals", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--epsilon", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    init_headless()
+    quarter = max(1, args.episodes // 4)
+    print(f"{'k':>3} {'step us':>9} {'wall s':>8} {'states':>7} {'reward first 25%':>17} {'reward last 25%':>16}")
+    for k in args.intervals:
+        result = run(k, args.episodes, args.max_ticks, args.epsilon, args.seed)
+        rewards = result["rewards"]
+        print(f"{k:>3} {result['step_us']:>9.1f} {result['wall']:>8.1f} {result['states']:>7} "
+              f"{window_mean(rewards, 0, quarter):>17.1f} {window_mean(rewards, -quarter, None):>16.1f}")
@@ -0,0 +1,132 @@
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import random
+import time
+import zlib
+
+from arena import Arena, init_headless
+import game_clock
+from sarsa import SARSA
+
+# Golden trajectories and per-tick cost of Arena.step. --record plays a few
+# seeded learning episodes with every entity in the arena and stores a
+# checksum of the whole world after each tick; --check replays them and
+# reports the first tick that differs, so a change to the update pipeline
+# can be shown not to change the game. --profile prints the hottest
+# functions of a longer run.
+#
+# golden_before_phases.json was recorded from the step that preceded the
+# decide/physics/combat/learn/animate phases; its "differences" list which
+# ticks each intended change of the phased step moves, and why.
+#
+#   python -m benchmarks.pipeline --record
+#   python -m benchmarks.pipeline --check --profile
+#   python -m benchmarks.pipeline --check --golden benchmarks/golden_before_phases.json
+GOLDEN_FILE = os.path.join(os.path.dirname(__file__), "golden_trajectories.json")
+
+
+def world_state(arena):
+    player = arena.player
+    rows = [(player.rect.x, player.rect.y, player.health, player.action, player.frame_index,
+             player.attacking, player.shielded)]
+    for agent in (arena.enemy, arena.knight):
+        rows.append((agent.rect.x, agent.rect.y, agent.health, agent.action, agent.frame_index,
+                     agent.attacking, agent.previous_action, round(agent.total_reward, 6)))
+    rows.append(sorted((a.rect.x, a.rect.y, a.stopped) for a in arena.enemy.arrow_group))
+    bird = arena.bird
+    rows.append((bird.rect.x, bird.rect.y, bird.shield_active, bird.shield_loading, bird.previous_action,
+                 round(bird.total_reward, 6)))
+    return repr(rows)
+
+
+def trajectory(seed, episodes, max_ticks, epsilon):
+    # One checksum per tick, as a string of 8-digit hex words
+    SARSA.load_checkpoints = False
+    game_clock.reset()
+    random.seed(seed)
+    arena = Arena(ai_player=True)
+    for agent in arena.agents:
+        agent.sarsa.epsilon = epsilon
+    checksums = []
+    for _ in range(episodes):
+        arena.reset()
+        while arena.tick < max_ticks and not arena.is_over():
+            arena.step()
+            checksums.append(f"{zlib.crc32(world_state(arena).encode()):08x}")
+        arena.step()
+        arena.end_episode()
+    return "".join(checksums)
+
+
+def compare(expected, actual):
+    # First differing tick, or None
+    for i in range(0, max(len(expected), len(actual)), 8):
+        if expected[i:i + 8] != actual[i:i + 8]:
+            return i // 8
+    return None
+
+
+def timed_ticks(seed, ticks, epsilon):
+    SARSA.load_checkpoints = False
+    random.seed(seed)
+    arena = Arena(ai_player=True)
+    for agent in arena.agents:
+        agent.sarsa.epsilon = epsilon
+    arena.reset()
+    elapsed = 0.0
+    for _ in range(ticks):
+        if arena.is_over():
+            arena.end_episode()
+            arena.reset()
+        start = time.perf_counter()
+        arena.step()
+        elapsed += time.perf_counter() - start
+    return elapsed / ticks * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Golden trajectories and profile of the update pipeline")
+    parser.add_argument("--record", action="store_true", help="overwrite the golden trajectories")
+    parser.add_argument("--check", action="store_true", help="compare against the golden trajectories")
+    parser.add_argument("--golden", default=GOLDEN_FILE, metavar="PATH", help="golden trajectories file")
+    parser.add_argument("--profile", action="store_true", help="profile a longer run")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument("--episodes", type=int, default=3)
+    parser.add_argument("--max-ticks", type=int, default=1000)
+    parser.add_argument("--epsilon", type=float, default=0.2)
+    parser.add_argument("--ticks", type=int, default=20000, help="ticks for timing and profiling")
+    args = parser.parse_args()
+
+    init_headless()
+    if args.record:
+        golden = {"episodes": args.episodes, "max_ticks": args.max_ticks, "epsilon": args.epsilon, "seeds": {}}
+        for seed in args.seeds:
+            golden["seeds"][str(seed)] = trajectory(seed, args.episodes, args.max_ticks, args.epsilon)
+        with open(args.golden, "w") as f:
+            json.dump(golden, f, indent=1)
+        print(f"Recorded {len(args.seeds)} trajectories to {args.golden}")
+    if args.check:
+        with open(args.golden, "r") as f:
+            golden = json.load(f)
+        for difference in golden.get("differences", []):
+            print(f"expected: {difference}")
+        failed = False
+        for seed, expected in golden["seeds"].items():
+            actual = trajectory(int(seed), golden["episodes"], golden["max_ticks"], golden["epsilon"])
+            tick = compare(expected, actual)
+            failed = failed or tick is not None
+            status = "ok" if tick is None else f"differs from tick {tick}"
+            print(f"seed {seed}: {len(expected) // 8} ticks, {status}")
+        if failed:
+            raise SystemExit(1)
+
+    print(f"Arena.step: {timed_ticks(0, args.ticks, args.epsilon):.1f} us/tick over {args.ticks} ticks")
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        timed_ticks(0, args.ticks, args.epsilon)
+        profiler.disable()
+        pstats.Stats(profiler).sort_stats("tottime").print_stats(15)
@@ -0,0 +1,65 @@
+import argparse
+import random
+import time
+
+import pygame
+
+from arena import Arena, init_headless
+from pixels import PixelObserver
+from sarsa import SARSA
+
+# Pixel observation throughput, headless. The baseline redraws the whole
+# screen and copies it out with pygame.image.tostring; the PixelObserver
+# modes redraw only what moved and read the surface without copying.
+# Observations per second are for rendering alone (--ticks 0) or for
+# simulation plus rendering, one observation per tick.
+#
+#   python -m benchmarks.pixels --observations 2000
+
+
+def run(mode, observations, seed):
+    random.seed(seed)
+    arena = Arena(ai_player=True)
+    arena.reset()
+    screen = pygame.Surface(arena.background().get_size(), 0, 32)
+    observer = None
+    if mode == "full_view":
+        observer = PixelObserver(arena)
+    elif mode == "84x84_gray_x4":
+        observer = PixelObserver(arena, size=(84, 84), grayscale=True, stack=4)
+    elif mode == "84x84_rgb_smooth":
+        observer = PixelObserver(arena, size=(84, 84), smooth=True)
+
+    render = 0.0
+    start = time.perf_counter()
+    for _ in range(observations):
+        arena.step()
+        if arena.is_over():
+            arena.end_episode()
+            arena.reset()
+            if observer:
+                observer.reset()
+        begin = time.perf_counter()
+        if observer:
+            observation = observer.observe()
+        else:
+            arena.draw(screen, hud=False)
+            observation = pygame.image.tostring(screen, "RGB")
+        del observation
+        render += time.perf_counter() - begin
+    total = time.perf_counter() - start
+    return observations / render, observations / total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pixel observation benchmark")
+    parser.add_argument("--observations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    init_headless()
+    SARSA.load_checkpoints = False
+    print(f"{'mode':>18} {'render obs/s':>13} {'step+render obs/s':>18}")
+    for mode in ("tostring_copy", "full_view", "84x84_gray_x4", "84x84_rgb_smooth"):
+        rendered, stepped = run(mode, args.observations, args.seed)
+        print(f"{mode:>18} {rendered:>13.0f} {stepped:>18.0f}")
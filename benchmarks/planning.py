@@ -0,0 +1,68 @@
+import argparse
+import random
+import time
+
+from arena import Arena, init_headless
+
+# Trains a cold-started Knight against the scripted AIPlayer with and
+# without Dyna-Q / prioritized sweeping and counts the real ticks needed
+# until the moving average of episode reward reaches a target.
+#
+#   python -m benchmarks.planning --episodes 300 --steps 0 5 20 --target 0
+
+
+def run(planning_steps, episodes, max_ticks, epsilon, target, window, seed):
+    random.seed(seed)
+    arena = Arena(ai_player=True, enemy=False, bird=False)
+    sarsa = arena.knight.sarsa
+    sarsa.q_table = {}
+    sarsa.visit_counts = {}
+    sarsa.epsilon = epsilon
+    if planning_steps:
+        planner = sarsa.attach_planner(planning_steps)
+
+    rewards = []
+    ticks = 0
+    ticks_to_target = None
+    start = time.perf_counter()
+    for episode in range(episodes):
+        arena.reset()
+        arena.run_episode(max_ticks)
+        ticks += arena.tick
+        rewards.append(arena.knight.total_reward)
+        arena.end_episode()
+        recent = rewards[-window:]
+        if ticks_to_target is None and len(recent) == window and sum(recent) / window >= target:
+            ticks_to_target = (episode + 1, ticks)
+    return {
+        "steps": planning_steps,
+        "ticks": ticks,
+        "wall": time.perf_counter() - start,
+        "backups": planner.backups if planning_steps else 0,
+        "to_target": ticks_to_target,
+        "final": sum(rewards[-window:]) / min(window, len(rewards)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Planning (Dyna-Q) benchmark")
+    parser.add_argument("--episodes", type=int, default=300)
+    parser.add_argument("--max-ticks", type=int, default=3000)
+    parser.add_argument("--steps", type=int, nargs="+", default=[0, 5, 20], help="planning steps per real update")
+    parser.add_argument("--target", type=float, default=0.0, help="moving-average episode reward to reach")
+    parser.add_argument("--window", type=int, default=20)
+    parser.add_argument("--epsilon", type=float, default=0.1)
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    args = parser.parse_args()
+
+    init_headless()
+    print(f"{'steps':>5} {'seed':>4} {'episodes':>8} {'real ticks':>10} {'backups':>9} {'wall s':>7} {'final reward':>12}")
+    for steps in args.steps:
+        for seed in args.seeds:
+            result = run(steps, args.episodes, args.max_ticks, args.epsilon, args.target, args.window, seed)
+            if result["to_target"]:
+                episodes, ticks = result["to_target"]
+            else:
+                episodes, ticks = "-", "-"
+            print(f"{steps:>5} {seed:>4} {episodes:>8} {ticks:>10} {result['backups']:>9} "
+                  f"{result['wall']:>7.1f} {result['final']:>12.1f}")
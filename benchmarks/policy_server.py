@@ -0,0 +1,71 @@
+import argparse
+import os
+import tempfile
+import time
+from multiprocessing import Process, Queue
+
+from arena import Arena, init_headless, init_worker
+from policy_server import (
+    PolicyServer, PolicyClient, LocalPolicyClient,
+    connect_arena, format_stats, load_tables,
+)
+
+# Runs several headless game clients against one policy server and reports
+# the server's latency/throughput next to the clients' tick rate. The
+# in-process stand-in gives the no-socket baseline.
+#
+#   python -m benchmarks.policy_server --clients 1 4 8 --ticks 3000
+
+
+def play(client, ticks):
+    arena = Arena(ai_player=True)
+    connect_arena(arena, client)
+    start = time.perf_counter()
+    done = 0
+    while done < ticks:
+        arena.reset()
+        remaining = ticks - done
+        arena.run_episode(remaining - 1)
+        done += arena.tick
+    return done / (time.perf_counter() - start)
+
+
+def client_process(address, ticks, results):
+    init_worker()
+    client = PolicyClient(address)
+    results.put(play(client, ticks))
+    client.close()
+
+
+def run(address, clients, ticks, window):
+    server = PolicyServer(address, load_tables(), window=window)
+    server.start()
+    results = Queue()
+    workers = [Process(target=client_process, args=(address, ticks, results)) for _ in range(clients)]
+    for worker in workers:
+        worker.start()
+    rates = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    server.stop()
+    return sum(rates) / len(rates), server.stats()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Policy server benchmark")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--ticks", type=int, default=3000, help="ticks per client")
+    parser.add_argument("--window-ms", type=float, default=1.0)
+    parser.add_argument("--port", type=int, help="use local TCP on this port instead of a Unix socket")
+    args = parser.parse_args()
+
+    init_headless()
+    local_rate = play(LocalPolicyClient(load_tables()), args.ticks)
+    print(f"in-process: {local_rate:.0f} ticks/s")
+
+    folder = tempfile.mkdtemp()
+    for clients in args.clients:
+        address = ("127.0.0.1", args.port) if args.port else os.path.join(folder, "policy.sock")
+        rate, stats = run(address, clients, args.ticks, args.window_ms / 1000)
+        print(f"{clients} clients: {rate:.0f} ticks/s per client; server {format_stats(stats)}")
+    os.rmdir(folder)
@@ -0,0 +1,70 @@
+import argparse
+import pickle
+import time
+
+from arena import Arena, init_headless
+from sarsa import SARSA
+import game_clock
+from benchmarks.pipeline import world_state
+
+# Times Arena.snapshot() / restore() mid-episode and checks that forks of
+# one snapshot replay the same ticks: every fork is restored from the
+# snapshot and run for --ticks, and all must match the first tick for tick.
+#
+#   python -m benchmarks.snapshot --warmup 150 --ticks 300 --forks 4
+
+
+def rollout(arena, ticks):
+    states = []
+    for _ in range(ticks):
+        arena.step()
+        states.append(world_state(arena))
+    return states
+
+
+def run(warmup, ticks, forks, repeats, epsilon, seed, rogue):
+    SARSA.load_checkpoints = False
+    game_clock.reset()
+    arena = Arena(ai_player=True, rogue=rogue)
+    arena.seed(seed)
+    for agent in arena.agents:
+        agent.sarsa.epsilon = epsilon
+        agent.sarsa.frozen = True
+    arena.reset()
+    for _ in range(warmup):
+        arena.step()
+
+    snapshot = arena.snapshot()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        arena.snapshot()
+    capture = (time.perf_counter() - start) / repeats
+    start = time.perf_counter()
+    for _ in range(repeats):
+        arena.restore(snapshot)
+    restore = (time.perf_counter() - start) / repeats
+
+    reference = rollout(arena, ticks)
+    identical = 0
+    for _ in range(forks - 1):
+        arena.restore(snapshot)
+        identical += rollout(arena, ticks) == reference
+    return capture, restore, len(pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)), identical
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="World snapshot / restore benchmark")
+    parser.add_argument("--warmup", type=int, default=150, help="ticks before the snapshot")
+    parser.add_argument("--ticks", type=int, default=300, help="ticks per fork")
+    parser.add_argument("--forks", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=2000)
+    parser.add_argument("--epsilon", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rogue", action="store_true")
+    args = parser.parse_args()
+
+    init_headless()
+    capture, restore, size, identical = run(args.warmup, args.ticks, args.forks, args.repeats,
+                                            args.epsilon, args.seed, args.rogue)
+    print(f"capture {capture * 1e6:.1f} us, restore {restore * 1e6:.1f} us, {size} bytes pickled")
+    print(f"{identical}/{args.forks - 1} forks replayed the first one exactly")
@@ -0,0 +1,224 @@
+import argparse
+import csv
+import random
+import time
+
+import numpy as np
+import pygame
+
+from arena import Arena, init_headless
+from bird import Bird
+from characters import Character, Player
+from config import SCREEN_WIDTH, SCREEN_HEIGHT
+from enemies import Arrow, Enemy
+import game_clock
+from knight import Knight
+from sarsa import SARSA
+from scheduler import DecisionScheduler
+
+# Frame time as the arena fills up. A scenario spawns any number of
+# archers, knights, birds and arrows: the actors are spread over arena
+# "slots" (one Arena each, with its own scripted player, all sharing the
+# clock and drawn on one screen) and arrows are topped up every frame.
+# Each sweep grows one actor type (or all of them) and reports frame-time
+# percentiles, whether the 60 FPS budget still holds, and the inclusive
+# time per frame of the suspect subsystems, rendered and headless.
+# --budget shares a per-frame AI budget between all agents through a
+# DecisionScheduler and adds its deferral counters to the report.
+#
+#   python -m benchmarks.stress --sweep all arrows --counts 1 2 4 8 16 --frames 300
+#   python -m benchmarks.stress --sweep all --counts 16 64 --budget 2
+FRAME_BUDGET_MS = 1000 / 60
+
+
+class Timers:
+    # Wraps functions to accumulate their wall time per label. Times are
+    # inclusive, so nested subsystems (flip inside animate) overlap.
+    def __init__(self):
+        self.totals = {}
+        self.originals = []
+
+    def wrap(self, owner, name, label):
+        original = getattr(owner, name)
+        totals = self.totals
+        totals.setdefault(label, 0.0)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                totals[label] += time.perf_counter() - start
+
+        self.originals.append((owner, name, original))
+        setattr(owner, name, timed)
+
+    def reset(self):
+        for label in self.totals:
+            self.totals[label] = 0.0
+
+    def restore(self):
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+
+
+def instrument(timers):
+    timers.wrap(Character, "physics", "tile collisions")
+    timers.wrap(Character, "move", "tile collisions")
+    timers.wrap(pygame.transform, "flip", "transform.flip")
+    timers.wrap(Arrow, "update", "arrow update")
+    timers.wrap(pygame.image, "load", "image.load")
+    for cls in (Enemy, Knight, Bird):
+        timers.wrap(cls, "decide", "ai decide")
+        timers.wrap(cls, "animate", "animate")
+    timers.wrap(Player, "animate", "animate")
+    timers.wrap(SARSA, "learn", "learn")
+    timers.wrap(Arena, "draw_entities", "draw entities")
+    timers.wrap(Arena, "draw_hud", "hud")
+
+
+class Scenario:
+    def __init__(self, archers=1, knights=1, birds=1, arrows=0, seed=0, scheduler=None):
+        random.seed(seed)
+        slots = max(archers, knights, birds, 1)
+        self.arenas = [Arena(ai_player=True, enemy=i < archers, knight=i < knights, bird=i < birds,
+                             advance_clock=False) for i in range(slots)]
+        self.scheduler = scheduler
+        for arena in self.arenas:
+            arena.reset()
+            if scheduler:
+                arena.attach_scheduler(scheduler)
+        self.arrows = arrows
+        # Arrows need an archer to belong to for the combat checks; without
+        # one they just fly
+        self.archers = [a.enemy for a in self.arenas if a.enemy]
+        self.free_arrows = pygame.sprite.Group()
+
+    def arrow_groups(self):
+        return [e.arrow_group for e in self.archers] or [self.free_arrows]
+
+    def top_up_arrows(self):
+        groups = self.arrow_groups()
+        missing = self.arrows - sum(len(g) for g in groups)
+        for i in range(max(0, missing)):
+            direction = random.choice((-1, 1))
+            x = 20 if direction > 0 else SCREEN_WIDTH - 20
+            groups[i % len(groups)].add(Arrow(x, random.randint(150, SCREEN_HEIGHT - 120), direction))
+
+    def step(self):
+        if self.scheduler:
+            self.scheduler.begin_frame()
+        self.top_up_arrows()
+        for arena in self.arenas:
+            arena.step()
+            # A slot without a knight or archer is "over" from the start;
+            # it just keeps going
+            if arena.is_over() and (arena.enemy or arena.knight):
+                arena.end_episode()
+                arena.reset()
+        if not self.archers:
+            self.free_arrows.update()
+        game_clock.advance()
+
+    def draw(self, screen):
+        screen.blit(self.arenas[0].background(), (0, 0))
+        for arena in self.arenas:
+            arena.draw_entities(screen)
+        self.free_arrows.draw(screen)
+        self.arenas[0].draw_hud(screen)
+
+
+def run(counts, frames, rendered, screen, timers, warmup=30, budget_ms=None):
+    scheduler = DecisionScheduler(budget_ms) if budget_ms else None
+    scenario = Scenario(**counts, scheduler=scheduler)
+    for _ in range(warmup):
+        scenario.step()
+    timers.reset()
+    frame_times = np.empty(frames)
+    display_time = 0.0
+    for i in range(frames):
+        start = time.perf_counter()
+        scenario.step()
+        if rendered:
+            scenario.draw(screen)
+            flip_start = time.perf_counter()
+            pygame.display.flip()
+            display_time += time.perf_counter() - flip_start
+        frame_times[i] = time.perf_counter() - start
+    breakdown = {label: total / frames * 1000 for label, total in timers.totals.items()}
+    if rendered:
+        breakdown["display.flip"] = display_time / frames * 1000
+    return frame_times * 1000, breakdown, scheduler
+
+
+def sweep_counts(sweep, count):
+    if sweep == "all":
+        return {"archers": count, "knights": count, "birds": count, "arrows": count}
+    counts = {"archers": 1, "knights": 1, "birds": 1, "arrows": 0}
+    counts[sweep] = count
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arena stress test: frame time against actor count")
+    parser.add_argument("--sweep", nargs="+", default=["all"],
+                        choices=["all", "archers", "knights", "birds", "arrows"],
+                        help="actor type grown in each sweep")
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--frames", type=int, default=300, help="measured frames per scenario")
+    parser.add_argument("--modes", nargs="+", default=["headless", "rendered"], choices=["headless", "rendered"])
+    parser.add_argument("--window", action="store_true", help="render to a real window instead of the dummy driver")
+    parser.add_argument("--csv", metavar="PATH", help="also write every row to PATH")
+    parser.add_argument("--budget", type=float, metavar="MS", help="per-frame AI decision budget")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.window:
+        pygame.display.init()
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        game_clock.use_simulated_time()
+    else:
+        screen = init_headless()
+    SARSA.load_checkpoints = False
+    timers = Timers()
+    instrument(timers)
+
+    rows = []
+    for sweep in args.sweep:
+        for mode in args.modes:
+            print(f"\n{sweep} ({mode}), frame budget {FRAME_BUDGET_MS:.1f} ms")
+            print(f"{'count':>5} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'max ms':>7} {'60fps':>5}  top subsystems (ms/frame)")
+            last_ok = None
+            for count in args.counts:
+                counts = sweep_counts(sweep, count)
+                frame_ms, breakdown, scheduler = run(counts, args.frames, mode == "rendered", screen, timers,
+                                                     warmup=30, budget_ms=args.budget)
+                p50, p95, p99 = np.percentile(frame_ms, [50, 95, 99])
+                ok = p95 <= FRAME_BUDGET_MS
+                if ok:
+                    last_ok = count
+                top = sorted(breakdown.items(), key=lambda item: -item[1])[:3]
+                print(f"{count:>5} {p50:>7.2f} {p95:>7.2f} {p99:>7.2f} {frame_ms.max():>7.2f} {'yes' if ok else 'no':>5}  "
+                      + ", ".join(f"{label} {ms:.2f}" for label, ms in top))
+                scheduled = scheduler.stats() if scheduler else {}
+                if scheduler:
+                    print(f"{'':>5} scheduler: stride {scheduled['stride']}, {scheduled['decisions']} decisions, "
+                          f"{scheduled['deferred']} deferred, {scheduled['urgent']} urgent, "
+                          f"{scheduled['forced']} forced, {scheduled['frames_over_budget']} frames over budget")
+                rows.append({"sweep": sweep, "mode": mode, "count": count, **counts,
+                             "p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "max_ms": frame_ms.max(),
+                             **{f"{label} ms": ms for label, ms in breakdown.items()}, **scheduled})
+            print(f"p95 within budget up to {last_ok} ({sweep})" if last_ok else f"p95 over budget from {args.counts[0]}")
+
+    if args.csv:
+        fields = []
+        for row in rows:
+            fields.extend(key for key in row if key not in fields)
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({key: f"{value:.3f}" if isinstance(value, float) else value
+                                 for key, value in row.items()})
+    timers.restore()
@@ -0,0 +1,88 @@
+import argparse
+import random
+import sys
+import threading
+import time
+
+from arena import Arena, init_headless
+from sarsa import SARSA
+from sharded_table import ShardedQTable
+
+# Thread scaling of a shared Q-table: N actor threads replay real knight
+# transitions (harvested from headless episodes) through get_action and
+# update_q_table against one table, either a plain dict behind a global
+# lock or a ShardedQTable. Run it on a standard and on a free-threaded
+# (python3.13t) interpreter to compare; with the GIL neither can scale.
+#
+#   python -m benchmarks.threads --threads 1 2 4 8
+
+
+def harvest(episodes, max_ticks, seed):
+    random.seed(seed)
+    arena = Arena(ai_player=True, enemy=False, bird=False)
+    sarsa = arena.knight.sarsa
+    sarsa.q_table = {}
+    sarsa.epsilon = 0.3
+    transitions = []
+    update_q_table = sarsa.update_q_table
+
+    def capture(state, action, reward, next_state, next_action, discount=None):
+        transitions.append((state, action, reward, next_state, next_action, discount))
+        update_q_table(state, action, reward, next_state, next_action, discount)
+
+    sarsa.update_q_table = capture
+    for _ in range(episodes):
+        arena.reset()
+        arena.run_episode(max_ticks)
+        arena.end_episode()
+    return transitions
+
+
+def actor(sarsa, transitions, rounds, lock):
+    for _ in range(rounds):
+        for state, action, reward, next_state, next_action, discount in transitions:
+            if lock:
+                with lock:
+                    sarsa.get_action(state)
+                    sarsa.update_q_table(state, action, reward, next_state, next_action, discount)
+            else:
+                sarsa.get_action(state)
+                sarsa.update_q_table(state, action, reward, next_state, next_action, discount)
+
+
+def run(mode, threads, transitions, rounds, shards):
+    SARSA.load_checkpoints = False
+    table = ShardedQTable(shards) if mode == "sharded" else {}
+    lock = threading.Lock() if mode == "dict" else None
+    actors = []
+    for _ in range(threads):
+        sarsa = SARSA(character_type="knight", epsilon=0.1)
+        sarsa.q_table = table
+        actors.append(threading.Thread(target=actor, args=(sarsa, transitions, rounds, lock)))
+    start = time.perf_counter()
+    for thread in actors:
+        thread.start()
+    for thread in actors:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return threads * rounds * len(transitions) / elapsed, len(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared Q-table thread scaling benchmark")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--episodes", type=int, default=5, help="episodes harvested for the replay")
+    parser.add_argument("--rounds", type=int, default=3, help="replays of the transitions per thread")
+    parser.add_argument("--shards", type=int, default=64)
+    args = parser.parse_args()
+
+    init_headless()
+    transitions = harvest(args.episodes, 3000, 0)
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}, "
+          f"{len(transitions)} transitions per round")
+    print(f"{'threads':>7} {'dict+lock upd/s':>16} {'sharded upd/s':>14} {'speedup':>8}")
+    for threads in args.threads:
+        locked, _ = run("dict", threads, transitions, args.rounds, args.shards)
+        sharded, _ = run("sharded", threads, transitions, args.rounds, args.shards)
+        print(f"{threads:>7} {locked:>16.0f} {sharded:>14.0f} {sharded / locked:>8.2f}")
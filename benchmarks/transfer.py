@@ -0,0 +1,126 @@
+import argparse
+import random
+import time
+
+import qtable
+from arena import Arena, init_headless
+from sarsa import SARSA
+from transfer import warm_start
+
+# Time to competence for a new role, warm-started from a trained role's
+# table (transfer.py) or from scratch. An archer is trained alone against
+# the scripted player first (or read from --source); then two rogues, one
+# warm and one cold, train in the same seeded arena and are evaluated
+# greedily every --eval-every episodes. The scripted player is hard to
+# kill inside an episode, so competence is the first evaluation in which
+# the rogue takes, on average, --target health points off the player.
+#
+#   python -m benchmarks.transfer --source-episodes 300 --episodes 300
+
+
+def solo_arena(role):
+    return Arena(ai_player=True, enemy=role == "enemy", knight=False, bird=False, rogue=role == "rogue")
+
+
+def train(arena, agent, episodes, max_ticks):
+    ticks = 0
+    for _ in range(episodes):
+        arena.reset()
+        arena.run_episode(max_ticks)
+        ticks += arena.tick
+        arena.end_episode()
+    return ticks
+
+
+def evaluate(arena, agent, episodes, max_ticks, seed):
+    # Greedy and frozen, on its own random stream so training isn't disturbed
+    state = random.getstate()
+    random.seed(seed)
+    epsilon, agent.sarsa.epsilon = agent.sarsa.epsilon, 0.0
+    frozen, agent.sarsa.frozen = agent.sarsa.frozen, True
+    wins = 0
+    reward = 0.0
+    damage = 0
+    for _ in range(episodes):
+        arena.reset()
+        wins += arena.run_episode(max_ticks) == "hostile"
+        reward += agent.total_reward
+        damage += arena.player.max_health - arena.player.health
+    agent.sarsa.epsilon, agent.sarsa.frozen = epsilon, frozen
+    random.setstate(state)
+    return wins / episodes, reward / episodes, damage / episodes
+
+
+def time_to_competence(source_table, args):
+    random.seed(args.seed)
+    arena = solo_arena("rogue")
+    rogue = arena.rogue
+    rogue.sarsa.epsilon = args.epsilon
+    if source_table is not None:
+        warm_start(rogue.sarsa, source_table, "enemy", args.scale)
+    curve = []
+    ticks = 0
+    elapsed = 0.0
+    reached = None
+    for episode in range(0, args.episodes + 1, args.eval_every):
+        if episode:
+            start = time.perf_counter()
+            ticks += train(arena, rogue, args.eval_every, args.max_ticks)
+            elapsed += time.perf_counter() - start
+        win_rate, reward, damage = evaluate(arena, rogue, args.eval_episodes, args.max_ticks, args.seed + 1)
+        curve.append((episode, win_rate, reward, damage))
+        if reached is None and damage >= args.target:
+            reached = (episode, ticks, elapsed)
+            if not args.full_curve:
+                break
+    return curve, reached
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm-started against cold-started rogue: time to competence")
+    parser.add_argument("--source", metavar="PATH", help="archer checkpoint to transfer from")
+    parser.add_argument("--source-episodes", type=int, default=300,
+                        help="episodes to train an archer for when no --source is given")
+    parser.add_argument("--episodes", type=int, default=300, help="most rogue training episodes")
+    parser.add_argument("--eval-every", type=int, default=20)
+    parser.add_argument("--eval-episodes", type=int, default=20)
+    parser.add_argument("--max-ticks", type=int, default=1000)
+    parser.add_argument("--epsilon", type=float, default=0.1)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--target", type=float, default=50,
+                        help="mean damage to the player per episode that counts as competent")
+    parser.add_argument("--full-curve", action="store_true", help="keep training after competence")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    init_headless()
+    SARSA.load_checkpoints = False
+    if args.source:
+        source_table, _ = qtable.load_checkpoint(args.source)
+    else:
+        random.seed(args.seed)
+        arena = solo_arena("enemy")
+        arena.enemy.sarsa.epsilon = args.epsilon
+        start = time.perf_counter()
+        ticks = train(arena, arena.enemy, args.source_episodes, args.max_ticks)
+        _, _, damage = evaluate(arena, arena.enemy, args.eval_episodes, args.max_ticks, args.seed + 1)
+        source_table = arena.enemy.sarsa.q_table
+        print(f"Archer: {args.source_episodes} episodes ({ticks} ticks, {time.perf_counter() - start:.1f}s), "
+              f"{len(source_table)} states, greedy damage {damage:.1f}")
+
+    results = {}
+    for name, table in (("cold", None), ("warm", source_table)):
+        curve, reached = time_to_competence(table, args)
+        results[name] = reached
+        print(f"\n{name} rogue")
+        print(f"{'episode':>8} {'win rate':>9} {'reward':>8} {'damage':>7}")
+        for episode, win_rate, reward, damage in curve:
+            print(f"{episode:>8} {win_rate:>9.0%} {reward:>8.1f} {damage:>7.1f}")
+
+    print(f"\nTime to {args.target:g} damage per episode:")
+    for name, reached in results.items():
+        if reached:
+            episode, ticks, elapsed = reached
+            print(f"  {name}: {episode} episodes, {ticks} ticks, {elapsed:.1f}s of training")
+        else:
+            print(f"  {name}: not reached in {args.episodes} episodes")
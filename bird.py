@@ -9,9 +9,26 @@ from config import (
     FPS, GRAVITY, JUMP_STRENGTH
 )
 from sarsa import SARSA
+import game_clock
+from state_codec import StateCodec
+from observation import PLAYER, ENEMY, KNIGHT, BIRD
 
 class Bird(pygame.sprite.Sprite):
-    def __init__(self, x, y):
+    # Values of each "_"-separated part of get_state, in order
+    STATE_FACTORS = [
+        ["close", "far", "very_far"],
+        ["right", "left"],
+        ["above", "below"],
+        ["shield_active", "shield_inactive"],
+        ["shield_ready", "shield_cooldown"],
+        ["very_close", "close", "medium", "far"],
+        ["very_close", "close", "medium", "far"],
+        ["idle", "attack", "walk", "death", "block"],
+        ["idle", "run", "death", "attack"],
+    ]
+    state_codec = StateCodec(STATE_FACTORS)
+
+    def __init__(self, x, y, decision_interval=1):
         super().__init__()
         self.load_animations()
         self.rect = self.image.get_rect()
@@ -21,13 +38,16 @@ class Bird(pygame.sprite.Sprite):
         self.heal_cooldown_max = 300
         self.state = "idle"
         self.frame_index = 0
-        self.update_time = pygame.time.get_ticks()
+        self.update_time = game_clock.get_ticks()
         self.facing_right = True
         
-        self.sarsa = SARSA(character_type="bird")
+        self.sarsa = SARSA(character_type="bird", decision_interval=decision_interval,
+                           state_space_size=self.state_codec.size)
         self.previous_state = None
         self.previous_action = None
         self.total_reward = 0
+        # Off when the owner reads get_reward() itself after each tick (ArenaEnv)
+        self.credit_rewards = True
         self.previous_distance = float('inf')
         
         # Shield
@@ -44,6 +64,11 @@ class Bird(pygame.sprite.Sprite):
         self.shield_reward_given = False
         self.shield_start_time = 0
         self.unnecessary_shield_use = False
+        self.blocked_arrow = False
+        # Set by the Arena (see observation.py)
+        self.observation = None
+        # Optional DecisionScheduler (see scheduler.py)
+        self.scheduler = None
 
     def load_animations(self):
         self.animations = {
@@ -63,32 +88,67 @@ class Bird(pygame.sprite.Sprite):
             animation.append(img)
         return animation
 
-    def update(self, player, enemy, knight):
+    def decide(self, player, enemy, knight, over=False):
         self.heal_cooldown = max(0, self.heal_cooldown - 1)
         self.shield_cooldown = max(0, self.shield_cooldown - 1)
 
-        current_state = self.get_state(player, knight=knight, enemy=enemy)
-        action = self.sarsa.get_action(current_state)
-        self.perform_action(action, player)
-
-        reward = self.get_reward(player, knight=knight, enemy=enemy)
-        self.total_reward += reward
-
-        next_state = self.get_state(player, knight=knight, enemy=enemy)
-        next_action = self.sarsa.get_action(next_state)
-
-        if self.previous_state is not None and self.previous_action is not None:
-            self.sarsa.update_q_table(self.previous_state, self.previous_action, reward, current_state, action)
-
-        self.previous_state = current_state
-        self.previous_action = action
+        if over:
+            # The bird outlives the fight, so the end of the episode is its
+            # final transition
+            if self.previous_state is not None:
+                if self.credit_rewards:
+                    reward = self.get_reward(player, knight=knight, enemy=enemy)
+                    self.total_reward += reward
+                    self.sarsa.add_reward(reward)
+                self.sarsa.finish(self.previous_state, self.previous_action)
+                self.previous_state = None
+                self.previous_action = None
+            return
+
+        # The reward for the previous action is read from the world as it
+        # was left by the previous tick, after everything else has moved in
+        # response to it.
+        if self.previous_state is not None and self.previous_action is not None and self.credit_rewards:
+            reward = self.get_reward(player, knight=knight, enemy=enemy)
+            self.total_reward += reward
+            self.sarsa.add_reward(reward)
+
+        if self.previous_state is None or (self.sarsa.should_decide() and (
+                self.scheduler is None or self.scheduler.may_decide(self, player, enemy, knight))):
+            current_state = self.get_state(player, knight=knight, enemy=enemy)
+            action = self.sarsa.decide(current_state, self.previous_state, self.previous_action)
+            self.previous_state = current_state
+            self.previous_action = action
+            if self.scheduler:
+                self.scheduler.decided()
+        # Otherwise the last decision is repeated
+        self.sarsa.tick()
+
+    def threatened(self, player, enemy, knight):
+        # Something is about to hit the player: an arrow in flight close to
+        # it or the knight swinging next to it
+        obs = self.observation
+        if knight and obs.attacking[KNIGHT] and abs(obs.cdx[PLAYER][KNIGHT]) < 100:
+            return True
+        if enemy:
+            x = player.rect.centerx
+            for arrow in enemy.arrow_group:
+                if not arrow.stopped and abs(arrow.rect.centerx - x) < 150:
+                    return True
+        return False
+
+    def physics(self, player):
+        self.perform_action(self.previous_action, player)
+        self.update_shield(player)
 
+    def animate(self):
         self.update_animation()
-        self.update_shield(player)
 
     def get_state(self, player, knight=None, enemy=None):
-        dx = abs(self.rect.centerx - player.rect.centerx)
-        dy = player.rect.top - self.rect.bottom  # Positive if bird is above player
+        obs = self.observation
+        cdx = obs.cdx[BIRD]
+        dx = abs(cdx[PLAYER])
+        dy = obs.top[PLAYER] - obs.bottom[BIRD]  # Positive if bird is above player
 
         if dx <= 100 and dy <= 100:
             proximity = "close"
@@ -97,15 +157,15 @@ class Bird(pygame.sprite.Sprite):
         else:
             proximity = "very_far"
 
-        x_direction = "right" if player.rect.centerx > self.rect.centerx else "left"
-        y_direction = "above" if player.rect.centery < self.rect.centery else "below"
+        x_direction = "right" if cdx[PLAYER] > 0 else "left"
+        y_direction = "above" if obs.cdy[BIRD][PLAYER] < 0 else "below"
 
         shield_state = "shield_active" if self.shield_active else "shield_inactive"
         shield_cooldown = "shield_ready" if self.shield_cooldown == 0 else "shield_cooldown"
 
         # Knight distances and action
         if knight:
-            player_to_knight_distance = abs(player.rect.centerx - knight.rect.centerx)
+            player_to_knight_distance = abs(obs.cdx[PLAYER][KNIGHT])
             if player_to_knight_distance <= 60:
                 pk_distance = "very_close"
             elif player_to_knight_distance <= 100:
@@ -114,14 +174,14 @@ class Bird(pygame.sprite.Sprite):
                 pk_distance = "medium"
             else:
                 pk_distance = "far"
-            knight_action = ["idle", "attack", "walk", "death", "block"][knight.action]
+            knight_action = ["idle", "attack", "walk", "death", "block"][obs.action[KNIGHT]]
         else:
             pk_distance = "far"
             knight_action = "idle"
 
         # Enemy distances and action
         if enemy:
-            player_to_enemy_distance = abs(player.rect.centerx - enemy.rect.centerx)
+            player_to_enemy_distance = abs(obs.cdx[PLAYER][ENEMY])
             if player_to_enemy_distance <= 50:
                 pe_distance = "very_close"
             elif player_to_enemy_distance <= 100:
@@ -130,7 +190,7 @@ class Bird(pygame.sprite.Sprite):
                 pe_distance = "medium"
             else:
                 pe_distance = "far"
-            enemy_action = ["idle", "run", "death", "attack"][enemy.action]
+            enemy_action = ["idle", "run", "death", "attack"][obs.action[ENEMY]]
         else:
             pe_distance = "far"
             enemy_action = "idle"
@@ -172,8 +232,9 @@ class Bird(pygame.sprite.Sprite):
 
     def get_reward(self, player, knight=None, enemy=None):
         reward = 0
-        dx = self.rect.x - player.rect.x
-        dy = player.rect.y - self.rect.y
+        obs = self.observation
+        dx = -obs.dx[BIRD][PLAYER]
+        dy = obs.dy[BIRD][PLAYER]
 
         # Horizontal proximity
         if dx <= 150:
@@ -187,35 +248,44 @@ class Bird(pygame.sprite.Sprite):
         else:
             reward -= 1
 
-        # Reward for blocking
-        if player.shielded and not self.shield_reward_given:
+        # Reward for blocking (arrow blocks are flagged by the Arena's
+        # combat resolver, see check_shield_block)
+        if obs.shielded and not self.shield_reward_given:
             if enemy:
-                for arrow in enemy.arrow_group:
-                    if not arrow.stopped and arrow.rect.colliderect(player.rect):
-                        reward += 50
-                        self.shield_reward_given = True
-                        self.unnecessary_shield_use = False
-                        break
+                if self.blocked_arrow:
+                    reward += 50
+                    self.shield_reward_given = True
+                    self.unnecessary_shield_use = False
             else:
                 # Could check knight's attack here
                 self.unnecessary_shield_use = True
+        self.blocked_arrow = False
 
         # Unnecessary shield penalty
-        if (self.unnecessary_shield_use and not player.shielded
-           and time.time() - self.shield_start_time >= self.shield_duration / 60):
+        if (self.unnecessary_shield_use and not obs.shielded
+           and game_clock.get_ticks() - self.shield_start_time >= self.shield_duration * 1000 / FPS):
             reward -= 5
             self.unnecessary_shield_use = False
 
         return reward
 
+    def check_shield_block(self, player, enemy):
+        # Called by the Arena's combat resolver before arrow hits are resolved
+        if player.shielded:
+            for arrow in enemy.arrow_group:
+                if not arrow.stopped and arrow.rect.colliderect(player.rect):
+                    self.blocked_arrow = True
+                    return True
+        return False
+
     def update_animation(self):
         ANIMATION_COOLDOWN = 100
         self.image = self.animations[self.state][self.frame_index]
         if not self.facing_right:
             self.image = pygame.transform.flip(self.image, True, False)
         
-        if pygame.time.get_ticks() - self.update_time > ANIMATION_COOLDOWN:
-            self.update_time = pygame.time.get_ticks()
+        if game_clock.get_ticks() - self.update_time > ANIMATION_COOLDOWN:
+            self.update_time = game_clock.get_ticks()
             self.frame_index += 1
         if self.frame_index >= len(self.animations[self.state]):
             self.frame_index = 0
@@ -226,7 +296,7 @@ class Bird(pygame.sprite.Sprite):
             self.shield_frame = 0
             player.shielded = True
             self.shield_reward_given = False
-            self.shield_start_time = time.time()
+            self.shield_start_time = game_clock.get_ticks()
             self.unnecessary_shield_use = False
 
     def update_shield(self, player):
@@ -243,23 +313,23 @@ class Bird(pygame.sprite.Sprite):
                 self.shield_active = False
                 player.shielded = False
                 self.shield_cooldown = self.shield_cooldown_max
-                if self.unnecessary_shield_use:
-                    self.total_reward -= 5
-                self.unnecessary_shield_use = False
+                # A wasted shield keeps unnecessary_shield_use set, so the
+                # next get_reward() charges (and learns) the penalty
 
     def draw_shield(self, screen, player):
         if self.shield_loading:
             idx = self.shield_frame // 2 % len(self.shield_animations["loading"])
             shield_image = self.shield_animations["loading"][idx]
-            screen.blit(shield_image, (self.rect.centerx - shield_image.get_width() // 2,
-                                       self.rect.top - shield_image.get_height()))
+            return screen.blit(shield_image, (self.rect.centerx - shield_image.get_width() // 2,
+                                              self.rect.top - shield_image.get_height()))
         elif self.shield_active:
             idx = self.shield_frame // 6 % len(self.shield_animations["working"])
             shield_image = self.shield_animations["working"][idx]
             shield_image.set_alpha(128)
-            screen.blit(shield_image,
-                        (player.rect.centerx - shield_image.get_width() // 2,
-                         player.rect.centery - shield_image.get_height() // 2))
+            return screen.blit(shield_image,
+                               (player.rect.centerx - shield_image.get_width() // 2,
+                                player.rect.centery - shield_image.get_height() // 2))
+        return None
 
     def reset(self):
         self.rect.center = (400, SCREEN_HEIGHT - 100)
@@ -277,8 +347,8 @@ class Bird(pygame.sprite.Sprite):
         self.shield_frame = 0
         self.shield_reward_given = False
         self.unnecessary_shield_use = False
+        self.blocked_arrow = False
 
     def end_episode(self):
-        self.sarsa.end_episode()
-        print(f"Epsilon: {self.sarsa.epsilon:.6f}, Alpha: {self.sarsa.alpha:.6f}")
+        self.sarsa.end_episode(self.total_reward)
         self.total_reward = 0
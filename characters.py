@@ -11,6 +11,7 @@ from config import (
     WHITE, BLACK, RED, GREEN, BLUE,
     FPS, GRAVITY, JUMP_STRENGTH
 )
+import game_clock
 
 class Character(pygame.sprite.Sprite):
     def __init__(self, x, y):
@@ -36,7 +37,8 @@ class Character(pygame.sprite.Sprite):
             return True
         return False
 
-    def update(self, tile_map):
+    def physics(self, tile_map):
+        # Gravity and floor/ceiling collisions
         self.vel_y += GRAVITY
         self.rect.y += self.vel_y
 
@@ -82,7 +84,7 @@ class Player(Character):
         self.speed = 6
         self.action = 0  # 0: Idle, 1: Run, 2: Jump, 3: Death, 4: Attack, 5: Fall, 6: Hurt
         self.frame_index = 0
-        self.update_time = pygame.time.get_ticks()
+        self.update_time = game_clock.get_ticks()
         self.attacking = False
         self.attack_cooldown = 0
         self.facing_right = True
@@ -96,23 +98,34 @@ class Player(Character):
         self.shield_blocked_attack = False
         self.attack_range = 50
         self.has_hit_enemy = False
+        # Keyboard movement for this tick, carried out in physics
+        self.pending_moves = []
 
         # For resetting:
         self.initial_x = x
         self.initial_y = y
 
-    def update(self, tile_map):
-        super().update(tile_map)
+    # Arena.step runs every entity through the same phases, in order:
+    # decide, physics, (combat, learn,) animate. The keyboard player's
+    # movement is queued by main() before the step and carried out in
+    # physics, so the observation built in combat includes it.
+    def decide(self):
         if self.alive:
-            self.update_animation()
             if self.attack_cooldown > 0:
                 self.attack_cooldown -= 1
-            
+
+            # The hurt knockback runs with its timer, ahead of any input
             if self.hit_timer > 0:
                 self.hit_timer -= 1
                 self.rect.x += self.knockback_speed
                 self.knockback_speed *= 0.9  # Decelerate the knockback
-            
+
+    def physics(self, tile_map):
+        for dx in self.pending_moves:
+            self.move(dx, tile_map)
+        self.pending_moves.clear()
+        super().physics(tile_map)
+        if self.alive:
             # If we land (no more jumping/falling), revert to Idle if we were in jump/fall/hurt
             if not self.jumping and not self.falling and self.hit_timer == 0:
                 if self.action in [2, 5, 6]:
@@ -120,6 +133,10 @@ class Player(Character):
             elif self.vel_y > 0 and not self.falling:
                 self.falling = True
                 self.update_action(5)
+
+    def animate(self):
+        if self.alive:
+            self.update_animation()
         else:
             # If not alive, only update the death animation
             self.update_death_animation()
@@ -130,8 +147,8 @@ class Player(Character):
         if not self.facing_right:
             self.image = pygame.transform.flip(self.image, True, False)
         
-        if pygame.time.get_ticks() - self.update_time > ANIMATION_COOLDOWN:
-            self.update_time = pygame.time.get_ticks()
+        if game_clock.get_ticks() - self.update_time > ANIMATION_COOLDOWN:
+            self.update_time = game_clock.get_ticks()
             self.frame_index += 1
         if self.frame_index >= len(self.animation_list[self.action]):
             if self.action == 4:  # Attack finished
@@ -150,11 +167,14 @@ class Player(Character):
         if not self.facing_right:
             self.image = pygame.transform.flip(self.image, True, False)
         
-        if pygame.time.get_ticks() - self.update_time > ANIMATION_COOLDOWN:
-            self.update_time = pygame.time.get_ticks()
+        if game_clock.get_ticks() - self.update_time > ANIMATION_COOLDOWN:
+            self.update_time = game_clock.get_ticks()
             if self.frame_index < len(self.animation_list[3]) - 1:
                 self.frame_index += 1
 
+    def steer(self, dx):
+        self.pending_moves.append(dx)
+
     def move(self, dx, tile_map):
         if self.alive and not self.attacking and self.hit_timer == 0:
             super().move(dx, tile_map)
@@ -186,7 +206,7 @@ class Player(Character):
         if self.alive and new_action != self.action:
             self.action = new_action
             self.frame_index = 0
-            self.update_time = pygame.time.get_ticks()
+            self.update_time = game_clock.get_ticks()
 
     def take_damage(self, amount, knockback_direction):
         if self.alive and not self.shielded:
@@ -221,7 +241,8 @@ class Player(Character):
         self.vel_y = 0
         self.shielded = False
         self.shield_blocked_attack = False
-        self.update_time = pygame.time.get_ticks()
+        self.pending_moves.clear()
+        self.update_time = game_clock.get_ticks()
         self.image = self.animation_list[self.action][self.frame_index]
 
     def reset_shield(self):
@@ -235,6 +256,8 @@ class AIPlayer(Player):
         self.decision_cooldown = 0
         self.attack_idle_time = 0
         self.has_hit_enemy = False
+        # Shared random module unless given a stream of its own (Arena.seed)
+        self.rng = random
 
     def make_decision(self, enemy):
         if self.attack_idle_time > 0:
@@ -255,7 +278,7 @@ class AIPlayer(Player):
                 self.move(-self.speed, enemy)
         else:
             # Attack with some probability
-            if random.random() < 0.8:
+            if self.rng.random() < 0.8:
                 if self.attack():
                     self.attack_idle_time = 10
             else:
@@ -263,11 +286,14 @@ class AIPlayer(Player):
                 self.move(-self.speed if dx > 0 else self.speed, enemy)
         self.decision_cooldown = 3
 
-    def update(self, enemy, tile_map):
-        super().update(tile_map)
+    def decide(self, enemy=None):
+        super().decide()
+        if enemy is None:
+            return
         self.make_decision(enemy)
 
-        # Check for hitting the enemy
+        # Check for hitting the enemy (resolved with the decision, against
+        # where the target stood at the start of the tick)
         if self.attacking and not self.has_hit_enemy:
             if (abs(self.rect.centerx - enemy.rect.centerx) < 50 and
                 abs(self.rect.centery - enemy.rect.centery) < 50):
@@ -299,7 +325,7 @@ class AIPlayer(Player):
         return False
 
     def reset(self):
-        self.rect.x = random.randint(50, 750)
+        self.rect.x = self.rng.randint(50, 750)
         self.rect.bottom = SCREEN_HEIGHT - 50
         self.health = self.max_health
         self.alive = True
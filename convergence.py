@@ -0,0 +1,133 @@
+from collections import deque
+
+
+class ConvergenceMonitor:
+    # Tells a training run when one SARSA table has stopped changing. After
+    # every episode it compares the table with the copy taken after the
+    # previous one:
+    #
+    #   delta_max / delta_mean   largest / mean |change| of a Q-value
+    #   policy_change            share of visited states whose greedy action
+    #                            changed (rows new since the copy count
+    #                            against an all-zero row)
+    #   train_reward             rolling mean of the last `window` training
+    #                            episodes' rewards (exploring and learning,
+    #                            not a greedy evaluation); train_reward_trend
+    #                            is its change over the previous window and
+    #                            train_reward_z that change in standard errors
+    #
+    # Single episodes move too little to judge a plateau by, so the
+    # stopping rule looks at the same table metrics over `check_every`
+    # episodes (against the copy taken at the previous check). The run has
+    # converged once every metric with a tolerance (None turns a test off)
+    # is below it for `patience` checks in a row, after at least
+    # `min_episodes` episodes. With a constant alpha and exploration on the
+    # table never settles completely: single Q-values keep jumping by alpha
+    # times a reward and a few greedy actions keep flipping between near
+    # ties. The defaults are set for alpha 0.1 and checks every 25 episodes,
+    # where a trained archer plateaus at a mean change of ~0.09 and ~7% of
+    # visited states changing action. The reward test is scale free: the
+    # mean must not have moved by more than reward_tol standard errors.
+    # Every episode is compared row by row, which costs about as much as
+    # copying the table.
+    def __init__(self, check_every=25, window=50, max_delta_tol=None, mean_delta_tol=0.1,
+                 policy_tol=0.1, reward_tol=1.0, patience=3, min_episodes=100):
+        self.check_every = check_every
+        self.window = window
+        self.tolerances = {"delta_max": max_delta_tol, "delta_mean": mean_delta_tol,
+                           "policy_change": policy_tol}
+        self.reward_tol = reward_tol
+        self.patience = patience
+        self.min_episodes = min_episodes
+        self.previous = {}
+        self.previous_check = {}
+        self.rewards = deque(maxlen=2 * window)
+        self.episodes = 0
+        self.calm_checks = 0
+        self.converged = False
+        self.last = {}
+        self.last_check = {}
+
+    def record_reward(self, reward):
+        self.rewards.append(reward)
+
+    def end_episode(self, sarsa, reward=None):
+        # Returns this episode's metrics; on a check they also hold the
+        # stopping rule's, under "check"
+        if reward is not None:
+            self.record_reward(reward)
+        self.episodes += 1
+        current = self.table_values(sarsa)
+        record = {"episode": sarsa.episode_count}
+        record.update(self.compare(sarsa, self.previous, current))
+        record.update(self.reward_metrics())
+        self.previous = current
+        if self.episodes % self.check_every == 0:
+            record["check"] = self.check(sarsa, current)
+        record["converged"] = self.converged
+        self.last = record
+        return record
+
+    @staticmethod
+    def table_values(sarsa):
+        actions = sarsa.actions
+        return {state: tuple(row.get(a, 0.0) for a in actions) for state, row in sarsa.q_table.items()}
+
+    @staticmethod
+    def compare(sarsa, before, current):
+        zeros = (0.0,) * len(sarsa.actions)
+        visited = sarsa.visit_counts
+        delta_max = 0.0
+        delta_sum = 0.0
+        changed = 0
+        compared = 0
+        for state, values in current.items():
+            old_values = before.get(state, zeros)
+            for old, new in zip(old_values, values):
+                change = abs(new - old)
+                delta_sum += change
+                if change > delta_max:
+                    delta_max = change
+            if state in visited:
+                compared += 1
+                if values.index(max(values)) != old_values.index(max(old_values)):
+                    changed += 1
+        entries = len(current) * len(sarsa.actions)
+        return {
+            "delta_max": delta_max,
+            "delta_mean": delta_sum / entries if entries else 0.0,
+            "policy_change": changed / compared if compared else 0.0,
+        }
+
+    def reward_metrics(self):
+        record = {}
+        rewards = list(self.rewards)
+        if rewards:
+            recent = rewards[-self.window:]
+            record["train_reward"] = sum(recent) / len(recent)
+            if len(rewards) == 2 * self.window:
+                earlier = rewards[:self.window]
+                earlier_mean = sum(earlier) / len(earlier)
+                record["train_reward_trend"] = record["train_reward"] - earlier_mean
+                variance = (sum((r - record["train_reward"]) ** 2 for r in recent) +
+                            sum((r - earlier_mean) ** 2 for r in earlier)) / (2 * self.window - 2)
+                stderr = (2 * variance / self.window) ** 0.5
+                record["train_reward_z"] = record["train_reward_trend"] / stderr if stderr else 0.0
+        return record
+
+    def check(self, sarsa, current):
+        record = self.compare(sarsa, self.previous_check, current)
+        self.previous_check = current
+        calm = all(tolerance is None or record[name] < tolerance
+                   for name, tolerance in self.tolerances.items())
+        if self.reward_tol is not None:
+            # Without two full windows there is no telling whether the
+            # reward is still moving
+            z = self.reward_metrics().get("train_reward_z")
+            calm = calm and z is not None and abs(z) < self.reward_tol
+
+        self.calm_checks = self.calm_checks + 1 if calm else 0
+        self.converged = self.episodes >= self.min_episodes and self.calm_checks >= self.patience
+        record["converged"] = self.converged
+        self.last_check = record
+        return record
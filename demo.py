@@ -0,0 +1,64 @@
+import pygame
+
+from env import EnvController
+
+# Human demonstrations: in main(--demo ROLE) the keyboard drives one of the
+# agents instead of the player, so the recorded stream is that agent's own
+# encoded states and actions (see recorder.py and warm_start.py).
+
+
+def knight_action(keys, knight):
+    if keys[pygame.K_SPACE]:
+        return 'attack'
+    if keys[pygame.K_DOWN]:
+        return 'maintain_block' if knight.blocking else 'block'
+    if keys[pygame.K_LEFT]:
+        return 'move_left'
+    if keys[pygame.K_RIGHT]:
+        return 'move_right'
+    return 'idle'
+
+
+def enemy_action(keys, enemy):
+    if keys[pygame.K_SPACE]:
+        return 'shoot'
+    if keys[pygame.K_LEFT]:
+        return 'move_left'
+    if keys[pygame.K_RIGHT]:
+        return 'move_right'
+    return 'idle'
+
+
+def bird_action(keys, bird):
+    if keys[pygame.K_SPACE]:
+        return 'activate_shield'
+    vertical = "up" if keys[pygame.K_UP] else "down" if keys[pygame.K_DOWN] else None
+    horizontal = "left" if keys[pygame.K_LEFT] else "right" if keys[pygame.K_RIGHT] else None
+    if vertical and horizontal:
+        return f'move_{vertical}_{horizontal}'
+    if vertical or horizontal:
+        return f'move_{vertical or horizontal}'
+    return 'idle'
+
+
+KEY_ACTIONS = {"knight": knight_action, "enemy": enemy_action, "bird": bird_action}
+
+
+class DemoController(EnvController):
+    # Stands in for the demonstrated agent's SARSA; the action is read from
+    # the keyboard once per frame.
+    def __init__(self, agent, role):
+        super().__init__(agent.sarsa.actions)
+        self.agent = agent
+        self.role = role
+        self.action = 'idle'
+
+    def read_keys(self, keys):
+        self.action = KEY_ACTIONS[self.role](keys, self.agent)
+
+
+def take_control(arena, role):
+    agent = getattr(arena, role)
+    controller = DemoController(agent, role)
+    agent.sarsa = controller
+    return controller
@@ -13,16 +13,19 @@ from config import (
 )
 from characters import Character
 from sarsa import SARSA
+import game_clock
+from state_codec import StateCodec
+from observation import PLAYER, ENEMY
 
 
 class Arrow(pygame.sprite.Sprite):
+    # The arrow image, loaded once, and its scaled rotations by whole degree
+    base_image = None
+    rotations = {}
+
     def __init__(self, x, y, direction):
         super().__init__()
-        self.image = pygame.image.load("img/archer/arrow/0.png").convert_alpha()
-        self.image = pygame.transform.scale(
-            self.image,
-            (int(self.image.get_width() * 1.5), int(self.image.get_height() * 1.5))
-        )
+        self.image = Arrow.rotated(0)
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
         self.speed = 6
@@ -39,14 +42,7 @@ class Arrow(pygame.sprite.Sprite):
 
             # Rotate arrow
             self.angle = -math.atan2(self.vel_y, self.speed * self.direction)
-            rotated_image = pygame.transform.rotate(
-                pygame.image.load("img/archer/arrow/0.png").convert_alpha(),
-                math.degrees(self.angle)
-            )
-            self.image = pygame.transform.scale(
-                rotated_image,
-                (int(rotated_image.get_width() * 1.5), int(rotated_image.get_height() * 1.5))
-            )
+            self.image = Arrow.rotated(round(math.degrees(self.angle)))
 
             if self.rect.bottom >= SCREEN_HEIGHT - 60:
                 self.rect.bottom = SCREEN_HEIGHT - 60
@@ -56,9 +52,42 @@ class Arrow(pygame.sprite.Sprite):
         if self.rect.right < 0 or self.rect.left > SCREEN_WIDTH:
             self.kill()
 
+    @staticmethod
+    def rotated(degrees):
+        image = Arrow.rotations.get(degrees)
+        if image is None:
+            if Arrow.base_image is None:
+                Arrow.base_image = pygame.image.load("img/archer/Arrow/0.png").convert_alpha()
+            if degrees:
+                rotated_image = pygame.transform.rotate(Arrow.base_image, degrees)
+            else:
+                rotated_image = Arrow.base_image
+            image = pygame.transform.scale(
+                rotated_image,
+                (int(rotated_image.get_width() * 1.5), int(rotated_image.get_height() * 1.5))
+            )
+            Arrow.rotations[degrees] = image
+        return image
+
 
 class Enemy(Character):
     animation_lists = None
+    # Subclasses (the rogue) swap in their own learner and observation row
+    CHARACTER_TYPE = "enemy"
+    ROW = ENEMY
+
+    # Values of each "_"-separated part of get_state, in order
+    STATE_FACTORS = [
+        ["melee_range", "close", "medium_close", "medium", "medium_far", "far", "very_far", "extreme_range"],
+        ["right", "left"],
+        ["same_level", "above", "below"],
+        ["high", "medium", "low"],
+        ["high", "medium", "low"],
+        ["facing_player", "not_facing_player"],
+        ["attack_ready", "attack_cooldown"],
+        ["far_to_left_wall", "far_to_right_wall", "no_wall"],
+    ]
+    state_codec = StateCodec(STATE_FACTORS)
 
     @classmethod
     def load_animations(cls):
@@ -74,11 +103,11 @@ class Enemy(Character):
                     temp_list.append(img)
                 cls.animation_lists.append(temp_list)
 
-    def __init__(self, x, y):
+    def __init__(self, x, y, decision_interval=1):
         super().__init__(x, y)
-        if Enemy.animation_lists is None:
-            Enemy.load_animations()
-        self.animation_list = Enemy.animation_lists
+        if self.animation_lists is None:
+            self.load_animations()
+        self.animation_list = self.animation_lists
         self.health = 50
         self.max_health = self.health
         self.previous_health = self.health
@@ -86,7 +115,7 @@ class Enemy(Character):
         self.direction = 1
         self.action = 0  # 0: Idle, 1: Run, 2: Death, 3: Attack
         self.frame_index = 0
-        self.update_time = pygame.time.get_ticks()
+        self.update_time = game_clock.get_ticks()
         self.alive = True
         self.death_timer = time.time()
         self.vertical_offset = 0
@@ -99,23 +128,33 @@ class Enemy(Character):
         self.invulnerable_duration = 60
         self.just_attacked = False
         self.death_penalty_applied = False
+        self.hit_player = False
+        self.killed_player = False
 
         self.image = self.animation_list[self.action][self.frame_index]
         self.rect = self.image.get_rect()
         self.rect.x = max(0, min(x, SCREEN_WIDTH - self.rect.width))
         self.rect.bottom = y + self.vertical_offset
 
-        self.sarsa = SARSA(character_type="enemy")
+        self.sarsa = SARSA(character_type=self.CHARACTER_TYPE, decision_interval=decision_interval,
+                           state_space_size=self.state_codec.size)
         self.previous_state = None
         self.previous_action = None
         self.episode_steps = 0
         self.total_reward = 0
+        # Off when the owner reads get_reward() itself after each tick (ArenaEnv)
+        self.credit_rewards = True
         self.knockback_velocity = 0
         self.knockback_decay = 0.8
+        # Set by the Arena (see observation.py)
+        self.observation = None
+        # Optional DecisionScheduler (see scheduler.py)
+        self.scheduler = None
 
     def get_state(self, player):
-        dx = player.rect.x - self.rect.x
-        dy = player.rect.y - self.rect.y
+        obs = self.observation
+        dx = obs.dx[self.ROW][PLAYER]
+        dy = obs.dy[self.ROW][PLAYER]
 
         if abs(dx) <= 40:
             x_state = "melee_range"
@@ -144,7 +183,7 @@ class Enemy(Character):
             y_state = "below"
 
         enemy_health = "high" if self.health > 35 else ("medium" if self.health > 15 else "low")
-        player_health = "high" if player.health > 66 else ("medium" if player.health > 33 else "low")
+        player_health = "high" if obs.health[PLAYER] > 66 else ("medium" if obs.health[PLAYER] > 33 else "low")
 
         facing_player = "facing_player" if (
             (self.direction == 1 and dx > 0) or (self.direction == -1 and dx < 0)
@@ -152,9 +191,9 @@ class Enemy(Character):
 
         attack_ready = "attack_ready" if self.attack_cooldown == 0 else "attack_cooldown"
 
-        if self.rect.left <= 100:
+        if obs.left[self.ROW] <= 100:
             wall_state = "far_to_left_wall"
-        elif self.rect.right >= SCREEN_WIDTH - 100:
+        elif obs.right[self.ROW] >= SCREEN_WIDTH - 100:
             wall_state = "far_to_right_wall"
         else:
             wall_state = "no_wall"
@@ -181,8 +220,8 @@ class Enemy(Character):
         if self.attacking:
             # Attack animation uses a separate index
             self.frame_index = self.attack_frame
-        elif pygame.time.get_ticks() - self.update_time > ANIMATION_COOLDOWN:
-            self.update_time = pygame.time.get_ticks()
+        elif game_clock.get_ticks() - self.update_time > ANIMATION_COOLDOWN:
+            self.update_time = game_clock.get_ticks()
             self.frame_index += 1
             if self.frame_index >= max_frames:
                 if self.action == 2:  # Death
@@ -197,11 +236,9 @@ class Enemy(Character):
         if new_action != self.action:
             self.action = new_action
             self.frame_index = 0
-            self.update_time = pygame.time.get_ticks()
+            self.update_time = game_clock.get_ticks()
 
-    def update(self, player, tile_map):
-        super().update(tile_map)
-        self.update_animation()
+    def decide(self, player):
         if self.attack_cooldown > 0:
             self.attack_cooldown -= 1
 
@@ -212,12 +249,43 @@ class Enemy(Character):
             self.flash_timer -= 1
 
         if self.alive:
-            current_state = self.get_state(player)
-            action = self.sarsa.get_action(current_state)
-
+            if self.previous_state is not None and self.credit_rewards:
+                reward = self.get_reward()
+                self.total_reward += reward
+                self.sarsa.add_reward(reward)
+            if self.previous_state is None or (self.sarsa.should_decide() and (
+                    self.scheduler is None or self.scheduler.may_decide(self))):
+                current_state = self.get_state(player)
+                action = self.sarsa.decide(current_state, self.previous_state, self.previous_action)
+                self.previous_state = current_state
+                self.previous_action = action
+                if self.scheduler:
+                    self.scheduler.decided()
+            # Otherwise the last decision is repeated
+            self.sarsa.tick()
+            self.episode_steps += 1
+        elif self.previous_state is not None:
+            # Final transition of the episode
+            if self.credit_rewards:
+                reward = self.get_reward()
+                self.total_reward += reward
+                self.sarsa.add_reward(reward)
+            self.sarsa.finish(self.previous_state, self.previous_action)
+            self.previous_state = None
+            self.previous_action = None
+
+    def threatened(self):
+        # The player is swinging at us: decide now even if the scheduler
+        # would rather defer
+        obs = self.observation
+        return obs.attacking[PLAYER] and abs(obs.cdx[self.ROW][PLAYER]) < 100 and abs(obs.cdy[self.ROW][PLAYER]) < 60
+
+    def physics(self, tile_map):
+        super().physics(tile_map)
+        if self.alive:
             # Only act if not heavily knocked back
             if abs(self.knockback_velocity) < 1:
-                self.act(action, tile_map)
+                self.act(self.previous_action, tile_map)
 
             # Apply knockback
             if self.knockback_velocity != 0:
@@ -231,10 +299,6 @@ class Enemy(Character):
                 if abs(self.knockback_velocity) < 0.5:
                     self.knockback_velocity = 0
 
-            self.previous_state = current_state
-            self.previous_action = action
-            self.episode_steps += 1
-
         if self.attacking:
             self.attack_frame += 1
             if self.attack_frame >= len(self.animation_list[3]):
@@ -244,6 +308,9 @@ class Enemy(Character):
 
         self.arrow_group.update()
 
+    def animate(self):
+        self.update_animation()
+
     def act(self, action, tile_map):
         if self.alive and self.knockback_velocity == 0:
             if action == 'move_left':
@@ -256,7 +323,6 @@ class Enemy(Character):
                 self.attack()
 
     def move_ai(self, tile_map):
-        super().update(tile_map)
         if self.alive and not self.attacking:
             new_x = self.rect.x + self.direction * self.speed
             if 0 <= new_x <= SCREEN_WIDTH - self.rect.width:
@@ -265,11 +331,11 @@ class Enemy(Character):
                 self.direction *= -1
             self.update_action(1)  # Run
 
-    def attack(self):
+    def attack(self, cooldown=90):
         if self.attack_cooldown == 0 and self.alive and not self.attacking:
             self.attacking = True
             self.attack_frame = 0
-            self.attack_cooldown = 90
+            self.attack_cooldown = cooldown
             self.update_action(3)
             self.just_attacked = True
             return True
@@ -294,8 +360,27 @@ class Enemy(Character):
                 self.alive = False
                 self.update_action(2)
 
+    def get_reward(self):
+        # Covers everything since the previous decision: arrow hits are
+        # flagged by whoever resolves the collision.
+        reward = 0
+        if self.hit_player:
+            reward += 30
+            if self.killed_player:
+                reward += 50
+        if self.health < self.previous_health:
+            reward -= 20
+        if self.health == 0 and not self.death_penalty_applied:
+            reward -= 100
+            self.death_penalty_applied = True
+
+        self.previous_health = self.health
+        self.hit_player = False
+        self.killed_player = False
+        return reward
+
     def draw_arrows(self, surface):
-        self.arrow_group.draw(surface)
+        return [surface.blit(arrow.image, arrow.rect) for arrow in self.arrow_group]
 
     def check_arrow_hit(self, player):
         hit_player = False
@@ -311,6 +396,8 @@ class Enemy(Character):
                 if not player.alive:
                     killed_player = True
                 break
+        self.hit_player = self.hit_player or hit_player
+        self.killed_player = self.killed_player or killed_player
         return hit_player, killed_player
 
     def reset(self):
@@ -334,8 +421,10 @@ class Enemy(Character):
         self.just_attacked = False
         self.death_penalty_applied = False
         self.knockback_velocity = 0
+        self.hit_player = False
+        self.killed_player = False
 
     def end_episode(self):
-        self.sarsa.end_episode()
+        self.sarsa.end_episode(self.total_reward)
         self.episode_steps = 0
         self.total_reward = 0
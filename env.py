@@ -0,0 +1,210 @@
+import random
+
+import numpy as np
+import pygame
+
+from arena import Arena, init_headless
+import game_clock
+from pixels import PixelObserver
+
+try:
+    from gymnasium import spaces
+except ImportError:
+    spaces = None
+
+
+class EnvController:
+    # Stands in for the controlled agent's SARSA: the agent keeps building
+    # its own state and rewards, but its action comes from env.step() and
+    # nothing is learned in-game.
+    def __init__(self, actions):
+        self.actions = list(actions)
+        self.action = self.actions[-1]
+        self.pending_reward = 0.0
+        self.epsilon = 0.0
+        self.alpha = 0.0
+        self.decision_interval = 1
+
+    def should_decide(self):
+        return True
+
+    def add_reward(self, reward):
+        self.pending_reward += reward
+
+    def decide(self, state, previous_state, previous_action):
+        return self.action
+
+    def get_action(self, state):
+        return self.action
+
+    def get_best_action(self, state):
+        return self.action
+
+    def finish(self, previous_state, previous_action):
+        pass
+
+    def tick(self):
+        pass
+
+    def observe(self, *transition):
+        pass
+
+    def learn(self):
+        pass
+
+    def end_episode(self, reward=None):
+        pass
+
+
+class ArenaEnv:
+    # Gymnasium-style single-agent view of the arena. One of "enemy",
+    # "knight" or "bird" is controlled through step(); the other agents
+    # follow their current Q-tables and the player is an AIPlayer.
+    # Observations are StateCodec ids of the controlled agent's state, or
+    # with observation="pixels" a stack of rendered frames (see pixels.py;
+    # the returned array is a view that the next step overwrites).
+    def __init__(self, role="knight", max_steps=3000, action_repeat=1, opponent_epsilon=0.0,
+                 train_opponents=False, owns_clock=True, observation="state", pixel_size=(84, 84),
+                 grayscale=True, frame_stack=4):
+        if role not in ("enemy", "knight", "bird"):
+            raise ValueError(f"Unknown role: {role}")
+        if observation not in ("state", "pixels"):
+            raise ValueError(f"Unknown observation: {observation}")
+        if pygame.display.get_surface() is None:
+            init_headless()
+        game_clock.use_simulated_time()
+        self.role = role
+        self.max_steps = max_steps
+        self.action_repeat = action_repeat
+        self.arena = Arena(ai_player=True, advance_clock=owns_clock)
+        for agent in self.arena.agents:
+            agent.sarsa.epsilon = opponent_epsilon
+            agent.sarsa.frozen = not train_opponents
+
+        self.agent = getattr(self.arena, role)
+        self.controller = EnvController(self.agent.sarsa.actions)
+        self.agent.sarsa = self.controller
+        # step() reads the reward once per tick, after combat; the agent's
+        # own decide would credit the same reward again on the next tick
+        self.agent.credit_rewards = False
+        self.actions = self.controller.actions
+        self.codec = self.agent.state_codec
+        self.n_actions = len(self.actions)
+        self.n_observations = self.codec.size
+        self.pixels = None
+        if observation == "pixels":
+            self.pixels = PixelObserver(self.arena, size=pixel_size, grayscale=grayscale, stack=frame_stack)
+            self.observation_shape, self.observation_dtype = self.pixels.shape, np.uint8
+        else:
+            self.observation_shape, self.observation_dtype = (), np.int64
+        if spaces is not None:
+            self.action_space = spaces.Discrete(self.n_actions)
+            if self.pixels:
+                self.observation_space = spaces.Box(0, 255, self.observation_shape, np.uint8)
+            else:
+                self.observation_space = spaces.Discrete(self.n_observations)
+        self.steps = 0
+        self.episode_return = 0.0
+
+    def get_state(self):
+        arena = self.arena
+        if self.role == "bird":
+            return self.agent.get_state(arena.player, knight=arena.knight, enemy=arena.enemy)
+        return self.agent.get_state(arena.player)
+
+    def get_reward(self):
+        arena = self.arena
+        if self.role == "bird":
+            return self.agent.get_reward(arena.player, knight=arena.knight, enemy=arena.enemy)
+        return self.agent.get_reward()
+
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            random.seed(seed)
+        self.arena.reset()
+        self.steps = 0
+        self.episode_return = 0.0
+        # Fold away anything left over from the previous episode
+        self.get_reward()
+        if self.pixels:
+            self.pixels.reset()
+        return self.observe(self.get_state()), {}
+
+    def observe(self, state):
+        if self.pixels:
+            return self.pixels.observe()
+        return self.codec.encode(state)
+
+    def step(self, action):
+        self.controller.action = self.actions[int(action)]
+        reward = 0.0
+        for _ in range(self.action_repeat):
+            self.arena.step()
+            tick_reward = self.get_reward()
+            self.agent.total_reward += tick_reward
+            reward += tick_reward
+            self.steps += 1
+            if self.is_terminal():
+                break
+        self.episode_return += reward
+
+        terminated = self.is_terminal()
+        truncated = not terminated and self.steps >= self.max_steps
+        state = self.get_state()
+        info = {"state": state, "episode_return": self.episode_return}
+        return self.observe(state), reward, terminated, truncated, info
+
+    def is_terminal(self):
+        if self.role == "bird":
+            return self.arena.is_over()
+        return not self.agent.alive or self.arena.is_over()
+
+    def render(self, screen):
+        self.arena.draw(screen)
+
+    def close(self):
+        pass
+
+
+class VectorArenaEnv:
+    # Steps `num_envs` independent arenas in lockstep. Finished episodes are
+    # reset automatically: the returned observation is then the first one of
+    # the new episode and the last one is in info["final_observation"].
+    def __init__(self, num_envs, role="knight", **kwargs):
+        self.envs = [ArenaEnv(role=role, owns_clock=False, **kwargs) for _ in range(num_envs)]
+        self.num_envs = num_envs
+        self.n_actions = self.envs[0].n_actions
+        self.n_observations = self.envs[0].n_observations
+
+    def reset(self, seed=None):
+        observations = self.empty_observations()
+        for i, env in enumerate(self.envs):
+            observations[i], _ = env.reset(seed=None if seed is None else seed + i)
+        return observations, [{} for _ in self.envs]
+
+    def empty_observations(self):
+        env = self.envs[0]
+        return np.empty((self.num_envs,) + env.observation_shape, dtype=env.observation_dtype)
+
+    def step(self, actions):
+        observations = self.empty_observations()
+        rewards = np.empty(self.num_envs, dtype=np.float64)
+        terminated = np.zeros(self.num_envs, dtype=bool)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            observation, reward, term, trunc, info = env.step(action)
+            if term or trunc:
+                # Copied: a pixel observation is a view the reset overwrites
+                info["final_observation"] = np.array(observation)
+                observation, _ = env.reset()
+            observations[i], rewards[i] = observation, reward
+            terminated[i], truncated[i] = term, trunc
+            infos.append(info)
+        # The arenas share the simulated clock, so it moves once per batch
+        game_clock.advance(self.envs[0].action_repeat)
+        return observations, rewards, terminated, truncated, infos
+
+    def close(self):
+        for env in self.envs:
+            env.close()
@@ -0,0 +1,152 @@
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import random
+from multiprocessing import Pool
+
+from arena import Arena, init_worker
+import game_clock
+import qtable
+from sarsa import SARSA
+
+# Scores every checkpoint of a role on the same battery of seeded headless
+# matches against the scripted AIPlayer and writes a learning curve plus a
+# BEST pointer to <q_table_folder>/eval (a subfolder, so the cache isn't
+# mistaken for a checkpoint). Scores are cached by the checkpoint's content
+# hash and the battery settings, so re-runs only evaluate new files.
+#
+#   python evaluate.py knight --matches 20
+#
+# The knight and archer are evaluated alone; the bird needs someone to
+# protect the player from, so it gets a knight and an archer with empty
+# tables (always the first action).
+TEAMS = {"knight": "hostile", "enemy": "hostile", "bird": "player"}
+CACHE_FILE = "eval_cache.json"
+CURVE_FILE = "learning_curve.csv"
+BEST_FILE = "BEST"
+
+
+def episode_number(path):
+    try:
+        return int(path.split('_')[-1].split('.')[0])
+    except ValueError:
+        return None
+
+
+def checkpoints(role):
+    folder = SARSA.Q_TABLE_FOLDERS[role]
+    paths = glob.glob(f'{folder}/*.json') + glob.glob(f'{folder}/*.npz')
+    numbered = [(episode_number(p), p) for p in paths]
+    return sorted((n, p) for n, p in numbered if n is not None)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def evaluate_checkpoint(task):
+    # Runs in a worker process. The clock and the arena are fresh for every
+    # checkpoint so the same file always gets the same score.
+    SARSA.load_checkpoints = False
+    game_clock.reset()
+    role = task["role"]
+    arena = Arena(ai_player=True, enemy=role != "knight", knight=role != "enemy", bird=role == "bird")
+    for agent in arena.agents:
+        agent.sarsa.frozen = True
+        agent.sarsa.epsilon = 0.0
+    agent = getattr(arena, role)
+    agent.sarsa.q_table, _ = qtable.load_checkpoint(task["path"])
+
+    rewards = []
+    wins = 0.0
+    for seed in task["seeds"]:
+        random.seed(seed)
+        arena.reset()
+        winner = arena.run_episode(task["max_ticks"])
+        rewards.append(agent.total_reward)
+        wins += 1.0 if winner == TEAMS[role] else 0.5 if winner == "draw" else 0.0
+        arena.end_episode()
+    return task["hash"], {
+        "mean_reward": sum(rewards) / len(rewards),
+        "win_rate": wins / len(rewards),
+        "states": len(agent.sarsa.q_table),
+    }
+
+
+class CheckpointEvaluator:
+    def __init__(self, role, matches=20, max_ticks=3000, seed=0):
+        self.role = role
+        self.folder = os.path.join(SARSA.Q_TABLE_FOLDERS[role], "eval")
+        os.makedirs(self.folder, exist_ok=True)
+        self.seeds = [seed * 100003 + i for i in range(matches)]
+        self.max_ticks = max_ticks
+        # Scores only carry over between runs of the same battery (and
+        # lineup: earlier versions gave the knight and archer a bird)
+        self.battery = f"{role}:{matches}:{max_ticks}:{seed}:v2"
+        self.cache_path = os.path.join(self.folder, CACHE_FILE)
+        self.cache = {}
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path, "r") as f:
+                self.cache = json.load(f)
+        self.scores = self.cache.setdefault(self.battery, {})
+
+    def save_cache(self):
+        tmp = self.cache_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.cache, f)
+        os.replace(tmp, self.cache_path)
+
+    def run(self, processes=None):
+        files = [(n, p, file_hash(p)) for n, p in checkpoints(self.role)]
+        tasks = []
+        queued = set()
+        for _, path, digest in files:
+            if digest not in self.scores and digest not in queued:
+                queued.add(digest)
+                tasks.append({"role": self.role, "path": path, "hash": digest,
+                              "seeds": self.seeds, "max_ticks": self.max_ticks})
+        print(f"{len(files)} checkpoints, {len(tasks)} to evaluate")
+        if tasks:
+            with Pool(processes=processes, initializer=init_worker) as pool:
+                for done, (digest, score) in enumerate(pool.imap_unordered(evaluate_checkpoint, tasks), 1):
+                    self.scores[digest] = score
+                    # Saved as we go so an interrupted run keeps its progress
+                    if done % 10 == 0 or done == len(tasks):
+                        self.save_cache()
+        return self.write_curve(files)
+
+    def write_curve(self, files):
+        rows = [(n, p, self.scores[d]) for n, p, d in files if d in self.scores]
+        with open(os.path.join(self.folder, CURVE_FILE), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["episode", "checkpoint", "mean_reward", "win_rate", "states"])
+            for n, p, score in rows:
+                writer.writerow([n, p, f"{score['mean_reward']:.3f}", f"{score['win_rate']:.3f}", score["states"]])
+        if not rows:
+            return None
+        # Ties go to the later checkpoint
+        _, best, score = max(rows, key=lambda r: (r[2]["mean_reward"], r[0]))
+        with open(os.path.join(self.folder, BEST_FILE), "w") as f:
+            f.write(best)
+        print(f"Best checkpoint: {best} (mean reward {score['mean_reward']:.1f}, "
+              f"win rate {score['win_rate']:.2f})")
+        return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate all checkpoints of a role and build a learning curve")
+    parser.add_argument("role", choices=sorted(TEAMS))
+    parser.add_argument("--matches", type=int, default=20, help="seeded matches per checkpoint")
+    parser.add_argument("--max-ticks", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    CheckpointEvaluator(args.role, args.matches, args.max_ticks, args.seed).run(args.processes)
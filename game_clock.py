@@ -0,0 +1,39 @@
+import pygame
+
+from config import FPS
+
+# Animation timers read the time through here. In the windowed game this is
+# the wall clock; headless and accelerated runs switch to simulated time so
+# that animations advance per tick rather than per millisecond.
+simulated_ticks = None
+
+
+def get_ticks():
+    if simulated_ticks is None:
+        return pygame.time.get_ticks()
+    return simulated_ticks * 1000 // FPS
+
+
+def use_simulated_time():
+    global simulated_ticks
+    if simulated_ticks is None:
+        simulated_ticks = 0
+
+
+def reset():
+    # Back to tick 0, for runs that must replay identically. Only safe
+    # before building the sprites that will run on it.
+    global simulated_ticks
+    if simulated_ticks is not None:
+        simulated_ticks = 0
+
+
+def use_wall_time():
+    global simulated_ticks
+    simulated_ticks = None
+
+
+def advance(ticks=1):
+    global simulated_ticks
+    if simulated_ticks is not None:
+        simulated_ticks += ticks
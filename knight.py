@@ -10,10 +10,30 @@ from config import (
 )
 from characters import Character
 from sarsa import SARSA
+import game_clock
+from state_codec import StateCodec
+from observation import PLAYER, KNIGHT
 
 class Knight(Character):
     animation_lists = None
 
+    # Values of each "_"-separated part of get_state, in order
+    STATE_FACTORS = [
+        ["melee_range", "close", "medium", "far"],
+        ["right", "left"],
+        ["same_level", "above", "below"],
+        ["high", "medium", "low"],
+        ["high", "medium", "low"],
+        ["idle", "attack", "walk", "death", "block"],
+        ["facing_player", "not_facing_player"],
+        ["attack_ready", "attack_cooldown"],
+        ["player_attacking", "player_not_attacking"],
+        ["close_to_left_wall", "close_to_right_wall", "no_wall"],
+        ["shield_ready", "shield_cooldown"],
+        ["not_blocking", "blocking_0", "blocking_1", "blocking_2", "blocking_3", "blocking_4"],
+    ]
+    state_codec = StateCodec(STATE_FACTORS)
+
     @classmethod
     def load_animations(cls):
         if cls.animation_lists is None:
@@ -31,7 +51,7 @@ class Knight(Character):
                     temp_list.append(img)
                 cls.animation_lists.append(temp_list)
 
-    def __init__(self, x, y):
+    def __init__(self, x, y, decision_interval=1):
         super().__init__(x, y)
         if Knight.animation_lists is None:
             Knight.load_animations()
@@ -43,7 +63,7 @@ class Knight(Character):
         self.direction = 1
         self.action = 0  # 0: Idle, 1: Attack, 2: Walk, 3: Death, 4: Block
         self.frame_index = 0
-        self.update_time = pygame.time.get_ticks()
+        self.update_time = game_clock.get_ticks()
         self.alive = True
         self.death_timer = time.time()
         self.vertical_offset = 0
@@ -64,11 +84,14 @@ class Knight(Character):
         self.rect.x = max(0, min(x, SCREEN_WIDTH - self.rect.width))
         self.rect.bottom = y + self.vertical_offset
         
-        self.sarsa = SARSA(character_type="knight")
+        self.sarsa = SARSA(character_type="knight", decision_interval=decision_interval,
+                           state_space_size=self.state_codec.size)
         self.previous_state = None
         self.previous_action = None
         self.episode_steps = 0
         self.total_reward = 0
+        # Off when the owner reads get_reward() itself after each tick (ArenaEnv)
+        self.credit_rewards = True
         self.knockback_velocity = 0
         self.knockback_decay = 0.7
         self.shield_cooldown = 0
@@ -82,10 +105,15 @@ class Knight(Character):
         
         self.hit_player = False
         self.killed_player = False
+        # Set by the Arena (see observation.py)
+        self.observation = None
+        # Optional DecisionScheduler (see scheduler.py)
+        self.scheduler = None
 
     def get_state(self, player):
-        dx = player.rect.x - self.rect.x
-        dy = player.rect.y - self.rect.y
+        obs = self.observation
+        dx = obs.dx[KNIGHT][PLAYER]
+        dy = obs.dy[KNIGHT][PLAYER]
         
         # Distance
         if abs(dx) <= self.attack_range:
@@ -107,17 +135,17 @@ class Knight(Character):
             y_state = "below"
         
         knight_health = "high" if self.health > 66 else ("medium" if self.health > 20 else "low")
-        player_health = "high" if player.health > 66 else ("medium" if player.health > 20 else "low")
+        player_health = "high" if obs.health[PLAYER] > 66 else ("medium" if obs.health[PLAYER] > 20 else "low")
 
         current_action = ["idle", "attack", "walk", "death", "block"][self.action]
         
-        facing_player = "facing_player" if self.is_facing_player() else "not_facing_player"
+        facing_player = "facing_player" if self.observed_facing_player() else "not_facing_player"
         attack_ready = "attack_ready" if self.attack_cooldown == 0 else "attack_cooldown"
-        player_attacking = "player_attacking" if player.attacking else "player_not_attacking"
+        player_attacking = "player_attacking" if obs.attacking[PLAYER] else "player_not_attacking"
 
-        if self.rect.left <= 50:
+        if obs.left[KNIGHT] <= 50:
             wall_state = "close_to_left_wall"
-        elif self.rect.right >= SCREEN_WIDTH - 50:
+        elif obs.right[KNIGHT] >= SCREEN_WIDTH - 50:
             wall_state = "close_to_right_wall"
         else:
             wall_state = "no_wall"
@@ -130,6 +158,12 @@ class Knight(Character):
                 f"{current_action}_{facing_player}_{attack_ready}_{player_attacking}_"
                 f"{wall_state}_{shield_ready}_{block_state}")
 
+    def observed_facing_player(self):
+        # is_facing_player() as of the tick's observation
+        player_dx = self.observation.cdx[KNIGHT][PLAYER]
+        return (self.player is not None and
+                ((self.direction == 1 and player_dx > 0) or (self.direction == -1 and player_dx < 0)))
+
     def is_facing_player(self):
         if self.player:
             return ((self.direction == 1 and self.player.rect.centerx > self.rect.centerx) or
@@ -164,8 +198,6 @@ class Knight(Character):
             else:
                 self.update_action(0)
 
-        self.previous_action = action
-
     def move_ai(self, tile_map):
         if self.alive and not self.attacking and not self.blocking:
             dx = self.direction * self.speed
@@ -216,14 +248,13 @@ class Knight(Character):
                 self.health = 0
                 self.alive = False
                 self.update_action(3)
-                if not self.death_penalty_applied:
-                    self.total_reward -= 100
-                    self.death_penalty_applied = True
 
     def check_melee_hit(self, player):
+        # Called by the Arena's combat resolver once the tick's observation is in
+        obs = self.observation
         if (self.attacking and not self.attack_landed and self.is_facing_player() and
-            abs(self.rect.centerx - player.rect.centerx) < self.attack_range and
-            abs(self.rect.centery - player.rect.centery) < 50):
+            abs(obs.cdx[KNIGHT][PLAYER]) < self.attack_range and
+            abs(obs.cdy[KNIGHT][PLAYER]) < 50):
             knockback_direction = 1 if self.direction > 0 else -1
             player.take_damage(10, knockback_direction)
             self.attack_landed = True
@@ -234,6 +265,8 @@ class Knight(Character):
         return False
 
     def get_reward(self):
+        # Covers everything since the previous decision, including damage
+        # resolved in the main loop after this knight's update.
         reward = 0
         if self.hit_player:
             reward += 30
@@ -241,22 +274,18 @@ class Knight(Character):
                 reward += 50
         if self.health < self.previous_health:
             reward -= 20
-        if self.blocking and self.shield_used and self.is_facing_player():
+        if self.blocking and self.shield_used and self.observed_facing_player():
             reward += 30
         if self.health == 0 and not self.death_penalty_applied:
-            reward -= 50
+            reward -= 100
             self.death_penalty_applied = True
 
         self.previous_health = self.health
-        return reward
-
-    def update(self, player, tile_map):
-        super().update(tile_map)
-        self.update_animation()
         self.hit_player = False
         self.killed_player = False
-        self.update_animation()
+        return reward
 
+    def decide(self, player):
         if self.attack_cooldown > 0:
             self.attack_cooldown -= 1
         if self.invulnerable_timer > 0:
@@ -267,13 +296,41 @@ class Knight(Character):
             self.shield_cooldown -= 1
         
         if self.alive:
-            current_state = self.get_state(player)
-            action = self.sarsa.get_action(current_state)
-            self.act(action, player, tile_map)
-            self.check_melee_hit(player)
-            self.previous_state = current_state
-            self.previous_action = action
+            if self.previous_state is not None and self.credit_rewards:
+                reward = self.get_reward()
+                self.total_reward += reward
+                self.sarsa.add_reward(reward)
+            if self.previous_state is None or (self.sarsa.should_decide() and (
+                    self.scheduler is None or self.scheduler.may_decide(self))):
+                current_state = self.get_state(player)
+                action = self.sarsa.decide(current_state, self.previous_state, self.previous_action)
+                self.previous_state = current_state
+                self.previous_action = action
+                if self.scheduler:
+                    self.scheduler.decided()
+            # Otherwise the last decision is repeated
+            self.sarsa.tick()
             self.episode_steps += 1
+        elif self.previous_state is not None:
+            # Final transition of the episode
+            if self.credit_rewards:
+                reward = self.get_reward()
+                self.total_reward += reward
+                self.sarsa.add_reward(reward)
+            self.sarsa.finish(self.previous_state, self.previous_action)
+            self.previous_state = None
+            self.previous_action = None
+
+    def threatened(self):
+        # The player is swinging at us: decide now even if the scheduler
+        # would rather defer
+        obs = self.observation
+        return obs.attacking[PLAYER] and abs(obs.cdx[KNIGHT][PLAYER]) < 100 and abs(obs.cdy[KNIGHT][PLAYER]) < 60
+
+    def physics(self, player, tile_map):
+        super().physics(tile_map)
+        if self.alive:
+            self.act(self.previous_action, player, tile_map)
 
         # Attack animation progression
         if self.attacking:
@@ -297,6 +354,9 @@ class Knight(Character):
                 self.knockback_velocity = 0
         self.rect.x = max(0, min(self.rect.x, SCREEN_WIDTH - self.rect.width))
 
+    def animate(self):
+        self.update_animation()
+
     def update_animation(self):
         ANIMATION_COOLDOWN = 100
         max_frames = len(self.animation_list[self.action])
@@ -307,8 +367,8 @@ class Knight(Character):
         else:
             if self.attacking:
                 self.frame_index = int(min(self.attack_frame, max_frames - 1))
-            elif pygame.time.get_ticks() - self.update_time > ANIMATION_COOLDOWN:
-                self.update_time = pygame.time.get_ticks()
+            elif game_clock.get_ticks() - self.update_time > ANIMATION_COOLDOWN:
+                self.update_time = game_clock.get_ticks()
                 self.frame_index += 1
                 if self.frame_index >= max_frames:
                     if self.action == 3:  # Death
@@ -332,7 +392,7 @@ class Knight(Character):
         if new_action != self.action:
             self.action = new_action
             self.frame_index = 0
-            self.update_time = pygame.time.get_ticks()
+            self.update_time = game_clock.get_ticks()
 
     def reset(self):
         self.health = self.max_health
@@ -363,6 +423,6 @@ class Knight(Character):
         self.killed_player = False
 
     def end_episode(self):
-        self.sarsa.end_episode()
+        self.sarsa.end_episode(self.total_reward)
         self.episode_steps = 0
         self.total_reward = 0
@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+from multiprocessing import Pool
+
+from arena import Arena, init_worker
+import qtable
+from sarsa import SARSA
+
+ROLES = ["knight", "enemy", "bird"]
+# Knight and archer win by killing the player; the bird wins with the player
+TEAMS = {"knight": "hostile", "enemy": "hostile", "bird": "player"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    role TEXT NOT NULL,
+    path TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    parent INTEGER,
+    active INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    generation INTEGER NOT NULL,
+    learner_role TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    knight INTEGER,
+    enemy INTEGER,
+    bird INTEGER,
+    winner TEXT NOT NULL,
+    ticks INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS generations (
+    generation INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS plans (
+    generation INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    task TEXT NOT NULL,
+    PRIMARY KEY (generation, role, slot)
+);
+CREATE TABLE IF NOT EXISTS candidates (
+    generation INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    parent INTEGER,
+    PRIMARY KEY (generation, role, slot)
+);
+"""
+
+
+def play_slot(task):
+    # Runs in a worker process: trains the learner role's snapshot for a few
+    # episodes against frozen opponent snapshots and saves the result.
+    random.seed(task["seed"])
+    arena = Arena(ai_player=True)
+    for role in ROLES:
+        sarsa = getattr(arena, role).sarsa
+        sarsa.q_table, sarsa.visit_counts = qtable.load_checkpoint(task["snapshots"][role])
+        sarsa.frozen = role != task["learner_role"]
+        sarsa.epsilon = task["epsilon"] if role == task["learner_role"] else 0.0
+
+    results = []
+    for _ in range(task["episodes"]):
+        arena.reset()
+        winner = arena.run_episode(task["max_ticks"])
+        results.append((winner, arena.tick))
+        arena.end_episode()
+
+    learner = getattr(arena, task["learner_role"]).sarsa
+    qtable.save_npz(task["out_path"], learner.q_table, learner.actions, learner.visit_counts)
+    return task, results
+
+
+class League:
+    def __init__(self, folder="league", db_path=None):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.db = sqlite3.connect(db_path or os.path.join(folder, "league.sqlite"))
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+    # Population
+
+    def seed_population(self):
+        # Each role starts from its latest regular checkpoint (or an empty table)
+        for role in ROLES:
+            if self.active_snapshots(role):
+                continue
+            sarsa = SARSA(character_type=role)
+            path = os.path.join(self.folder, role, "snapshot_0.npz")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            qtable.save_npz(path, sarsa.q_table, sarsa.actions, sarsa.visit_counts)
+            self.add_snapshot(role, path, generation=0, parent=None)
+
+    def add_snapshot(self, role, path, generation, parent):
+        cursor = self.db.execute(
+            "INSERT INTO snapshots (role, path, generation, parent) VALUES (?, ?, ?, ?)",
+            (role, path, generation, parent))
+        self.db.commit()
+        return cursor.lastrowid
+
+    def active_snapshots(self, role):
+        rows = self.db.execute(
+            "SELECT id, path FROM snapshots WHERE role = ? AND active = 1 ORDER BY id", (role,))
+        return rows.fetchall()
+
+    def current_generation(self):
+        # A generation only counts once all of its promotions are in
+        row = self.db.execute("SELECT MAX(generation) FROM generations").fetchone()
+        return (row[0] or 0) + 1
+
+    # Ratings
+
+    def win_rate(self, role, snapshot_id, recent=50):
+        rows = self.db.execute(
+            f"SELECT winner FROM matches WHERE {role} = ? ORDER BY id DESC LIMIT ?",
+            (snapshot_id, recent)).fetchall()
+        if not rows:
+            return 0.5
+        team = TEAMS[role]
+        score = sum(1.0 if w == team else 0.5 if w == "draw" else 0.0 for (w,) in rows)
+        return score / len(rows)
+
+    def sample_opponent(self, role, rng):
+        # Opponents that have been winning recently are picked more often
+        snapshots = self.active_snapshots(role)
+        weights = [0.1 + self.win_rate(role, sid) for sid, _ in snapshots]
+        return rng.choices(snapshots, weights=weights)[0]
+
+    def best_snapshot(self, role):
+        snapshots = self.active_snapshots(role)
+        return max(snapshots, key=lambda s: (self.win_rate(role, s[0]), s[0]))
+
+    # Generations
+
+    def plan_tasks(self, generation, slots, episodes, max_ticks, epsilon):
+        # Planned once per generation and kept in the ledger: win rates move
+        # as slots finish, so a resumed generation must not sample again
+        rows = self.db.execute(
+            "SELECT task FROM plans WHERE generation = ? ORDER BY rowid", (generation,)).fetchall()
+        if rows:
+            return [json.loads(task) for (task,) in rows]
+        rng = random.Random(generation)
+        tasks = []
+        for role in ROLES:
+            parent_id, parent_path = self.best_snapshot(role)
+            for slot in range(slots):
+                opponents = {r: self.sample_opponent(r, rng) for r in ROLES if r != role}
+                out_path = os.path.join(self.folder, role, f"gen_{generation}_slot_{slot}.npz")
+                snapshots = {r: path for r, (_, path) in opponents.items()}
+                snapshots[role] = parent_path
+                # The learner explores and learns during these matches, so they
+                # are not credited to its parent snapshot (see promote())
+                ids = {r: sid for r, (sid, _) in opponents.items()}
+                ids[role] = None
+                tasks.append({
+                    "generation": generation, "learner_role": role, "slot": slot,
+                    "snapshots": snapshots, "ids": ids, "parent": parent_id,
+                    "episodes": episodes, "max_ticks": max_ticks, "epsilon": epsilon,
+                    "seed": rng.randrange(1 << 30), "out_path": out_path,
+                })
+        self.db.executemany(
+            "INSERT INTO plans (generation, role, slot, task) VALUES (?, ?, ?, ?)",
+            [(generation, task["learner_role"], task["slot"], json.dumps(task)) for task in tasks])
+        self.db.commit()
+        return tasks
+
+    def completed(self, task):
+        row = self.db.execute(
+            "SELECT path FROM candidates WHERE generation = ? AND role = ? AND slot = ?",
+            (task["generation"], task["learner_role"], task["slot"])).fetchone()
+        return row is not None and os.path.exists(row[0])
+
+    def record(self, task, results):
+        ids = task["ids"]
+        self.db.executemany(
+            "INSERT INTO matches (generation, learner_role, slot, knight, enemy, bird, winner, ticks) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(task["generation"], task["learner_role"], task["slot"],
+              ids["knight"], ids["enemy"], ids["bird"], winner, ticks) for winner, ticks in results])
+        self.db.execute(
+            "INSERT OR REPLACE INTO candidates (generation, role, slot, path, parent) VALUES (?, ?, ?, ?, ?)",
+            (task["generation"], task["learner_role"], task["slot"], task["out_path"], task["parent"]))
+        self.db.commit()
+
+    def promote(self, generation, population_size):
+        # The best candidate of each role joins the population; the weakest
+        # snapshots are retired once the population is over size.
+        for role in ROLES:
+            already = self.db.execute(
+                "SELECT 1 FROM snapshots WHERE role = ? AND generation = ?", (role, generation)).fetchone()
+            if already:
+                continue
+            team = TEAMS[role]
+            best = None
+            for slot, path, parent in self.db.execute(
+                    "SELECT slot, path, parent FROM candidates WHERE generation = ? AND role = ?",
+                    (generation, role)).fetchall():
+                rows = self.db.execute(
+                    "SELECT winner FROM matches WHERE generation = ? AND learner_role = ? AND slot = ?",
+                    (generation, role, slot)).fetchall()
+                score = sum(1.0 if w == team else 0.5 if w == "draw" else 0.0 for (w,) in rows)
+                score /= max(1, len(rows))
+                if best is None or score > best[0]:
+                    best = (score, path, parent)
+            if best is None:
+                continue
+            score, path, parent = best
+            self.add_snapshot(role, path, generation, parent)
+            print(f"Generation {generation}: promoted {role} {path} (score {score:.2f})")
+
+            snapshots = self.active_snapshots(role)
+            if len(snapshots) > population_size:
+                ranked = sorted(snapshots, key=lambda s: (self.win_rate(role, s[0]), s[0]))
+                for sid, spath in ranked[:len(snapshots) - population_size]:
+                    self.db.execute("UPDATE snapshots SET active = 0 WHERE id = ?", (sid,))
+                    print(f"Generation {generation}: retired {role} {spath}")
+                self.db.commit()
+        self.db.execute("INSERT OR IGNORE INTO generations (generation) VALUES (?)", (generation,))
+        self.db.commit()
+
+    def run(self, generations, slots=4, episodes=5, max_ticks=3000, epsilon=0.1,
+            population_size=8, processes=None):
+        self.seed_population()
+        with Pool(processes=processes, initializer=init_worker) as pool:
+            for _ in range(generations):
+                generation = self.current_generation()
+                tasks = self.plan_tasks(generation, slots, episodes, max_ticks, epsilon)
+                # Slots finished before an interruption are not replayed
+                pending = [t for t in tasks if not self.completed(t)]
+                for task, results in pool.imap_unordered(play_slot, pending):
+                    self.record(task, results)
+                self.promote(generation, population_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Self-play league for knight, enemy and bird")
+    parser.add_argument("--generations", type=int, default=10)
+    parser.add_argument("--slots", type=int, default=4, help="training jobs per role per generation")
+    parser.add_argument("--episodes", type=int, default=5, help="episodes per job")
+    parser.add_argument("--max-ticks", type=int, default=3000)
+    parser.add_argument("--epsilon", type=float, default=0.1)
+    parser.add_argument("--population", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--folder", default="league")
+    args = parser.parse_args()
+
+    League(args.folder).run(args.generations, slots=args.slots, episodes=args.episodes,
+                            max_ticks=args.max_ticks, epsilon=args.epsilon,
+                            population_size=args.population, processes=args.processes)
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque
+
+
+class TransitionQueue:
+    # Bounded queue between the game loop (producer) and the learner thread
+    # (consumer). deque.append/popleft are atomic, so neither side locks;
+    # when the learner falls behind the oldest transitions are dropped.
+    def __init__(self, maxlen=100000):
+        self.items = deque(maxlen=maxlen)
+        self.pushed = 0
+        self.popped = 0
+
+    def push(self, item):
+        self.items.append(item)
+        self.pushed += 1
+
+    def pop_batch(self, batch_size):
+        batch = []
+        try:
+            for _ in range(batch_size):
+                batch.append(self.items.popleft())
+        except IndexError:
+            pass
+        self.popped += len(batch)
+        return batch
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def dropped(self):
+        return self.pushed - self.popped - len(self.items)
+
+
+class Learner(threading.Thread):
+    # Applies SARSA updates off the render thread. Each registered SARSA
+    # keeps acting on its own q_table, which the learner treats as the
+    # published policy: updated rows are copied into it every
+    # `publish_every` updates, replacing whole rows so the actor never
+    # sees a half-written one.
+    def __init__(self, publish_every=500, batch_size=256, maxlen=100000, idle_sleep=0.001):
+        super().__init__(daemon=True)
+        self.queue = TransitionQueue(maxlen)
+        self.publish_every = publish_every
+        self.batch_size = batch_size
+        self.idle_sleep = idle_sleep
+        self.tables = {}
+        self.dirty = {}
+        self.updates = 0
+        self.last_publish = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def register(self, sarsa):
+        with self.lock:
+            self.tables[sarsa] = {state: dict(row) for state, row in sarsa.q_table.items()}
+            self.dirty[sarsa] = set()
+
+    def push(self, sarsa, transition):
+        self.queue.push((sarsa, transition))
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if not self.process():
+                time.sleep(self.idle_sleep)
+
+    def process(self):
+        with self.lock:
+            batch = self.queue.pop_batch(self.batch_size)
+            for sarsa, (state, action, reward, next_state, next_action, discount) in batch:
+                table = self.tables[sarsa]
+                sarsa.apply_update(table, state, action, reward, next_state, next_action, discount)
+                self.dirty[sarsa].add(state)
+                if sarsa.planner:
+                    self.dirty[sarsa].update(sarsa.planner.update(
+                        table, state, action, reward, next_state,
+                        sarsa.gamma if discount is None else discount))
+            self.updates += len(batch)
+            if self.updates - self.last_publish >= self.publish_every:
+                self.publish()
+        return len(batch)
+
+    def publish(self):
+        for sarsa, dirty in self.dirty.items():
+            table = self.tables[sarsa]
+            for state in dirty:
+                sarsa.q_table[state] = dict(table[state])
+            dirty.clear()
+        self.last_publish = self.updates
+
+    def sync(self):
+        # Drain everything queued so far and publish it (e.g. before saving)
+        while self.process():
+            pass
+        with self.lock:
+            self.publish()
+
+    def retain(self, sarsa, states):
+        # Drop working rows the actor's table no longer holds (after compaction)
+        with self.lock:
+            table = self.tables[sarsa]
+            for state in [s for s in table if s not in states]:
+                del table[state]
+            self.dirty[sarsa].intersection_update(states)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.sync()
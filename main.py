@@ -1,3 +1,6 @@
+import argparse
+import time
+
 import pygame
 
 from config import (
@@ -5,121 +8,196 @@ from config import (
     WHITE, BLACK, RED, GREEN, BLUE,
     FPS
 )
-from tilemap import TileMap
-from characters import Player
-from enemies import Enemy
-from knight import Knight
-from bird import Bird
-
-def main():
+from arena import Arena
+import game_clock
+from learner import Learner
+from metrics_log import MetricsLog
+from sarsa import SARSA
+
+# Simulation ticks per rendered frame, cycled with TAB; None runs as many as
+# fit in MAX_SPEED_FRAME_TIME before each frame
+SPEEDS = [1, 10, 100, None]
+MAX_SPEED_FRAME_TIME = 1 / 30
+
+
+def main(record_path=None, decision_interval=1, shared_policy=False, planning_steps=0, demo_role=None,
+         speed=1, render_every=1, interpolate=False, restart=False, rogue=False, metrics_log=None,
+         table_stats=False, policy_server=None):
+    SARSA.shared_policy = shared_policy
+    if metrics_log:
+        SARSA.metrics_log = MetricsLog(metrics_log)
+        SARSA.metrics_log.start()
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    pygame.display.set_caption("RL Game")
     clock = pygame.time.Clock()
-
-    tile_map = TileMap()
-    player = Player(250, SCREEN_HEIGHT - 100)
-    enemy = Enemy(500, SCREEN_HEIGHT - 100)
-    knight = Knight(700, SCREEN_HEIGHT - 100)
-    bird = Bird(400, SCREEN_HEIGHT - 150)
-    
-    all_sprites = pygame.sprite.Group(player, enemy, knight, bird)
-    bird.sarsa.epsilon = 0
-    enemy.sarsa.epsilon = 0
-    knight.sarsa.epsilon = 0
-
+    # The simulation runs on a fixed timestep on the simulated clock; the
+    # speed only changes how many ticks are run per rendered frame
+    game_clock.use_simulated_time()
+
+    # In demo mode the keyboard drives one of the agents and the scripted
+    # AIPlayer takes the player's place
+    arena = Arena(ai_player=demo_role is not None, decision_interval=decision_interval, rogue=rogue)
+    player, enemy, knight, bird = arena.player, arena.enemy, arena.knight, arena.bird
+    for agent in arena.agents:
+        agent.sarsa.epsilon = 0
+        if table_stats:
+            agent.sarsa.enable_metrics()
+
+    # Q-table updates run on a background thread, off the frame budget
+    learner = Learner()
+    for agent in arena.agents:
+        if planning_steps:
+            agent.sarsa.attach_planner(planning_steps)
+        agent.sarsa.attach_learner(learner)
+    learner.start()
+
+    client = None
+    if policy_server:
+        # Every agent acts on the server's greedy actions (and learns nothing)
+        from policy_server import PolicyClient, connect_arena, parse_address
+        client = PolicyClient(parse_address(policy_server))
+        connect_arena(arena, client)
+
+    demo = None
+    if demo_role:
+        from demo import take_control
+        demo = take_control(arena, demo_role)
+        record_path = record_path or f"demos/{demo_role}_{time.strftime('%Y%m%d_%H%M%S')}.bin"
+
+    recorder = None
+    if record_path:
+        from recorder import TrajectoryRecorder
+        recorder = TrajectoryRecorder(record_path, meta={"demonstrator": demo_role} if demo else None)
+
+    speed_index = SPEEDS.index(speed)
+    tick_time = 1.0 / FPS
+    accumulator = 0.0
+    previous = None
+    frame = 0
+    finishing = False
+    last_time = time.perf_counter()
+
+    def tick():
+        keys = pygame.key.get_pressed()
+        if demo:
+            demo.read_keys(keys)
+        else:
+            if keys[pygame.K_LEFT]:
+                player.steer(-player.speed)
+            if keys[pygame.K_RIGHT]:
+                player.steer(player.speed)
+
+        nonlocal finishing
+        ticks = arena.tick
+        arena.step()
+
+        if recorder:
+            recorder.record(ticks, player, enemy, knight, bird)
+
+        if restart and arena.is_over():
+            # One more tick lets the agents see their terminal transition
+            if finishing:
+                arena.end_episode()
+                arena.reset()
+            finishing = not finishing
+
+    def show_speed():
+        label = "max" if SPEEDS[speed_index] is None else f"{SPEEDS[speed_index]}x"
+        pygame.display.set_caption(f"RL Game ({label}, TAB to change)")
+
+    show_speed()
     running = True
     while running:
-        clock.tick(FPS)
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-            if event.type == pygame.KEYDOWN:
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_TAB:
+                speed_index = (speed_index + 1) % len(SPEEDS)
+                accumulator = 0.0
+                show_speed()
+            if event.type == pygame.KEYDOWN and not demo:
                 if event.key == pygame.K_UP:
                     player.jump()
                 if event.key == pygame.K_SPACE:
                     player.attack()
 
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_LEFT]:
-            player.move(-player.speed, tile_map)
-        if keys[pygame.K_RIGHT]:
-            player.move(player.speed, tile_map)
-
-        # Update
-        player.update(tile_map)
-        enemy.update(player, tile_map)
-        knight.update(player, tile_map)
-        bird.update(player, enemy, knight)
-
-        # Collisions: player vs. enemy arrows
-        for arrow in enemy.arrow_group:
-            if pygame.sprite.collide_rect(arrow, player):
-                player.take_damage(5, 1 if arrow.direction > 0 else -1)
-                arrow.kill()
-
-        # Check if player's attack hits enemy or knight
-        if player.attacking and not player.has_hit_enemy:
-            if (abs(player.rect.centerx - enemy.rect.centerx) < player.attack_range and
-                abs(player.rect.centery - enemy.rect.centery) < 50):
-                knockback_direction = 1 if player.facing_right else -1
-                enemy.take_damage(10, knockback_direction)
-                player.has_hit_enemy = True
-            elif (abs(player.rect.centerx - knight.rect.centerx) < player.attack_range and
-                  abs(player.rect.centery - knight.rect.centery) < 50):
-                knockback_direction = 1 if player.facing_right else -1
-                knight.take_damage(10, knockback_direction)
-                player.has_hit_enemy = True
-
-        # Check if knight's attack hits player
-        if knight.attacking and not knight.attack_landed:
-            if (abs(knight.rect.centerx - player.rect.centerx) < knight.attack_range and
-                abs(knight.rect.centery - player.rect.centery) < 50):
-                knockback_direction = 1 if knight.direction > 0 else -1
-                player.take_damage(10, knockback_direction)
-                knight.attack_landed = True
-
-        screen.fill(WHITE)
-        tile_map.draw(screen)
-        all_sprites.draw(screen)
-        enemy.draw_arrows(screen)
-        bird.draw_shield(screen, player)
-
-        # Health bars
-        pygame.draw.rect(screen, RED,   (player.rect.x, player.rect.y - 20, player.rect.width, 5))
-        pygame.draw.rect(screen, GREEN, (
-            player.rect.x, player.rect.y - 20,
-            player.rect.width * player.health / player.max_health,
-            5
-        ))
-
-        pygame.draw.rect(screen, RED,   (enemy.rect.x, enemy.rect.y - 20, enemy.rect.width, 5))
-        pygame.draw.rect(screen, GREEN, (
-            enemy.rect.x, enemy.rect.y - 20,
-            enemy.rect.width * enemy.health / enemy.max_health,
-            5
-        ))
-
-        pygame.draw.rect(screen, RED,   (knight.rect.x, knight.rect.y - 20, knight.rect.width, 5))
-        pygame.draw.rect(screen, GREEN, (
-            knight.rect.x, knight.rect.y - 20,
-            knight.rect.width * knight.health / knight.max_health,
-            5
-        ))
-
-        # Info text
-        font = pygame.font.Font(None, 24)
-        player_health_text = font.render(f"Player Health: {player.health}", True, BLACK)
-        enemy_health_text  = font.render(f"Enemy Health: {enemy.health}",   True, BLACK)
-        knight_health_text = font.render(f"Knight Health: {knight.health}", True, BLACK)
-        
-        screen.blit(player_health_text, (10, 10))
-        screen.blit(enemy_health_text,  (10, 40))
-        screen.blit(knight_health_text, (10, 70))
-
-        pygame.display.flip()
+        now = time.perf_counter()
+        elapsed, last_time = now - last_time, now
+        speed = SPEEDS[speed_index]
+        alpha = 1.0
+        if speed is None:
+            # As many ticks as fit in the frame budget, then draw
+            deadline = now + MAX_SPEED_FRAME_TIME
+            while time.perf_counter() < deadline:
+                tick()
+        else:
+            # Don't try to catch up on more than a few frames' worth of ticks
+            # after a stall, and never spend more than a frame's budget on
+            # them: at high speeds a stall would otherwise queue hundreds of
+            # ticks and the window would stop responding. Whatever doesn't
+            # fit is dropped, so the game runs slower than asked instead.
+            accumulator = min(accumulator + elapsed * speed, tick_time * speed * 4)
+            deadline = now + MAX_SPEED_FRAME_TIME
+            while accumulator >= tick_time:
+                if time.perf_counter() >= deadline:
+                    accumulator = 0.0
+                    previous = None
+                    break
+                accumulator -= tick_time
+                if interpolate and accumulator < tick_time:
+                    previous = arena.sprite_positions()
+                tick()
+            if interpolate:
+                alpha = accumulator / tick_time
+
+        frame += 1
+        if frame % render_every == 0:
+            arena.draw(screen, previous if interpolate else None, alpha)
+            pygame.display.flip()
+        clock.tick(FPS)
 
+    learner.stop()
+    if client:
+        client.close()
+    if recorder:
+        recorder.close()
+    if SARSA.metrics_log:
+        SARSA.metrics_log.close()
     pygame.quit()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="RL Game")
+    parser.add_argument("--record", metavar="PATH", help="record per-tick trajectories to PATH")
+    parser.add_argument("--decision-interval", type=int, default=1,
+                        help="ticks between AI decisions (actions are repeated in between)")
+    parser.add_argument("--shared-policy", action="store_true",
+                        help="play the published policies read-only (see policy.py) instead of learning")
+    parser.add_argument("--planning-steps", type=int, default=0,
+                        help="Dyna-Q backups per real update, run on the learner thread")
+    parser.add_argument("--demo", choices=["enemy", "knight", "bird"],
+                        help="control this agent with the keyboard and record a demonstration "
+                             "(to --record, or demos/ by default)")
+    parser.add_argument("--speed", default="1", choices=["1", "10", "100", "max"],
+                        help="starting simulation speed (TAB cycles through them in the window)")
+    parser.add_argument("--render-every", type=int, default=1, metavar="N",
+                        help="draw only every Nth frame")
+    parser.add_argument("--interpolate", action="store_true",
+                        help="draw sprites between the last two ticks for smoother motion")
+    parser.add_argument("--restart", action="store_true",
+                        help="start a new episode whenever one ends, e.g. to watch training at speed")
+    parser.add_argument("--rogue", action="store_true", help="add the rogue to the arena")
+    parser.add_argument("--metrics-log", metavar="FOLDER",
+                        help="log per-episode training metrics to rotating CSV files in FOLDER")
+    parser.add_argument("--policy-server", metavar="ADDRESS",
+                        help="take every agent's actions from a running policy_server.py "
+                             "(its Unix socket path, or HOST:PORT)")
+    parser.add_argument("--table-stats", action="store_true",
+                        help="append Q-table coverage, growth and TD-error stats to each agent's metrics.jsonl")
+    args = parser.parse_args()
+    if args.render_every < 1:
+        parser.error("--render-every must be at least 1")
+    main(record_path=args.record, decision_interval=args.decision_interval,
+         shared_policy=args.shared_policy, planning_steps=args.planning_steps, demo_role=args.demo,
+         speed=None if args.speed == "max" else int(args.speed), render_every=args.render_every,
+         interpolate=args.interpolate, restart=args.restart, rogue=args.rogue,
+         metrics_log=args.metrics_log, table_stats=args.table_stats, policy_server=args.policy_server)
@@ -0,0 +1,122 @@
+import csv
+import glob
+import os
+import threading
+import time
+from collections import deque
+
+# One row per agent per episode, written by SARSA.end_episode; the last
+# three are the Q-table's change over the episode and are empty without a
+# convergence monitor (convergence.py)
+EPISODE_COLUMNS = (
+    "time", "role", "episode", "steps", "decisions", "reward", "epsilon", "alpha",
+    "table_rows", "states_seen", "td_mean", "wall", "delta_max", "delta_mean", "policy_change",
+)
+# Checkpoint loads and saves and anything else worth a line
+EVENT_COLUMNS = ("time", "role", "event", "detail")
+
+
+class RotatingCSV:
+    # Appends rows to prefix_00000.csv, prefix_00001.csv, ... and moves on
+    # to the next file once the current one has reached max_bytes. A new
+    # run continues after the highest existing file rather than appending
+    # to it, so every file starts with its header.
+    def __init__(self, folder, prefix, columns, max_bytes):
+        self.folder = folder
+        self.prefix = prefix
+        self.columns = columns
+        self.max_bytes = max_bytes
+        existing = glob.glob(os.path.join(folder, f"{prefix}_*.csv"))
+        self.index = max((int(path.rsplit("_", 1)[1].split(".")[0]) for path in existing), default=-1)
+        self.file = None
+        self.writer = None
+        self.rows = 0
+
+    @property
+    def path(self):
+        return os.path.join(self.folder, f"{self.prefix}_{self.index:05d}.csv")
+
+    def open_next(self):
+        if self.file:
+            self.file.close()
+        self.index += 1
+        os.makedirs(self.folder, exist_ok=True)
+        self.file = open(self.path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.columns)
+
+    def write(self, rows):
+        if self.file is None or self.file.tell() >= self.max_bytes:
+            self.open_next()
+        self.writer.writerows(rows)
+        self.file.flush()
+        self.rows += len(rows)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class MetricsLog(threading.Thread):
+    # Structured training log. The game loop only appends tuples to a
+    # deque (atomic, no lock); this thread wakes every `flush_interval`
+    # seconds, or as soon as `batch_size` rows are waiting, and writes them
+    # in one batch to rotating CSV files in `folder`:
+    #
+    #   episodes_NNNNN.csv   EPISODE_COLUMNS, one row per agent per episode
+    #   events_NNNNN.csv     EVENT_COLUMNS (checkpoint loads and saves)
+    #
+    # Files rotate at `max_bytes`, so a long run leaves a series of files
+    # that pandas/polars can read in parallel. Install it for every agent
+    # with SARSA.metrics_log and close() it at the end of the run to write
+    # what is still queued.
+    def __init__(self, folder="metrics", batch_size=1024, flush_interval=1.0, max_bytes=64 * 1024 * 1024):
+        super().__init__(daemon=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.episodes = RotatingCSV(folder, "episodes", EPISODE_COLUMNS, max_bytes)
+        self.events = RotatingCSV(folder, "events", EVENT_COLUMNS, max_bytes)
+        self.pending_episodes = deque()
+        self.pending_events = deque()
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.batches = 0
+
+    def episode(self, row):
+        # row holds the EPISODE_COLUMNS values, in order
+        self.pending_episodes.append(row)
+        if len(self.pending_episodes) >= self.batch_size:
+            self.wake.set()
+
+    def event(self, role, event, detail=""):
+        self.pending_events.append((round(time.time(), 3), role, event, detail))
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        for pending, output in ((self.pending_episodes, self.episodes), (self.pending_events, self.events)):
+            rows = []
+            try:
+                while True:
+                    rows.append(pending.popleft())
+            except IndexError:
+                pass
+            if rows:
+                output.write(rows)
+                self.batches += 1
+
+    def close(self):
+        if self.is_alive():
+            self.stop_event.set()
+            self.wake.set()
+            self.join()
+        else:
+            self.flush()
+        self.episodes.close()
+        self.events.close()
@@ -0,0 +1,76 @@
+import numpy as np
+
+# Row of each entity in the observation arrays (same order as recorder.py,
+# which doesn't record the rogue)
+PLAYER, ENEMY, KNIGHT, BIRD = 0, 1, 2, 3
+ROGUE = 4
+# Columns of Observation.positions
+X, Y, CENTER_X, CENTER_Y, TOP, BOTTOM, LEFT, RIGHT = range(8)
+
+
+class Observation:
+    # Per-tick snapshot of the arena, taken once after physics by
+    # Arena.step (and on reset). The combat resolver reads it straight away;
+    # the agents' state encoders and reward functions read it on the next
+    # tick (status fields are refreshed once more after combat). Agents
+    # still read their own health, cooldowns and facing from themselves,
+    # since those change at the top of their own update.
+    #
+    #   dx[i][j] = x[j] - x[i]                 (rect.x / rect.y)
+    #   cdx[i][j] = center_x[j] - center_x[i]  (rect centres)
+    #
+    # The NumPy arrays are the source; the list copies are what the
+    # per-agent Python code indexes, which is much cheaper than pulling
+    # single numpy scalars out one by one.
+    def __init__(self, player, enemy=None, knight=None, bird=None, rogue=None):
+        self.entities = [player, enemy, knight, bird, rogue]
+        n = len(self.entities)
+        self.positions = np.zeros((n, 8), dtype=np.int32)
+        self.deltas = np.zeros((4, n, n), dtype=np.int32)
+        self.health = [0] * n
+        self.action = [0] * n
+        self.alive = [False] * n
+        self.attacking = [False] * n
+        self.attack_ready = [False] * n
+        self.shielded = False
+        self.update()
+
+    def update(self):
+        self.update_geometry()
+        self.update_status()
+
+    def update_geometry(self):
+        rows = []
+        for entity in self.entities:
+            if entity is None:
+                rows.append((0, 0, 0, 0, 0, 0, 0, 0))
+                continue
+            rect = entity.rect
+            rows.append((rect.x, rect.y, rect.centerx, rect.centery,
+                         rect.top, rect.bottom, rect.left, rect.right))
+        self.positions[:] = rows
+        # All pairwise offsets in one broadcast, component first:
+        # deltas[k, i, j] = positions[j, k] - positions[i, k]
+        anchors = self.positions[:, :4].T
+        np.subtract(anchors[:, None, :], anchors[:, :, None], out=self.deltas)
+
+        _, _, _, _, self.top, self.bottom, self.left, self.right = self.positions.T.tolist()
+        self.dx, self.dy, self.cdx, self.cdy = self.deltas.tolist()
+
+    def update_status(self):
+        # Health, actions and flags only; cheap enough to refresh again after
+        # combat has changed them
+        for i, entity in enumerate(self.entities):
+            if entity is None:
+                continue
+            if i == BIRD:
+                # The bird has no health or animation state (and Sprite.alive
+                # is a method)
+                self.alive[i] = True
+                continue
+            self.health[i] = entity.health
+            self.action[i] = entity.action
+            self.alive[i] = entity.alive
+            self.attacking[i] = entity.attacking
+            self.attack_ready[i] = entity.attack_cooldown == 0
+        self.shielded = self.entities[PLAYER].shielded
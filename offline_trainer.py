@@ -0,0 +1,151 @@
+import argparse
+
+import numpy as np
+
+from recorder import TrajectoryReader, ENTITY_NAMES, ENTITY_CODECS
+from sarsa import SARSA
+
+
+class OfflineTrainer:
+    def __init__(self, character_type, alpha=0.1, gamma=0.9, method="sarsa",
+                 behaviour_epsilon=0.0, target_epsilon=0.0, max_weight=10.0):
+        if method not in ("sarsa", "expected_sarsa"):
+            raise ValueError(f"Unknown method: {method}")
+        self.character_type = character_type
+        self.entity = ENTITY_NAMES.index(character_type)
+        self.codec = ENTITY_CODECS[self.entity]
+        self.alpha = alpha
+        self.gamma = gamma
+        self.method = method
+        self.behaviour_epsilon = behaviour_epsilon
+        self.target_epsilon = target_epsilon
+        self.max_weight = max_weight
+
+        # Start from the latest checkpoint, held as a dense array for the sweeps
+        self.sarsa = SARSA(character_type=character_type)
+        self.n_actions = len(self.sarsa.actions)
+        self.q = np.zeros((self.codec.size, self.n_actions), dtype=np.float64)
+        self.touched = np.zeros(self.codec.size, dtype=bool)
+        for state, values in self.sarsa.q_table.items():
+            state_id = self.codec.encode(state)
+            if state_id >= 0:
+                self.q[state_id] = [values.get(a, 0) for a in self.sarsa.actions]
+                self.touched[state_id] = True
+
+    def transitions(self, reader, chunk_size=1 << 20):
+        # Yields (s, a, r, s', a', discount, done) arrays, one per decision of
+        # this agent: from a decision row to the next one, with the rewards
+        # credited on the rows in between folded into one return and
+        # discount gamma^k over the k ticks (as SARSA.add_reward does
+        # online). Recordings without a "decided" column count every row as
+        # a decision. A gap in the tick counter breaks the chain. When the
+        # agent dies, finish() clears its state, so the next row has state
+        # -1: that ends a terminal transition (done) and s', a' are
+        # meaningless.
+        carry = None
+        for chunk in reader.chunks(chunk_size):
+            rows = chunk[chunk["entity"] == self.entity]
+            if carry is not None:
+                rows = np.concatenate([carry, rows])
+            states, decisions = rows["state"], rows["decision"]
+            starts = (states >= 0) & (decisions >= 0)
+            if "decided" in rows.dtype.names:
+                starts &= rows["decided"] == 1
+            boundaries = np.flatnonzero(starts | (states < 0))
+            if len(boundaries) < 2:
+                carry = rows[boundaries[-1]:] if len(boundaries) else rows
+                continue
+            carry = rows[boundaries[-1]:]
+            i, j = boundaries[:-1], boundaries[1:]
+            length = j - i
+            ticks = rows["tick"].astype(np.int64)
+            valid = starts[i] & (ticks[j] - ticks[i] == length)
+            if not valid.any():
+                continue
+            i, j, length = i[valid], j[valid], length[valid]
+            rewards = rows["reward"].astype(np.float64)
+            returns = np.zeros(len(i))
+            for k in range(1, length.max() + 1):
+                within = length >= k
+                returns[within] += self.gamma ** (k - 1) * rewards[i[within] + k]
+            yield (states[i], decisions[i], returns,
+                   np.maximum(states[j], 0), np.maximum(decisions[j], 0),
+                   self.gamma ** length, states[j] < 0)
+
+    def policy_probs(self, states, actions, epsilon):
+        greedy = np.argmax(self.q[states], axis=1)
+        probs = np.full(len(states), epsilon / self.n_actions)
+        probs[greedy == actions] += 1 - epsilon
+        return probs
+
+    def sweep(self, s, a, r, s2, a2, discount, done):
+        if self.method == "sarsa":
+            next_q = self.q[s2, a2]
+            if self.target_epsilon == self.behaviour_epsilon:
+                weights = np.ones(len(s))
+            else:
+                # Re-weight the sampled next action for the change in epsilon
+                behaviour = np.maximum(self.policy_probs(s2, a2, self.behaviour_epsilon), 1e-6)
+                weights = self.policy_probs(s2, a2, self.target_epsilon) / behaviour
+                weights = np.minimum(weights, self.max_weight)
+                # No next action to correct for after a terminal transition
+                weights[done] = 1.0
+        else:
+            next_rows = self.q[s2]
+            eps = self.target_epsilon
+            next_q = (1 - eps) * next_rows.max(axis=1) + eps * next_rows.mean(axis=1)
+            weights = np.ones(len(s))
+        next_q = np.where(done, 0.0, next_q)
+
+        td = r + discount * next_q - self.q[s, a]
+        # Average the weighted TD errors of duplicate (s, a) pairs within the
+        # batch by count, so the weight scales every update, not only the mix
+        # between duplicates
+        flat = s.astype(np.int64) * self.n_actions + a
+        keys, inverse, counts = np.unique(flat, return_inverse=True, return_counts=True)
+        update = np.bincount(inverse, weights=weights * td) / counts
+        rows, cols = np.divmod(keys, self.n_actions)
+        self.q[rows, cols] += self.alpha * update
+        self.touched[rows] = True
+        return np.abs(td).mean()
+
+    def train(self, paths, epochs=1, chunk_size=1 << 20, batch_size=4096):
+        for epoch in range(epochs):
+            errors = []
+            for path in paths:
+                reader = TrajectoryReader(path)
+                for s, a, r, s2, a2, discount, done in self.transitions(reader, chunk_size):
+                    for start in range(0, len(s), batch_size):
+                        end = start + batch_size
+                        errors.append(self.sweep(s[start:end], a[start:end], r[start:end], s2[start:end],
+                                                 a2[start:end], discount[start:end], done[start:end]))
+            mean_error = float(np.mean(errors)) if errors else 0.0
+            print(f"Epoch {epoch + 1}/{epochs}: {len(errors)} batches, mean |TD| {mean_error:.4f}")
+
+    def save(self):
+        for state_id in np.flatnonzero(self.touched):
+            state = self.codec.decode(int(state_id))
+            self.sarsa.q_table[state] = dict(zip(self.sarsa.actions, self.q[state_id].tolist()))
+        self.sarsa.save_q_table()
+        self.sarsa.episode_count += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline SARSA training from recorded trajectories")
+    parser.add_argument("character_type", choices=["enemy", "knight", "bird"])
+    parser.add_argument("paths", nargs="+", help="trajectory files written by TrajectoryRecorder")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--gamma", type=float, default=0.9)
+    parser.add_argument("--method", choices=["sarsa", "expected_sarsa"], default="sarsa")
+    parser.add_argument("--behaviour-epsilon", type=float, default=0.0,
+                        help="epsilon the trajectories were recorded with")
+    parser.add_argument("--target-epsilon", type=float, default=0.0)
+    parser.add_argument("--batch-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    trainer = OfflineTrainer(args.character_type, alpha=args.alpha, gamma=args.gamma,
+                             method=args.method, behaviour_epsilon=args.behaviour_epsilon,
+                             target_epsilon=args.target_epsilon)
+    trainer.train(args.paths, epochs=args.epochs, batch_size=args.batch_size)
+    trainer.save()
@@ -0,0 +1,100 @@
+import numpy as np
+import pygame
+
+from config import SCREEN_WIDTH, SCREEN_HEIGHT
+
+# Integer luma weights (ITU-R BT.601) in 1/256ths
+LUMA = (77, 150, 29)
+
+
+class PixelObserver:
+    # Renders an Arena to an offscreen surface and hands out the frame as
+    # NumPy arrays for vision-based agents. Only the rects the entities were
+    # drawn to are restored from the background each frame, and nothing is
+    # copied out of the surface: frame() is a view straight onto its pixels
+    # (pygame.surfarray.pixels3d), and the downscaled / grayscale frames are
+    # written into a preallocated ring from which observe() returns a view
+    # of the last `stack` frames.
+    #
+    # All arrays are row-major, (height, width) or (height, width, 3). The
+    # views stay valid until the next render(); holding on to frame()
+    # across a render keeps the surface locked and the render fails.
+    def __init__(self, arena, size=None, grayscale=False, stack=1, smooth=False):
+        self.arena = arena
+        self.size = size
+        self.grayscale = grayscale
+        self.stack = stack
+        self.smooth = smooth
+        self.surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), 0, 32)
+        self.small = pygame.Surface(size, 0, 32) if size else None
+        self.view = None
+        self.dirty = []
+
+        width, height = size or (SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.shape = (stack, height, width) if grayscale else (stack, height, width, 3)
+        # Every frame is written twice, `stack` slots apart, so the latest
+        # `stack` frames are always one contiguous slice of the ring
+        self.frames = np.zeros((2 * stack,) + self.shape[1:], dtype=np.uint8)
+        if grayscale:
+            self.luma = np.zeros((width, height), dtype=np.uint16)
+            self.scratch = np.zeros((width, height), dtype=np.uint16)
+        self.count = 0
+        self.reset()
+
+    def reset(self):
+        # Start of an episode: an empty history and a full redraw
+        self.view = None
+        self.frames.fill(0)
+        self.count = 0
+        self.surface.blit(self.arena.background(), (0, 0))
+        self.dirty = []
+
+    def render(self):
+        self.view = None
+        if self.surface.get_locked():
+            raise RuntimeError("a frame() view is still referenced; drop it before the next render")
+        background = self.arena.background()
+        for rect in self.dirty:
+            self.surface.blit(background, rect, rect)
+        self.dirty = self.arena.draw_entities(self.surface)
+
+    def frame(self):
+        # The full-size RGB frame, without copying
+        if self.view is None:
+            self.view = pygame.surfarray.pixels3d(self.surface).transpose(1, 0, 2)
+        return self.view
+
+    def observe(self):
+        # Renders the current tick and returns the stacked observation,
+        # oldest frame first
+        self.render()
+        if self.size is None and not self.grayscale and self.stack == 1:
+            return self.frame()[np.newaxis]
+
+        source = self.surface
+        if self.small is not None:
+            if self.smooth:
+                pygame.transform.smoothscale(self.surface, self.size, self.small)
+            else:
+                pygame.transform.scale(self.surface, self.size, self.small)
+            source = self.small
+        pixels = pygame.surfarray.pixels3d(source)
+        i = self.count % self.stack
+        if self.grayscale:
+            luma, scratch = self.luma, self.scratch
+            np.multiply(pixels[..., 0], LUMA[0], out=luma, dtype=np.uint16)
+            for channel in (1, 2):
+                np.multiply(pixels[..., channel], LUMA[channel], out=scratch, dtype=np.uint16)
+                luma += scratch
+            # Straight into the ring slot through its transposed view
+            np.right_shift(luma, 8, out=self.frames[i].T, casting="unsafe")
+        else:
+            self.frames[i] = pixels.transpose(1, 0, 2)
+        self.frames[i + self.stack] = self.frames[i]
+        del pixels
+        self.count += 1
+        return self.stacked()
+
+    def stacked(self):
+        i = self.count % self.stack
+        return self.frames[i:i + self.stack]
@@ -0,0 +1,96 @@
+import heapq
+import itertools
+
+
+class Planner:
+    # Dyna-Q with prioritized sweeping. Every real transition also goes into
+    # a tabular model of (state, action) -> next states with their mean
+    # reward and discount; after each real update up to `planning_steps`
+    # simulated expected backups are run, most urgent (largest TD error)
+    # first, and the predecessors of every backed-up state are queued in
+    # turn. This pushes delayed rewards (kills, deaths) back through the
+    # table without waiting for the game to revisit every state.
+    def __init__(self, sarsa, planning_steps=10, threshold=1e-3):
+        self.sarsa = sarsa
+        self.planning_steps = planning_steps
+        self.threshold = threshold
+        # (state, action) -> {next_state: [count, reward_sum, discount_sum]};
+        # next_state is None for terminal transitions
+        self.model = {}
+        self.predecessors = {}
+        self.queue = []
+        self.priorities = {}
+        self.counter = itertools.count()
+        self.backups = 0
+
+    def value(self, q_table, state):
+        if state is None:
+            return 0.0
+        row = q_table.get(state)
+        return max(row.values()) if row else 0.0
+
+    def target(self, q_table, state, action):
+        outcomes = self.model[(state, action)]
+        total = 0
+        expected = 0.0
+        for next_state, (count, reward_sum, discount_sum) in outcomes.items():
+            total += count
+            expected += reward_sum + discount_sum * self.value(q_table, next_state)
+        return expected / total
+
+    def push(self, q_table, state, action):
+        row = q_table.get(state)
+        current = row[action] if row else 0.0
+        priority = abs(self.target(q_table, state, action) - current)
+        key = (state, action)
+        if priority > self.threshold and priority > self.priorities.get(key, 0.0):
+            self.priorities[key] = priority
+            heapq.heappush(self.queue, (-priority, next(self.counter), key))
+
+    def update(self, q_table, state, action, reward, next_state, discount):
+        # Called after each real update; returns the states whose rows the
+        # planning backups changed.
+        outcomes = self.model.setdefault((state, action), {})
+        entry = outcomes.get(next_state)
+        if entry is None:
+            outcomes[next_state] = [1, reward, discount]
+            if next_state is not None:
+                self.predecessors.setdefault(next_state, set()).add((state, action))
+        else:
+            entry[0] += 1
+            entry[1] += reward
+            entry[2] += discount
+        self.push(q_table, state, action)
+        return self.plan(q_table)
+
+    def plan(self, q_table):
+        touched = set()
+        actions = self.sarsa.actions
+        for _ in range(self.planning_steps):
+            key = None
+            while self.queue:
+                negative, _, candidate = heapq.heappop(self.queue)
+                # Skip entries superseded by a later, higher-priority push
+                if self.priorities.get(candidate) == -negative:
+                    del self.priorities[candidate]
+                    key = candidate
+                    break
+            if key is None:
+                break
+            state, action = key
+            # Rows are replaced rather than edited so this also works on a
+            # ShardedQTable, whose readers rely on rows never changing
+            row = dict(q_table.get(state) or {a: 0 for a in actions})
+            row[action] += self.sarsa.alpha * (self.target(q_table, state, action) - row[action])
+            q_table[state] = row
+            touched.add(state)
+            self.backups += 1
+            for predecessor in self.predecessors.get(state, ()):
+                self.push(q_table, *predecessor)
+        return touched
+
+    def reset(self):
+        self.model.clear()
+        self.predecessors.clear()
+        self.queue.clear()
+        self.priorities.clear()
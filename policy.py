@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from state_codec import StateCodec
+import qtable
+
+# Published policies are read-only snapshots of a Q-table laid out as flat
+# .npy arrays, so any number of game instances can np.load them with
+# mmap_mode="r" and share the pages through the OS page cache instead of
+# each parsing its own copy of the JSON checkpoint.
+#
+#   <folder>/LATEST          name of the current version
+#   <folder>/<version>/      meta.json, ids.npy, best.npy, values.npy
+#
+# A new version is written next to the old one and LATEST is swapped
+# atomically; instances that already mapped the old version keep it.
+# Published files are never rewritten in place (that would truncate them
+# under the readers' mappings): a version is written to a temporary folder
+# and renamed into place, and publishing a version that already exists
+# makes a new one, <version>_1, <version>_2, ...
+LATEST = "LATEST"
+KEEP_VERSIONS = 2
+
+
+def version_key(name):
+    # "12" -> (12, 0), "12_3" -> (12, 3); None for anything else
+    number, _, copy = name.partition("_")
+    if number.isdigit() and (not copy or copy.isdigit()):
+        return int(number), int(copy or 0)
+    return None
+
+
+def policy_arrays(q_table, actions, codec):
+    # Rows keyed by StateCodec id and sorted so lookups are a binary search;
+    # states outside the codec's space are skipped.
+    rows = []
+    for state, row in q_table.items():
+        state_id = codec.encode(state)
+        if state_id >= 0:
+            rows.append((state_id, [row.get(a, 0) for a in actions]))
+    rows.sort(key=lambda r: r[0])
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    values = np.array([r[1] for r in rows], dtype=np.float32).reshape(len(rows), len(actions))
+    best = values.argmax(axis=1).astype(np.uint8) if len(rows) else np.zeros(0, dtype=np.uint8)
+    return ids, best, values
+
+
+def publish_policy(folder, q_table, actions, codec, version):
+    ids, best, values = policy_arrays(q_table, actions, codec)
+    os.makedirs(folder, exist_ok=True)
+    staging = os.path.join(folder, f".staging-{os.getpid()}")
+    os.makedirs(staging, exist_ok=True)
+    np.save(os.path.join(staging, "ids.npy"), ids)
+    np.save(os.path.join(staging, "best.npy"), best)
+    np.save(os.path.join(staging, "values.npy"), values)
+    with open(os.path.join(staging, "meta.json"), "w") as f:
+        json.dump({"actions": list(actions), "factors": [list(v) for v in codec.factors],
+                   "states": len(ids)}, f)
+    name = str(version)
+    copy = 0
+    while True:
+        path = os.path.join(folder, name)
+        try:
+            # Fails if the folder exists, so a published version is never touched
+            os.rename(staging, path)
+            break
+        except OSError:
+            if not os.path.exists(path):
+                raise
+            copy += 1
+            name = f"{version}_{copy}"
+
+    tmp = os.path.join(folder, LATEST + ".tmp")
+    with open(tmp, "w") as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(folder, LATEST))
+
+    # Old versions can go; deleting a file doesn't affect existing mappings
+    versions = sorted((v for v in os.listdir(folder) if version_key(v)), key=version_key)
+    for old in versions[:-KEEP_VERSIONS]:
+        if old == name:
+            continue
+        for filename in os.listdir(os.path.join(folder, old)):
+            os.remove(os.path.join(folder, old, filename))
+        os.rmdir(os.path.join(folder, old))
+    return path
+
+
+def latest_policy(folder):
+    try:
+        with open(os.path.join(folder, LATEST), "r") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(folder, name)
+
+
+class PolicyTable:
+    # Greedy lookups on sorted state-id arrays. Unseen states get the first
+    # action, like SARSA.get_best_action.
+    def __init__(self, actions, codec, ids, best, values):
+        self.actions = list(actions)
+        self.codec = codec
+        self.ids = ids
+        self.best = best
+        self.values = values
+        self.size = len(ids)
+
+    def __len__(self):
+        return self.size
+
+    def find(self, state):
+        # Row index of `state`, or -1 if it isn't in the table
+        state_id = self.codec.encode(state)
+        if state_id < 0 or not self.size:
+            return -1
+        i = int(np.searchsorted(self.ids, state_id))
+        if i < self.size and self.ids[i] == state_id:
+            return i
+        return -1
+
+    def best_action(self, state):
+        i = self.find(state)
+        if i < 0:
+            return self.actions[0]
+        return self.actions[self.best[i]]
+
+    def best_indices(self, state_ids):
+        # Vectorized lookup: action index for each encoded state
+        state_ids = np.asarray(state_ids, dtype=np.int64)
+        result = np.zeros(len(state_ids), dtype=np.uint8)
+        if self.size:
+            rows = np.minimum(np.searchsorted(self.ids, state_ids), self.size - 1)
+            found = self.ids[rows] == state_ids
+            result[found] = self.best[rows[found]]
+        return result
+
+    def q_values(self, state):
+        i = self.find(state)
+        if i < 0:
+            return {a: 0.0 for a in self.actions}
+        return dict(zip(self.actions, self.values[i].tolist()))
+
+
+def policy_table(q_table, actions, codec):
+    return PolicyTable(actions, codec, *policy_arrays(q_table, actions, codec))
+
+
+class MappedPolicy(PolicyTable):
+    # A published policy mapped read-only. The only per-instance memory is
+    # the codec's cache of states actually seen.
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        if meta["states"]:
+            arrays = [np.load(os.path.join(path, name), mmap_mode="r")
+                      for name in ("ids.npy", "best.npy", "values.npy")]
+        else:
+            # Nothing to map (mmap refuses empty data)
+            arrays = [np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint8),
+                      np.zeros((0, len(meta["actions"])), dtype=np.float32)]
+        super().__init__(meta["actions"], StateCodec(meta["factors"]), *arrays)
+
+
+if __name__ == "__main__":
+    from recorder import ENTITY_CODECS, ENTITY_NAMES
+    from sarsa import SARSA
+
+    parser = argparse.ArgumentParser(description="Publish a Q-table checkpoint as a shared read-only policy")
+    parser.add_argument("role", choices=["enemy", "knight", "bird"])
+    parser.add_argument("--checkpoint", help="checkpoint to publish (default: the role's latest)")
+    args = parser.parse_args()
+
+    sarsa = SARSA(character_type=args.role)
+    if args.checkpoint:
+        sarsa.q_table, sarsa.visit_counts = qtable.load_checkpoint(args.checkpoint)
+    path = sarsa.publish_policy(ENTITY_CODECS[ENTITY_NAMES.index(args.role)])
+    print(f"Published {len(sarsa.q_table)} states to {path}")
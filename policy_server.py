@@ -0,0 +1,309 @@
+import argparse
+import os
+import random
+import selectors
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from enemies import Enemy
+from knight import Knight
+from bird import Bird
+from rogue import Rogue
+from policy import MappedPolicy, latest_policy, policy_table
+from sarsa import SARSA
+
+# Serves greedy actions for all roles from one process. Clients send
+# fixed-size frames of (request id, role, StateCodec id) over a Unix socket
+# or local TCP; requests that arrive within `window` seconds of each other
+# are answered with one vectorized lookup per role.
+#
+#   python policy_server.py --unix /tmp/policy.sock
+ROLES = ["enemy", "knight", "bird", "rogue"]
+ROLE_CODECS = {"enemy": Enemy.state_codec, "knight": Knight.state_codec, "bird": Bird.state_codec,
+               "rogue": Rogue.state_codec}
+REQUEST = struct.Struct("<IBq")   # request id, role index, state id
+RESPONSE = struct.Struct("<IB")   # request id, action index
+
+
+def load_tables(roles=ROLES):
+    # One table per role: the published policy if there is one (mapped, so
+    # several servers share it too), otherwise the latest checkpoint.
+    tables = {}
+    for role in roles:
+        sarsa = SARSA(character_type=role)
+        path = latest_policy(sarsa.published_folder())
+        if path:
+            tables[role] = MappedPolicy(path)
+        else:
+            tables[role] = policy_table(sarsa.q_table, sarsa.actions, ROLE_CODECS[role])
+    return tables
+
+
+def make_socket(address):
+    # A string is a Unix socket path, a (host, port) tuple is TCP
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+class PolicyServer(threading.Thread):
+    def __init__(self, address, tables, window=0.001, max_batch=1024):
+        super().__init__(daemon=True)
+        self.address = address
+        self.tables = [tables.get(role) for role in ROLES]
+        self.window = window
+        self.max_batch = max_batch
+        self.listener = make_socket(address)
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.remove(address)
+        else:
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(address)
+        self.listener.listen()
+        self.stop_event = threading.Event()
+
+        self.latencies = deque(maxlen=100000)
+        self.requests = 0
+        self.batches = 0
+        self.started = time.perf_counter()
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.listener, selectors.EVENT_READ)
+        buffers = {}
+        pending = []
+        while not self.stop_event.is_set():
+            timeout = 0.05
+            if pending:
+                timeout = max(0.0, pending[0][4] + self.window - time.perf_counter())
+            for key, _ in selector.select(timeout):
+                sock = key.fileobj
+                if sock is self.listener:
+                    conn, _ = sock.accept()
+                    selector.register(conn, selectors.EVENT_READ)
+                    buffers[conn] = b""
+                    continue
+                try:
+                    data = sock.recv(65536)
+                except OSError:
+                    data = b""
+                if not data:
+                    selector.unregister(sock)
+                    sock.close()
+                    del buffers[sock]
+                    continue
+                data = buffers[sock] + data
+                now = time.perf_counter()
+                complete = len(data) - len(data) % REQUEST.size
+                for request_id, role, state_id in REQUEST.iter_unpack(data[:complete]):
+                    pending.append((sock, request_id, role, state_id, now))
+                buffers[sock] = data[complete:]
+
+            # Clients wait for their answer before asking again, so once
+            # every connection has a request in there is nothing to wait for
+            if pending and (len(pending) >= self.max_batch or
+                            len({p[0] for p in pending}) >= len(buffers) or
+                            time.perf_counter() - pending[0][4] >= self.window):
+                self.flush(pending)
+                pending = []
+
+        for sock in buffers:
+            sock.close()
+        selector.close()
+        self.listener.close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+    def flush(self, pending):
+        actions = np.zeros(len(pending), dtype=np.uint8)
+        roles = np.array([p[2] for p in pending], dtype=np.uint8)
+        state_ids = np.array([p[3] for p in pending], dtype=np.int64)
+        for role, table in enumerate(self.tables):
+            if table is None:
+                continue
+            mask = roles == role
+            if mask.any():
+                actions[mask] = table.best_indices(state_ids[mask])
+
+        replies = {}
+        for (sock, request_id, _, _, _), action in zip(pending, actions.tolist()):
+            replies.setdefault(sock, []).append(RESPONSE.pack(request_id, action))
+        for sock, frames in replies.items():
+            try:
+                sock.sendall(b"".join(frames))
+            except OSError:
+                pass
+
+        done = time.perf_counter()
+        self.latencies.extend(done - p[4] for p in pending)
+        self.requests += len(pending)
+        self.batches += 1
+
+    def stats(self):
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        elapsed = time.perf_counter() - self.started
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch": self.requests / max(1, self.batches),
+            "requests_per_s": self.requests / elapsed if elapsed else 0.0,
+            "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+            "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+        }
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+
+
+class PolicyClient:
+    # Blocking request/response; concurrency (and so batching) comes from
+    # running several clients at once.
+    def __init__(self, address):
+        self.sock = make_socket(address)
+        self.sock.connect(address)
+        self.next_id = 0
+
+    def request(self, role, state_id):
+        self.next_id = (self.next_id + 1) & 0xFFFFFFFF
+        self.sock.sendall(REQUEST.pack(self.next_id, ROLES.index(role), state_id))
+        data = b""
+        while len(data) < RESPONSE.size:
+            chunk = self.sock.recv(RESPONSE.size - len(data))
+            if not chunk:
+                raise ConnectionError("policy server closed the connection")
+            data += chunk
+        _, action = RESPONSE.unpack(data)
+        return action
+
+    def close(self):
+        self.sock.close()
+
+
+class LocalPolicyClient:
+    # In-process stand-in for PolicyClient, for tests and single runs
+    def __init__(self, tables):
+        self.tables = tables
+
+    def request(self, role, state_id):
+        return int(self.tables[role].best_indices([state_id])[0])
+
+    def close(self):
+        pass
+
+
+class RemoteSARSA:
+    # SARSA-compatible proxy that asks a policy client for greedy actions.
+    # It only acts: nothing is learned or saved.
+    def __init__(self, client, character_type, codec, decision_interval=1, epsilon=0.0):
+        if character_type not in ROLES:
+            raise ValueError(f"The policy server has no {character_type} role (serves {', '.join(ROLES)})")
+        self.client = client
+        self.character_type = character_type
+        self.codec = codec
+        self.actions = list(SARSA.ACTIONS[character_type])
+        self.epsilon = epsilon
+        self.alpha = 0.0
+        self.frozen = True
+        self.decision_interval = decision_interval
+        self.ticks_until_decision = 0
+        self.episode_count = 0
+        self.rng = random
+
+    def get_action(self, state):
+        if self.rng.random() < self.epsilon:
+            return self.rng.choice(self.actions)
+        return self.get_best_action(state)
+
+    def seed_rng(self, seed):
+        self.rng = random.Random(seed)
+        return self.rng
+
+    def get_best_action(self, state):
+        return self.actions[self.client.request(self.character_type, self.codec.encode(state))]
+
+    def should_decide(self):
+        return self.ticks_until_decision <= 0
+
+    def add_reward(self, reward):
+        pass
+
+    def decide(self, state, previous_state, previous_action):
+        self.ticks_until_decision = self.decision_interval
+        return self.get_action(state)
+
+    def finish(self, previous_state, previous_action):
+        self.ticks_until_decision = 0
+
+    def tick(self):
+        self.ticks_until_decision -= 1
+
+    def observe(self, *transition):
+        pass
+
+    def learn(self):
+        pass
+
+    def attach_learner(self, learner):
+        pass
+
+    def save_q_table(self):
+        pass
+
+    def end_episode(self, reward=None):
+        self.episode_count += 1
+
+
+def connect_arena(arena, client, epsilon=0.0):
+    # Points every agent in the arena at the policy client
+    for agent in arena.agents:
+        sarsa = agent.sarsa
+        agent.sarsa = RemoteSARSA(client, sarsa.character_type, agent.state_codec,
+                                  sarsa.decision_interval, epsilon)
+
+
+def parse_address(text):
+    # "HOST:PORT" is TCP, anything else a Unix socket path
+    host, _, port = text.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return text
+
+
+def format_stats(stats):
+    return (f"{stats['requests']} requests, {stats['requests_per_s']:.0f}/s, "
+            f"mean batch {stats['mean_batch']:.1f}, "
+            f"p50 {stats['p50_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched policy server for enemy, knight, bird and rogue")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--unix", metavar="PATH", help="Unix socket path")
+    group.add_argument("--port", type=int, help="TCP port on 127.0.0.1")
+    parser.add_argument("--window-ms", type=float, default=1.0, help="batching window")
+    parser.add_argument("--max-batch", type=int, default=1024)
+    parser.add_argument("--report", type=float, default=10.0, help="seconds between stats lines")
+    args = parser.parse_args()
+
+    address = args.unix if args.unix else ("127.0.0.1", args.port)
+    server = PolicyServer(address, load_tables(), window=args.window_ms / 1000, max_batch=args.max_batch)
+    server.start()
+    print(f"Serving on {address}")
+    try:
+        while True:
+            time.sleep(args.report)
+            print(format_stats(server.stats()))
+    except KeyboardInterrupt:
+        pass
+    server.stop()
+    print(format_stats(server.stats()))
@@ -0,0 +1,74 @@
+import argparse
+import json
+
+import numpy as np
+
+# Compact checkpoints: one row per state in a float16/float32 matrix plus
+# the visit counts, instead of nested JSON dicts of Python floats.
+DTYPES = {"float16": np.float16, "float32": np.float32}
+
+
+def compact_table(q_table, visit_counts, min_visits=1):
+    # Drops rows that were never updated (all zeros) and rows visited fewer
+    # than `min_visits` times. Rows without a recorded visit count (e.g.
+    # loaded from an old JSON checkpoint) are only dropped if all zero.
+    # Surviving rows are kept as they are: in memory a value is a Python
+    # float whatever its precision, so only save_npz narrows the dtype.
+    compacted = {}
+    for state, row in q_table.items():
+        if not any(row.values()):
+            continue
+        visits = visit_counts.get(state)
+        if visits is not None and visits < min_visits:
+            continue
+        compacted[state] = row
+    return compacted
+
+
+def save_npz(path, q_table, actions, visit_counts, dtype="float32"):
+    states = list(q_table)
+    values = np.array([[q_table[s].get(a, 0) for a in actions] for s in states],
+                      dtype=DTYPES[dtype]).reshape(len(states), len(actions))
+    visits = np.array([visit_counts.get(s, 0) for s in states], dtype=np.uint32)
+    np.savez(path, states=np.array(states, dtype=str), actions=np.array(actions, dtype=str),
+             values=values, visits=visits)
+
+
+def load_npz(path):
+    with np.load(path) as data:
+        actions = data["actions"].tolist()
+        values = data["values"].astype(np.float64).tolist()
+        q_table = {}
+        visit_counts = {}
+        for state, row, visits in zip(data["states"].tolist(), values, data["visits"].tolist()):
+            q_table[state] = dict(zip(actions, row))
+            if visits:
+                visit_counts[state] = visits
+    return q_table, visit_counts
+
+
+def load_checkpoint(path):
+    if path.endswith(".npz"):
+        return load_npz(path)
+    with open(path, "r") as f:
+        return json.load(f), {}
+
+
+def table_actions(q_table):
+    for row in q_table.values():
+        return list(row)
+    return []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact a Q-table checkpoint")
+    parser.add_argument("source", help="q_table_episode_N.json or .npz")
+    parser.add_argument("dest", help="output .npz path")
+    parser.add_argument("--min-visits", type=int, default=1)
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float16")
+    args = parser.parse_args()
+
+    q_table, visit_counts = load_checkpoint(args.source)
+    compacted = compact_table(q_table, visit_counts, args.min_visits)
+    save_npz(args.dest, compacted, table_actions(q_table), visit_counts, args.dtype)
+    print(f"Kept {len(compacted)} of {len(q_table)} states -> {args.dest}")
@@ -0,0 +1,88 @@
+import bisect
+import json
+import os
+import random
+import sys
+
+
+class QTableStats:
+    # Upper edges of the |TD error| histogram bins; the last bin is open
+    TD_BINS = [0.001, 0.01, 0.1, 1, 10, 100]
+
+    def __init__(self, state_space_size=None):
+        self.state_space_size = state_space_size
+        self.reset_episode()
+
+    def reset_episode(self):
+        self.td_histogram = [0] * (len(self.TD_BINS) + 1)
+        self.td_count = 0
+        self.td_sum = 0.0
+        self.td_max = 0.0
+        self.steps = 0
+        self.new_states = 0
+
+    def record_visit(self, is_new):
+        self.steps += 1
+        if is_new:
+            self.new_states += 1
+
+    def record_td(self, td_error):
+        magnitude = abs(td_error)
+        self.td_histogram[bisect.bisect_left(self.TD_BINS, magnitude)] += 1
+        self.td_count += 1
+        self.td_sum += magnitude
+        if magnitude > self.td_max:
+            self.td_max = magnitude
+
+    @staticmethod
+    def memory_bytes(q_table, sample_size=1000, seed=0):
+        # Deep size of the nested dicts, extrapolated from a sample of rows
+        # so it stays cheap on large tables. The sample comes from a stream
+        # of its own: the shared random module drives the game.
+        if not q_table:
+            return sys.getsizeof(q_table)
+        if len(q_table) <= sample_size:
+            states = list(q_table)
+        else:
+            states = random.Random(seed).sample(list(q_table), sample_size)
+        sampled = 0
+        for state in states:
+            row = q_table[state]
+            sampled += sys.getsizeof(state) + sys.getsizeof(row)
+            sampled += sum(sys.getsizeof(v) for v in row.values())
+        return sys.getsizeof(q_table) + sampled * len(q_table) // len(states)
+
+    def snapshot(self, sarsa):
+        seen = len(sarsa.visit_counts)
+        record = {
+            "episode": sarsa.episode_count,
+            "steps": self.steps,
+            "states_seen": seen,
+            "table_rows": len(sarsa.q_table),
+            "table_bytes": self.memory_bytes(sarsa.q_table),
+            "new_states": self.new_states,
+            "new_state_rate": self.new_states / self.steps if self.steps else 0.0,
+            "td_count": self.td_count,
+            "td_mean": self.td_sum / self.td_count if self.td_count else 0.0,
+            "td_max": self.td_max,
+            "td_histogram": self.td_histogram,
+            "visit_histogram": self.visit_histogram(sarsa.visit_counts),
+        }
+        if self.state_space_size:
+            record["coverage"] = seen / self.state_space_size
+        return record
+
+    def export(self, path, record):
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(path, "a") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    @staticmethod
+    def visit_histogram(visit_counts, edges=(1, 2, 5, 10, 100, 1000, 10000)):
+        # Number of states per visit-count bucket (bucket i holds counts <= edges[i])
+        histogram = [0] * (len(edges) + 1)
+        for visits in visit_counts.values():
+            histogram[bisect.bisect_left(edges, visits)] += 1
+        return histogram
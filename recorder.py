@@ -0,0 +1,184 @@
+import os
+import json
+
+import numpy as np
+
+from enemies import Enemy
+from knight import Knight
+from bird import Bird
+from sarsa import SARSA
+
+PLAYER, ENEMY, KNIGHT, BIRD = 0, 1, 2, 3
+ENTITY_NAMES = ["player", "enemy", "knight", "bird"]
+
+# One fixed-width row per entity per tick
+RECORD_DTYPE = np.dtype([
+    ("tick", "<u4"),
+    ("entity", "u1"),
+    ("alive", "u1"),
+    ("action", "u1"),     # animation/state index (Character.action)
+    ("decision", "i1"),   # index into SARSA.actions, -1 if none
+    ("x", "<i2"),
+    ("y", "<i2"),
+    ("health", "<i2"),
+    ("state", "<i4"),     # StateCodec id, -1 if none
+    ("reward", "<f4"),
+    ("decided", "u1"),    # the agent chose state/decision on this tick
+])
+
+ENTITY_CODECS = {ENEMY: Enemy.state_codec, KNIGHT: Knight.state_codec, BIRD: Bird.state_codec}
+ENTITY_ACTIONS = {ENEMY: "enemy", KNIGHT: "knight", BIRD: "bird"}
+
+
+def read_meta(path):
+    with open(f"{path}.json", "r") as f:
+        return json.load(f)
+
+
+class TrajectoryRecorder:
+    def __init__(self, path, chunk_size=65536, meta=None):
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self.path = path
+        # Extra fields for the .json sidecar, e.g. {"demonstrator": "knight"}
+        self.extra_meta = meta or {}
+        self.buffer = np.zeros(chunk_size, dtype=RECORD_DTYPE)
+        self.count = 0
+        self.rows_written = 0
+        self.file = open(path, "wb")
+        self.previous_rewards = {}
+        self.action_indices = {}
+        for entity, character_type in ENTITY_ACTIONS.items():
+            actions = SARSA.ACTIONS[character_type]
+            self.action_indices[entity] = {a: i for i, a in enumerate(actions)}
+        self.write_meta()
+
+    def write_meta(self):
+        meta = {
+            "dtype": RECORD_DTYPE.descr,
+            "entities": ENTITY_NAMES,
+            "actions": {ENTITY_NAMES[e]: SARSA.ACTIONS[t] for e, t in ENTITY_ACTIONS.items()},
+            "state_factors": {ENTITY_NAMES[e]: c.factors for e, c in ENTITY_CODECS.items()},
+        }
+        meta.update(self.extra_meta)
+        with open(f"{self.path}.json", "w") as f:
+            json.dump(meta, f, indent=2)
+
+    def record(self, tick, player=None, enemy=None, knight=None, bird=None):
+        if self.count + 4 > len(self.buffer):
+            self.flush()
+        if tick == 0:
+            # A new episode: the agents' running totals started again at 0
+            self.previous_rewards.clear()
+        if player is not None:
+            self.add_row(tick, PLAYER, player)
+        if enemy is not None:
+            self.add_row(tick, ENEMY, enemy)
+        if knight is not None:
+            self.add_row(tick, KNIGHT, knight)
+        if bird is not None:
+            self.add_row(tick, BIRD, bird)
+
+    def add_row(self, tick, entity, sprite):
+        decision = -1
+        state = -1
+        reward = 0.0
+        decided = False
+        if entity != PLAYER:
+            # Rewards are logged as the per-tick change in the agent's running
+            # total, which only moves by what get_reward() credits to the
+            # learner; agents credit a decision's reward on the following tick.
+            total = sprite.total_reward
+            reward = total - self.previous_rewards.get(entity, 0)
+            self.previous_rewards[entity] = total
+            if sprite.previous_action is not None:
+                decision = self.action_indices[entity].get(sprite.previous_action, -1)
+            if sprite.previous_state is not None:
+                state = ENTITY_CODECS[entity].encode(sprite.previous_state)
+                # Between decisions (action repeat, deferred by a scheduler)
+                # the previous ones are logged again; a decision tick leaves
+                # the countdown at decision_interval - 1
+                sarsa = sprite.sarsa
+                decided = getattr(sarsa, "ticks_until_decision", 0) == sarsa.decision_interval - 1
+
+        if entity == BIRD:
+            # The bird has no health/animation state (and Sprite.alive is a method)
+            alive, action, health = True, 0, 0
+        else:
+            alive, action, health = sprite.alive, sprite.action, sprite.health
+
+        self.buffer[self.count] = (
+            tick,
+            entity,
+            alive,
+            action,
+            decision,
+            sprite.rect.x,
+            sprite.rect.y,
+            health,
+            state,
+            reward,
+            decided,
+        )
+        self.count += 1
+
+    def flush(self):
+        if self.count:
+            self.file.write(self.buffer[:self.count].tobytes())
+            self.rows_written += self.count
+            self.count = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TrajectoryReader:
+    def __init__(self, path):
+        self.path = path
+        self.meta = read_meta(path)
+        # Older recordings have no "decided" column
+        dtype = np.dtype([tuple(field) for field in self.meta["dtype"]])
+        if os.path.getsize(path) == 0:
+            self.records = np.zeros(0, dtype=dtype)
+        else:
+            self.records = np.memmap(path, dtype=dtype, mode="r")
+
+    def __len__(self):
+        return len(self.records)
+
+    def ticks(self, start, stop=None):
+        # Rows are written in tick order, so scrubbing is a binary search
+        tick = self.records["tick"]
+        lo = np.searchsorted(tick, start, side="left")
+        hi = len(tick) if stop is None else np.searchsorted(tick, stop, side="left")
+        return self.records[lo:hi]
+
+    def entity(self, entity, records=None):
+        records = self.records if records is None else records
+        return records[records["entity"] == entity]
+
+    def chunks(self, chunk_size=1 << 20):
+        for start in range(0, len(self.records), chunk_size):
+            yield self.records[start:start + chunk_size]
+
+    def load(self, fields=None):
+        if fields is None:
+            return np.array(self.records)
+        return {field: np.array(self.records[field]) for field in fields}
+
+    def state_strings(self, entity, state_ids):
+        codec = ENTITY_CODECS[entity]
+        return [codec.decode(int(s)) if s >= 0 else None for s in state_ids]
+
+    def action_names(self, entity, decisions):
+        actions = self.meta["actions"][ENTITY_NAMES[entity]]
+        return [actions[d] if d >= 0 else None for d in decisions]
@@ -0,0 +1,116 @@
+import pygame
+
+from enemies import Enemy, Arrow
+from state_codec import StateCodec
+from observation import PLAYER, ROGUE
+
+
+class Rogue(Enemy):
+    # Close-quarters cousin of the archer: throws daggers from a distance
+    # (far_attack) or stabs at melee range (close_attack), both on one
+    # cooldown. It sees the archer's state plus whether the player is
+    # swinging, so an archer's table can warm-start it (see transfer.py).
+    # Everything else (movement, knockback, rewards, the decision loop) is
+    # the archer's; its daggers fly in the inherited arrow_group. There is
+    # no rogue art yet: it wears the archer's frames, tinted.
+    animation_lists = None
+    TINT = (150, 110, 190, 255)
+    CHARACTER_TYPE = "rogue"
+    ROW = ROGUE
+
+    # Values of each "_"-separated part of get_state, in order. The first
+    # eight are Enemy.STATE_FACTORS
+    STATE_FACTORS = Enemy.STATE_FACTORS + [
+        ["player_attacking", "player_not_attacking"],
+    ]
+    state_codec = StateCodec(STATE_FACTORS)
+
+    @classmethod
+    def load_animations(cls):
+        if cls.animation_lists is None:
+            if Enemy.animation_lists is None:
+                Enemy.load_animations()
+            cls.animation_lists = []
+            for frames in Enemy.animation_lists:
+                tinted = []
+                for img in frames:
+                    img = img.copy()
+                    img.fill(cls.TINT, special_flags=pygame.BLEND_RGBA_MULT)
+                    tinted.append(img)
+                cls.animation_lists.append(tinted)
+
+    def __init__(self, x, y, decision_interval=1):
+        super().__init__(x, y, decision_interval)
+        self.speed = 6
+        self.direction = -1
+        self.far_cooldown = 90
+        self.close_cooldown = 45
+        self.close_range = 50
+        self.close_damage = 10
+        self.attack_kind = None
+        self.attack_landed = False
+
+    def get_state(self, player):
+        player_attacking = "player_attacking" if self.observation.attacking[PLAYER] else "player_not_attacking"
+        return f"{super().get_state(player)}_{player_attacking}"
+
+    def act(self, action, tile_map):
+        if self.alive and self.knockback_velocity == 0:
+            if action == 'move_left':
+                self.direction = -1
+                self.move_ai(tile_map)
+            elif action == 'move_right':
+                self.direction = 1
+                self.move_ai(tile_map)
+            elif action == 'far_attack':
+                self.start_attack("far", self.far_cooldown)
+            elif action == 'close_attack':
+                self.start_attack("close", self.close_cooldown)
+
+    def start_attack(self, kind, cooldown):
+        if self.attack(cooldown):
+            self.attack_kind = kind
+            self.attack_landed = False
+            return True
+        return False
+
+    def shoot_arrow(self):
+        # End of the attack animation: only a throw lets go of a dagger
+        if self.attack_kind == "far":
+            dagger = Arrow(self.rect.centerx + 30 * self.direction, self.rect.centery - 10, self.direction)
+            dagger.speed = 9
+            self.arrow_group.add(dagger)
+        self.attack_kind = None
+
+    def check_melee_hit(self, player):
+        # Called in the combat phase: a stab lands once per attack, on a
+        # player within reach in front of us
+        if not (self.attacking and self.attack_kind == "close" and not self.attack_landed):
+            return False
+        obs = self.observation
+        dx = obs.cdx[ROGUE][PLAYER]
+        if (abs(dx) < self.close_range and abs(obs.cdy[ROGUE][PLAYER]) < 50 and
+                (dx > 0) == (self.direction > 0)):
+            health = player.health
+            player.take_damage(self.close_damage, self.direction)
+            self.attack_landed = True
+            if player.health < health:
+                self.hit_player = True
+                self.killed_player = not player.alive
+            return True
+        return False
+
+    def take_damage(self, amount, knockback_direction):
+        health = self.health
+        super().take_damage(amount, knockback_direction)
+        if self.health < health:
+            # A hit interrupts the throw or the stab
+            self.attacking = False
+            self.attack_kind = None
+
+    def reset(self):
+        super().reset()
+        self.rect.x = 600
+        self.direction = -1
+        self.attack_kind = None
+        self.attack_landed = False
@@ -4,8 +4,49 @@ import json
 import random
 import time
 
+import qtable
+from convergence import ConvergenceMonitor
+from planner import Planner
+from policy import MappedPolicy, latest_policy, publish_policy
+from qtable_stats import QTableStats
+from sharded_table import ShardedQTable
+
 class SARSA:
-    def __init__(self, character_type):
+    ACTIONS = {
+        "knight": ['move_left', 'move_right', 'attack', 'block', 'maintain_block', 'idle'],
+        "enemy": ['move_left', 'move_right', 'shoot', 'idle'],
+        "bird": [
+            'move_up', 'move_down', 'move_left', 'move_right',
+            'move_up_left', 'move_up_right', 'move_down_left', 'move_down_right',
+            'activate_shield', 'idle'
+        ],
+        "rogue": ['move_left', 'move_right', 'far_attack', 'close_attack', 'idle'],
+    }
+    HYPERPARAMETERS = (
+        "epsilon", "epsilon_decay", "epsilon_min",
+        "alpha", "alpha_decay", "alpha_min", "decay_alpha",
+        "gamma",
+    )
+    Q_TABLE_FOLDERS = {
+        "knight": 'knight_q_tables',
+        "enemy": 'q_tables',
+        "bird": 'bird_q_tables',
+        "rogue": 'rogue_q_tables',
+    }
+    # When set, new instances map the character's published policy (see
+    # policy.py) read-only instead of loading their own copy of the latest
+    # checkpoint. Such instances act greedily from it and never learn.
+    shared_policy = False
+    # Tools that install their own tables (evaluation, sweeps, leagues)
+    # switch this off so building an agent doesn't parse the latest
+    # checkpoint first; arena.init_worker does it for every pool worker
+    load_checkpoints = True
+    # Optional MetricsLog shared by every agent (metrics_log.py): one row
+    # per episode, plus checkpoint loads and saves. Without one those two
+    # are printed.
+    metrics_log = None
+
+    def __init__(self, character_type, decision_interval=1, state_space_size=None, **hyperparameters):
         self.character_type = character_type
         self.epsilon = 0
         self.epsilon_decay = 0.999997
@@ -13,94 +54,311 @@ class SARSA:
         self.alpha = 0.1
         self.alpha_decay = 0.9999
         self.alpha_min = 0.01
+        self.decay_alpha = False
         self.gamma = 0.9
+        self.configure(**hyperparameters)
 
-        if character_type == "knight":
-            self.actions = ['move_left', 'move_right', 'attack', 'block', 'maintain_block', 'idle']
-            self.q_table_folder = 'knight_q_tables'
-        elif character_type == "enemy":
-            self.actions = ['move_left', 'move_right', 'shoot', 'idle']
-            self.q_table_folder = 'q_tables'
-        elif character_type == "bird":
-            self.actions = [
-                'move_up', 'move_down', 'move_left', 'move_right',
-                'move_up_left', 'move_up_right', 'move_down_left', 'move_down_right',
-                'activate_shield', 'idle'
-            ]
-            self.q_table_folder = 'bird_q_tables'
-        elif character_type == "rogue":
-            self.actions = ['move_left', 'move_right', 'far_attack', 'close_attack', 'idle']
-            self.q_table_folder = 'rogue_q_tables'
-        else:
+        if character_type not in SARSA.ACTIONS:
             raise ValueError(f"Unknown character type: {character_type}")
+        self.actions = list(SARSA.ACTIONS[character_type])
+        self.q_table_folder = SARSA.Q_TABLE_FOLDERS[character_type]
 
-        self.q_table = self.load_q_table()
+        # Times each state was acted in, used to prune rarely seen rows
+        self.visit_counts = {}
+        self.learner = None
+        # Optional model-based planning after every real update (planner.py)
+        self.planner = None
+        # A frozen agent keeps acting on its table but learns nothing
+        self.frozen = False
+        self.policy = None
+        path = latest_policy(self.published_folder()) if SARSA.shared_policy else None
+        if path:
+            self.policy = MappedPolicy(path)
+            self.q_table = {}
+            self.frozen = True
+        elif SARSA.load_checkpoints:
+            self.q_table = self.load_q_table()
+        else:
+            self.q_table = {}
         self.episode_count = self.get_latest_episode_count()
 
+        # Coverage / growth / TD-error instrumentation, exported once per
+        # episode to metrics_path (a JSON-lines file) when it is set
+        self.stats = QTableStats(state_space_size)
+        self.metrics_path = None
+        # Optional convergence tracking and stopping rule (convergence.py)
+        self.convergence = None
+
+        # Optional periodic compaction during training (see compact()), and
+        # the precision of npz checkpoints
+        self.checkpoint_format = "json"
+        self.compact_interval = None
+        self.compact_min_visits = 2
+        self.compact_dtype = "float32"
+
+        # Action repeat: a new action is chosen every `decision_interval`
+        # ticks and the rewards in between are folded into one discounted
+        # return for a single update.
+        self.decision_interval = decision_interval
+        self.ticks_until_decision = 0
+        self.pending_reward = 0.0
+        self.pending_discount = 1.0
+        self.transition = None
+        self.episode_ticks = 0
+        self.episode_started = time.perf_counter()
+        # Exploration draws from the shared random module unless the agent
+        # is given a stream of its own (seed_rng, Arena.seed)
+        self.rng = random
+
+    def configure(self, **hyperparameters):
+        for name, value in hyperparameters.items():
+            if name not in SARSA.HYPERPARAMETERS:
+                raise ValueError(f"Unknown hyperparameter: {name}")
+            setattr(self, name, value)
+
+    def checkpoint_files(self):
+        return (glob.glob(f'{self.q_table_folder}/*.json') +
+                glob.glob(f'{self.q_table_folder}/*.npz'))
+
     def get_latest_episode_count(self):
-        q_table_files = glob.glob(f'{self.q_table_folder}/*.json')
+        q_table_files = self.checkpoint_files()
         if not q_table_files:
             return 0
         latest_file = max(q_table_files, key=os.path.getctime)
         return int(latest_file.split('_')[-1].split('.')[0]) + 1
 
-    def load_q_table(self):
-        q_table_files = glob.glob(f'{self.q_table_folder}/*.json')
-        if not q_table_files:
-            return {}
-        
-        # Extract episode numbers
+    @staticmethod
+    def latest_checkpoint(character_type):
+        # Path of the checkpoint with the highest episode number, or None
+        folder = SARSA.Q_TABLE_FOLDERS[character_type]
         episode_numbers = []
-        for file in q_table_files:
+        for file in glob.glob(f'{folder}/*.json') + glob.glob(f'{folder}/*.npz'):
             try:
                 episode_num = int(file.split('_')[-1].split('.')[0])
                 episode_numbers.append((episode_num, file))
             except ValueError:
                 continue
-        
         if not episode_numbers:
+            return None
+        return max(episode_numbers, key=lambda x: x[0])[1]
+
+    def load_q_table(self):
+        latest_file = SARSA.latest_checkpoint(self.character_type)
+        if latest_file is None:
             return {}
-        
-        # Get the file with the highest episode number
-        latest_file = max(episode_numbers, key=lambda x: x[0])[1]
-        print(f"Loading Q-table from: {latest_file}")
-        with open(latest_file, 'r') as f:
-            return json.load(f)
+        self.report("load", latest_file, f"Loading Q-table from: {latest_file}")
+        q_table, self.visit_counts = qtable.load_checkpoint(latest_file)
+        return q_table
+
+    def published_folder(self):
+        return f'{self.q_table_folder}/published'
+
+    def publish_policy(self, codec):
+        if self.learner:
+            self.learner.sync()
+        return publish_policy(self.published_folder(), self.q_table, self.actions, codec, self.episode_count)
 
     def save_q_table(self):
+        if self.policy is not None:
+            # Nothing of our own to save
+            return
+        if self.learner:
+            # Make sure every queued transition has reached the table being saved
+            self.learner.sync()
         if not os.path.exists(self.q_table_folder):
             os.makedirs(self.q_table_folder)
-        filename = f'{self.q_table_folder}/q_table_episode_{self.episode_count}.json'
-        with open(filename, 'w') as f:
-            json.dump(self.q_table, f, indent=2)
-        print(f"Q-table saved as {filename}")
+        if self.checkpoint_format == "npz":
+            filename = f'{self.q_table_folder}/q_table_episode_{self.episode_count}.npz'
+            qtable.save_npz(filename, self.q_table, self.actions, self.visit_counts, self.compact_dtype)
+        else:
+            filename = f'{self.q_table_folder}/q_table_episode_{self.episode_count}.json'
+            with open(filename, 'w') as f:
+                json.dump(dict(self.q_table), f, indent=2)
+        self.report("save", filename, f"Q-table saved as {filename}")
+
+    def report(self, event, detail, message):
+        if SARSA.metrics_log:
+            SARSA.metrics_log.event(self.character_type, event, detail)
+        else:
+            print(message)
+
+    def compact(self, min_visits=None):
+        # Drop never-updated and rarely visited rows; the rest keep their
+        # full precision (compact_dtype only applies to npz checkpoints).
+        # Returns the number of rows removed.
+        min_visits = self.compact_min_visits if min_visits is None else min_visits
+        if self.policy is not None:
+            return 0
+        if self.learner:
+            self.learner.sync()
+        before = len(self.q_table)
+        compacted = qtable.compact_table(self.q_table, self.visit_counts, min_visits)
+        if isinstance(self.q_table, ShardedQTable):
+            compacted = ShardedQTable(self.q_table.num_shards, compacted)
+        self.q_table = compacted
+        # Visit counts stay: the states were seen (states_seen and coverage
+        # in QTableStats), and a pruned state that keeps coming back earns
+        # its row at the next compaction
+        if self.learner:
+            self.learner.retain(self, self.q_table)
+        return before - len(self.q_table)
 
     def get_action(self, state):
-        if state not in self.q_table:
-            self.q_table[state] = {a: 0 for a in self.actions}
-        
-        if random.random() < self.epsilon:
-            return random.choice(self.actions)
+        # Unseen states behave like an all-zero row but are not stored until
+        # they are actually updated.
+        if self.policy is not None:
+            if self.rng.random() < self.epsilon:
+                return self.rng.choice(self.actions)
+            return self.policy.best_action(state)
+        visits = self.visit_counts.get(state, 0)
+        self.visit_counts[state] = visits + 1
+        self.stats.record_visit(visits == 0)
+        if self.rng.random() < self.epsilon:
+            return self.rng.choice(self.actions)
+        return self.get_best_action(state)
+
+    def seed_rng(self, seed):
+        self.rng = random.Random(seed)
+        return self.rng
+
+    def update_q_table(self, state, action, reward, next_state, next_action, discount=None):
+        self.apply_update(self.q_table, state, action, reward, next_state, next_action, discount)
+        if self.planner:
+            self.planner.update(self.q_table, state, action, reward, next_state,
+                                self.gamma if discount is None else discount)
+
+    def apply_update(self, q_table, state, action, reward, next_state, next_action, discount=None):
+        # next_state is None for the final transition of an episode; discount
+        # defaults to gamma (one tick between state and next_state)
+        if discount is None:
+            discount = self.gamma
+        if isinstance(q_table, ShardedQTable):
+            td_error = q_table.td_update(state, action, reward, next_state, next_action,
+                                         discount, self.alpha, self.actions)
+            self.stats.record_td(td_error)
+            return
+        if state not in q_table:
+            q_table[state] = {a: 0 for a in self.actions}
+        if next_state is None:
+            next_q = 0
+        else:
+            if next_state not in q_table:
+                q_table[next_state] = {a: 0 for a in self.actions}
+            next_q = q_table[next_state][next_action]
+
+        current_q = q_table[state][action]
+        td_error = reward + discount * next_q - current_q
+        self.stats.record_td(td_error)
+        q_table[state][action] = current_q + self.alpha * td_error
+
+    def use_sharded_table(self, num_shards=64):
+        # Lets several actor threads share this agent's table (pass the same
+        # ShardedQTable to each SARSA); see sharded_table.py
+        if not isinstance(self.q_table, ShardedQTable):
+            self.q_table = ShardedQTable(num_shards, self.q_table)
+        return self.q_table
+
+    def attach_convergence(self, **rule):
+        self.convergence = ConvergenceMonitor(**rule)
+        return self.convergence
+
+    @property
+    def converged(self):
+        return self.convergence is not None and self.convergence.converged
+
+    def attach_planner(self, planning_steps=10, threshold=1e-3):
+        self.planner = Planner(self, planning_steps, threshold)
+        return self.planner
+
+    def attach_learner(self, learner):
+        learner.register(self)
+        self.learner = learner
+
+    def observe(self, state, action, reward, next_state, next_action, discount=None):
+        # Hand the transition to the background learner if there is one,
+        # otherwise learn inline.
+        if self.frozen:
+            return
+        if self.learner:
+            self.learner.push(self, (state, action, reward, next_state, next_action, discount))
         else:
-            return max(self.q_table[state], key=self.q_table[state].get)
+            self.update_q_table(state, action, reward, next_state, next_action, discount)
+
+    def should_decide(self):
+        return self.ticks_until_decision <= 0
 
-    def update_q_table(self, state, action, reward, next_state, next_action):
-        if state not in self.q_table:
-            self.q_table[state] = {a: 0 for a in self.actions}
-        if next_state not in self.q_table:
-            self.q_table[next_state] = {a: 0 for a in self.actions}
+    def add_reward(self, reward):
+        self.pending_reward += self.pending_discount * reward
+        self.pending_discount *= self.gamma
 
-        current_q = self.q_table[state][action]
-        next_q = self.q_table[next_state][next_action]
-        new_q = current_q + self.alpha * (reward + self.gamma * next_q - current_q)
-        self.q_table[state][action] = new_q
+    def decide(self, state, previous_state, previous_action):
+        # Choose the next action. The transition from the previous decision,
+        # with the return collected since, is learned from in learn() (the
+        # Arena's learn phase, after combat).
+        action = self.get_action(state)
+        if previous_state is not None:
+            self.transition = (previous_state, previous_action, self.pending_reward,
+                               state, action, self.pending_discount)
+        self.pending_reward = 0.0
+        self.pending_discount = 1.0
+        self.ticks_until_decision = self.decision_interval
+        return action
+
+    def finish(self, previous_state, previous_action):
+        # Terminal update with whatever return is still pending
+        if previous_state is not None:
+            self.transition = (previous_state, previous_action, self.pending_reward, None, None, None)
+        self.pending_reward = 0.0
+        self.pending_discount = 1.0
+        self.ticks_until_decision = 0
+
+    def learn(self):
+        if self.transition is not None:
+            transition, self.transition = self.transition, None
+            self.observe(*transition)
+
+    def tick(self):
+        self.ticks_until_decision -= 1
+        self.episode_ticks += 1
 
     def get_best_action(self, state):
-        if state not in self.q_table:
-            self.q_table[state] = {a: 0 for a in self.actions}
-        return max(self.q_table[state], key=self.q_table[state].get)
+        if self.policy is not None:
+            return self.policy.best_action(state)
+        row = self.q_table.get(state)
+        if row is None:
+            return self.actions[0]
+        return max(row, key=row.get)
     
-    def end_episode(self):
+    def enable_metrics(self, path=None):
+        self.metrics_path = path or f'{self.q_table_folder}/metrics.jsonl'
+
+    def end_episode(self, reward=None):
+        # reward is the episode's total, for the convergence monitor
+        changes = {}
+        if self.convergence:
+            if self.learner:
+                self.learner.sync()
+            changes = self.convergence.end_episode(self, reward)
+        if self.metrics_path:
+            record = self.stats.snapshot(self)
+            if changes:
+                record["convergence"] = changes
+            self.stats.export(self.metrics_path, record)
+        if SARSA.metrics_log:
+            now = time.perf_counter()
+            stats = self.stats
+            SARSA.metrics_log.episode((
+                round(time.time(), 3), self.character_type, self.episode_count, self.episode_ticks,
+                stats.steps, reward, self.epsilon, self.alpha, len(self.q_table), len(self.visit_counts),
+                stats.td_sum / stats.td_count if stats.td_count else 0.0, round(now - self.episode_started, 6),
+                changes.get("delta_max", ""), changes.get("delta_mean", ""), changes.get("policy_change", ""),
+            ))
+        self.episode_ticks = 0
+        self.episode_started = time.perf_counter()
+        self.stats.reset_episode()
         self.episode_count += 1
         self.epsilon = max(self.epsilon * self.epsilon_decay, self.epsilon_min)
-        # self.alpha = max(self.alpha * self.alpha_decay, self.alpha_min)
+        if self.compact_interval and self.episode_count % self.compact_interval == 0:
+            self.compact()
+        if self.decay_alpha:
+            self.alpha = max(self.alpha * self.alpha_decay, self.alpha_min)
@@ -0,0 +1,89 @@
+import math
+import time
+
+
+class DecisionScheduler:
+    # Shares a per-frame time budget between the decisions (get_state plus
+    # the SARSA action choice) of every registered agent. Each frame the
+    # scheduler works out how many decisions fit the budget from their
+    # measured average cost, and staggers the agents round-robin: with
+    # `stride` frames per turn, an agent may decide on frames where
+    # (slot + frame) % stride == 0 and repeats its last action otherwise.
+    # Agents under immediate threat (their threatened() is true) decide
+    # straight away, and an agent is never kept waiting for more than
+    # `max_stride` frames, so a crowded scene slows the agents' reactions
+    # down instead of the frame rate.
+    #
+    # Whoever drives the frame calls begin_frame() once per frame, before
+    # the arenas step; several arenas can share one scheduler.
+    def __init__(self, budget_ms=2.0, max_stride=8, smoothing=0.1):
+        self.budget = budget_ms / 1000
+        self.max_stride = max_stride
+        self.smoothing = smoothing
+        self.slots = 0
+        self.frame = 0
+        self.stride = 1
+        self.cost = 0.0
+        self.spent = 0.0
+        self.started = None
+        self.waiting = {}
+
+        # Counters
+        self.decisions = 0
+        self.frame_decisions = 0
+        self.deferred = 0
+        self.urgent = 0
+        self.forced = 0
+        self.frames_over_budget = 0
+
+    def register(self, agent):
+        agent.scheduler = self
+        agent.schedule_slot = self.slots
+        self.slots += 1
+        self.waiting[agent] = 0
+
+    def begin_frame(self):
+        if self.frame_decisions:
+            average = self.spent / self.frame_decisions
+            self.cost = average if not self.cost else self.cost + self.smoothing * (average - self.cost)
+        if self.spent > self.budget:
+            self.frames_over_budget += 1
+        if self.cost:
+            fits = max(1, int(self.budget / self.cost))
+            self.stride = min(self.max_stride, max(1, math.ceil(self.slots / fits)))
+        self.frame += 1
+        self.spent = 0.0
+        self.frame_decisions = 0
+
+    def may_decide(self, agent, *context):
+        # Asked by an agent whose decision is due; context is passed on to
+        # its threatened(). A granted decision is timed until decided(); a
+        # refused one repeats the last action
+        waited = self.waiting[agent]
+        if (agent.schedule_slot + self.frame) % self.stride == 0:
+            pass
+        elif waited + 1 >= self.max_stride:
+            self.forced += 1
+        elif agent.threatened(*context):
+            self.urgent += 1
+        else:
+            self.waiting[agent] = waited + 1
+            self.deferred += 1
+            return False
+        self.waiting[agent] = 0
+        self.started = time.perf_counter()
+        return True
+
+    def decided(self):
+        # Decisions made without asking (the first one of an episode) are
+        # not timed
+        if self.started is not None:
+            self.spent += time.perf_counter() - self.started
+            self.started = None
+            self.frame_decisions += 1
+        self.decisions += 1
+
+    def stats(self):
+        return {"decisions": self.decisions, "deferred": self.deferred, "urgent": self.urgent,
+                "forced": self.forced, "frames_over_budget": self.frames_over_budget,
+                "stride": self.stride, "decision_us": self.cost * 1e6}
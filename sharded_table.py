@@ -0,0 +1,87 @@
+import threading
+from collections.abc import MutableMapping
+
+
+class ShardedQTable(MutableMapping):
+    # Q-table that several actor threads can share. States are spread over
+    # `num_shards` dicts by hash, each with its own lock for writers. Rows
+    # are never changed in place: an update builds a new row and swaps it
+    # in, so readers (get_best_action, next-state lookups) take no lock and
+    # always see a whole row. Works as a drop-in for the plain dict in
+    # SARSA.q_table (see SARSA.use_sharded_table).
+    def __init__(self, num_shards=64, rows=None):
+        self.num_shards = num_shards
+        self.shards = [{} for _ in range(num_shards)]
+        self.locks = [threading.Lock() for _ in range(num_shards)]
+        if rows:
+            for state, row in rows.items():
+                self.shard(state)[state] = dict(row)
+
+    def shard_index(self, state):
+        return hash(state) % self.num_shards
+
+    def shard(self, state):
+        return self.shards[hash(state) % self.num_shards]
+
+    # Mapping interface (reads are lock-free)
+
+    def __getitem__(self, state):
+        return self.shard(state)[state]
+
+    def get(self, state, default=None):
+        return self.shard(state).get(state, default)
+
+    def __contains__(self, state):
+        return state in self.shard(state)
+
+    def __setitem__(self, state, row):
+        i = self.shard_index(state)
+        with self.locks[i]:
+            self.shards[i][state] = dict(row)
+
+    def __delitem__(self, state):
+        i = self.shard_index(state)
+        with self.locks[i]:
+            del self.shards[i][state]
+
+    def __iter__(self):
+        for shard in self.shards:
+            yield from list(shard)
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    # Updates
+
+    def ensure_row(self, state, actions):
+        i = self.shard_index(state)
+        shard = self.shards[i]
+        row = shard.get(state)
+        if row is None:
+            with self.locks[i]:
+                row = shard.setdefault(state, {a: 0 for a in actions})
+        return row
+
+    def td_update(self, state, action, reward, next_state, next_action, discount, alpha, actions):
+        # One SARSA backup; returns the TD error. Only the row being written
+        # is locked, the next-state value is read from its published row.
+        if next_state is None:
+            next_q = 0
+        else:
+            next_q = self.ensure_row(next_state, actions)[next_action]
+        i = self.shard_index(state)
+        shard = self.shards[i]
+        with self.locks[i]:
+            row = shard.get(state)
+            new_row = dict(row) if row is not None else {a: 0 for a in actions}
+            current_q = new_row[action]
+            td_error = reward + discount * next_q - current_q
+            new_row[action] = current_q + alpha * td_error
+            shard[state] = new_row
+        return td_error
+
+    def to_dict(self):
+        table = {}
+        for shard in self.shards:
+            table.update(shard)
+        return table
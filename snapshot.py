@@ -0,0 +1,138 @@
+import math
+import operator
+import pickle
+
+from enemies import Arrow
+import game_clock
+
+# Attributes that are not world state: art, sprite groups (projectiles are
+# captured separately), the learner and shared or attached objects
+SKIPPED = {
+    "image", "animation_list", "animations", "shield_animations",
+    "arrow_group", "sarsa", "observation", "scheduler", "player", "rng",
+}
+PLAIN = (int, float, bool, str, tuple, type(None))
+# The per-decision part of a learner (SARSA, EnvController, RemoteSARSA);
+# the Q-table itself is not world state
+LEARNER_FIELDS = (
+    "ticks_until_decision", "pending_reward", "pending_discount", "transition",
+    "epsilon", "alpha", "episode_count", "action",
+)
+
+
+class Snapshotter:
+    # Captures and restores everything that changes while an arena runs:
+    # every plain attribute of the player and the agents, their rects, the
+    # learners' pending decision state, the arrow (and dagger) pools, the tick,
+    # the simulated clock and the random streams. A snapshot is a tuple of
+    # tuples (picklable, see save/load); restoring writes it back into the
+    # live sprites, so nothing is loaded or rebuilt.
+    #
+    # Projectiles removed by a restore go to a spare pool and are reused by
+    # the next one that needs more. Images are not captured: arrows get
+    # theirs back from their angle and characters redraw on their next
+    # animate(). Q-tables are not captured either, so forked rollouts share
+    # (and, unless frozen, keep training) the agents' tables.
+    #
+    # Exact replays need per-agent streams (Arena.seed) or a shared random
+    # module that nothing else draws from, simulated time (a wall clock
+    # cannot be rewound) and no DecisionScheduler, whose budget is measured
+    # in wall time.
+    def __init__(self, arena):
+        self.arena = arena
+        self.entities = [arena.player] + arena.agents
+        self.layout = tuple(type(entity).__name__ for entity in self.entities)
+        self.fields = [self.plain_fields(entity) for entity in self.entities]
+        self.getters = [operator.attrgetter(*names) for names in self.fields]
+        self.learners = [agent.sarsa for agent in arena.agents]
+        self.learner_fields = [tuple(n for n in LEARNER_FIELDS if hasattr(learner, n))
+                               for learner in self.learners]
+        self.groups = [agent.arrow_group for agent in arena.agents if hasattr(agent, "arrow_group")]
+        self.spares = []
+
+    @staticmethod
+    def plain_fields(entity):
+        return tuple(name for name, value in vars(entity).items()
+                     if not name.startswith("_") and name not in SKIPPED and name != "rect"
+                     and isinstance(value, PLAIN))
+
+    def streams(self):
+        # One entry per distinct stream. The shared random module counts as
+        # one while any owner still draws from it; with per-agent streams
+        # its (3 KB) state is left out
+        found = {}
+        for owner in [self.arena.player] + self.learners:
+            rng = getattr(owner, "rng", None)
+            if rng is not None:
+                found[id(rng)] = rng
+        return list(found.values())
+
+    def capture(self):
+        entities = tuple((tuple(entity.rect), getter(entity))
+                         for entity, getter in zip(self.entities, self.getters))
+        learners = tuple(tuple(getattr(learner, name) for name in names)
+                         for learner, names in zip(self.learners, self.learner_fields))
+        projectiles = tuple(tuple((a.rect.x, a.rect.y, a.speed, a.direction, a.vel_y, a.angle, a.stopped)
+                                  for a in group)
+                            for group in self.groups)
+        streams = tuple(rng.getstate() for rng in self.streams())
+        return (self.layout, self.arena.tick, game_clock.simulated_ticks,
+                entities, learners, projectiles, streams)
+
+    def restore(self, snapshot):
+        layout, tick, clock, entities, learners, projectiles, streams = snapshot
+        if layout != self.layout:
+            raise ValueError(f"Snapshot of {layout} does not fit this arena ({self.layout})")
+        for entity, names, (rect, values) in zip(self.entities, self.fields, entities):
+            entity.rect.update(rect)
+            if len(names) == 1:
+                values = (values,)
+            for name, value in zip(names, values):
+                setattr(entity, name, value)
+        for learner, names, values in zip(self.learners, self.learner_fields, learners):
+            for name, value in zip(names, values):
+                setattr(learner, name, value)
+        for group, states in zip(self.groups, projectiles):
+            self.restore_projectiles(group, states)
+        rngs = self.streams()
+        if len(rngs) != len(streams):
+            raise ValueError(f"Snapshot has {len(streams)} random streams, this arena {len(rngs)} (see Arena.seed)")
+        for rng, state in zip(rngs, streams):
+            rng.setstate(state)
+        self.arena.tick = tick
+        if clock is not None and game_clock.simulated_ticks is not None:
+            game_clock.simulated_ticks = clock
+        self.arena.observation.update()
+
+    def restore_projectiles(self, group, states):
+        # Reuse the group's own sprites in order (hit checks walk the group
+        # in insertion order), then spares, and only build new arrows when
+        # both run out
+        sprites = group.sprites()
+        for arrow in sprites[len(states):]:
+            group.remove(arrow)
+            self.spares.append(arrow)
+        for i, (x, y, speed, direction, vel_y, angle, stopped) in enumerate(states):
+            if i < len(sprites):
+                arrow = sprites[i]
+            else:
+                arrow = self.spares.pop() if self.spares else Arrow(x, y, direction)
+                group.add(arrow)
+            arrow.rect.x = x
+            arrow.rect.y = y
+            arrow.speed = speed
+            arrow.direction = direction
+            arrow.vel_y = vel_y
+            arrow.angle = angle
+            arrow.stopped = stopped
+            arrow.image = Arrow.rotated(round(math.degrees(angle)))
+
+
+def save(path, snapshot):
+    with open(path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
@@ -0,0 +1,55 @@
+class StateCodec:
+    # Maps the "_"-joined state strings built by the agents' get_state
+    # methods to dense integer ids (mixed radix over the state factors).
+    def __init__(self, factors):
+        self.factors = [tuple(values) for values in factors]
+        self.lookup = [{value: i for i, value in enumerate(values)} for values in self.factors]
+        self.radices = [len(values) for values in self.factors]
+        self.size = 1
+        for radix in self.radices:
+            self.size *= radix
+        self.cache = {}
+
+    def encode_values(self, values):
+        state_id = 0
+        for lookup, radix, value in zip(self.lookup, self.radices, values):
+            state_id = state_id * radix + lookup[value]
+        return state_id
+
+    def decode_values(self, state_id):
+        values = []
+        for values_list, radix in zip(reversed(self.factors), reversed(self.radices)):
+            state_id, digit = divmod(state_id, radix)
+            values.append(values_list[digit])
+        return tuple(reversed(values))
+
+    def encode(self, state):
+        # Returns -1 for strings that don't belong to this state space
+        state_id = self.cache.get(state)
+        if state_id is None:
+            values = self.parse(state)
+            state_id = -1 if values is None else self.encode_values(values)
+            self.cache[state] = state_id
+        return state_id
+
+    def decode(self, state_id):
+        return "_".join(self.decode_values(state_id))
+
+    def parse(self, state, position=0):
+        # Factor values may themselves contain "_", so try every candidate
+        # and backtrack on a dead end.
+        if position == len(self.factors):
+            return () if state == "" else None
+        for value in self.factors[position]:
+            if position == len(self.factors) - 1:
+                if state != value:
+                    continue
+                rest = ""
+            elif state.startswith(value + "_"):
+                rest = state[len(value) + 1:]
+            else:
+                continue
+            tail = self.parse(rest, position + 1)
+            if tail is not None:
+                return (value,) + tail
+        return None
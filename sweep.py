@@ -0,0 +1,208 @@
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import random
+from multiprocessing import Pool
+
+from arena import Arena, init_worker
+import qtable
+from sarsa import SARSA
+
+# Default search spaces; override with --space FILE (JSON of the same shape)
+SEARCH_SPACES = {
+    role: {
+        "alpha": [0.05, 0.1, 0.2, 0.4],
+        "gamma": [0.8, 0.9, 0.95, 0.99],
+        "epsilon": [0.05, 0.1, 0.2],
+        "epsilon_decay": [0.99, 0.995, 0.999],
+        "epsilon_min": [0.0, 0.01, 0.05],
+        "alpha_decay": [1.0, 0.999, 0.9999],
+    }
+    for role in ("knight", "enemy", "bird")
+}
+
+
+def run_trial(task):
+    # Runs in a worker process: continues one trial for `episodes` training
+    # episodes from its saved table, then scores it with greedy episodes.
+    # Training draws from the trial's own seed; each evaluation episode is
+    # seeded from task["eval_seeds"], which every trial of a rung shares.
+    # With a stopping rule the training ends early once the table has
+    # converged (see convergence.py). The opponents play the tables named in
+    # task["opponents"] (empty without one), never whatever is on disk.
+    random.seed(task["seed"])
+    arena = Arena(ai_player=True)
+    for agent in arena.agents:
+        agent.sarsa.frozen = True
+        agent.sarsa.epsilon = 0.0
+        path = task["opponents"].get(agent.sarsa.character_type)
+        if path:
+            agent.sarsa.q_table, agent.sarsa.visit_counts = qtable.load_checkpoint(path)
+
+    agent = getattr(arena, task["role"])
+    sarsa = agent.sarsa
+    params = dict(task["params"])
+    # alpha_decay only matters if decay is switched on
+    params["decay_alpha"] = params.get("alpha_decay", 1.0) < 1.0
+    sarsa.configure(**params)
+    sarsa.frozen = False
+    if os.path.exists(task["table_path"]):
+        sarsa.q_table, sarsa.visit_counts = qtable.load_checkpoint(task["table_path"])
+        sarsa.epsilon = task["epsilon"]
+        sarsa.alpha = task["alpha"]
+    else:
+        sarsa.q_table, sarsa.visit_counts = {}, {}
+    if task["stop"]:
+        sarsa.attach_convergence(**task["stop"])
+
+    trained = 0
+    for _ in range(task["episodes"]):
+        arena.reset()
+        arena.run_episode(task["max_ticks"])
+        arena.end_episode()
+        trained += 1
+        if sarsa.converged:
+            break
+    epsilon, alpha = sarsa.epsilon, sarsa.alpha
+
+    sarsa.frozen = True
+    sarsa.epsilon = 0.0
+    rewards = []
+    for seed in task["eval_seeds"]:
+        # Per-entity streams (Arena.seed): the scripted player plays the
+        # same episode whatever this trial's agent does
+        arena.seed(seed)
+        arena.reset()
+        arena.run_episode(task["max_ticks"])
+        rewards.append(agent.total_reward)
+        arena.end_episode()
+
+    qtable.save_npz(task["table_path"], sarsa.q_table, sarsa.actions, sarsa.visit_counts)
+    return task["trial"], sum(rewards) / len(rewards), epsilon, alpha, trained, sarsa.converged
+
+
+class Sweep:
+    # Successive halving: every rung trains all surviving trials for a
+    # growing number of episodes and keeps the best 1/eta by greedy
+    # evaluation reward, on one battery of seeded episodes per rung. With a stopping rule, a trial whose table has
+    # converged keeps its score but is not trained again, so its workers go
+    # to the trials still learning. Opponents play fixed tables: the paths
+    # in `opponents` ({role: checkpoint}), by default each role's latest
+    # checkpoint when the sweep starts, recorded in opponents.json.
+    def __init__(self, role, space, trials, folder="sweeps", seed=0, opponents=None):
+        self.role = role
+        self.folder = os.path.join(folder, role)
+        os.makedirs(self.folder, exist_ok=True)
+        # Trial tables carry state between rungs; never inherit a previous sweep's
+        for name in os.listdir(self.folder):
+            if name.startswith("trial_") and name.endswith(".npz"):
+                os.remove(os.path.join(self.folder, name))
+        rng = random.Random(seed)
+        grid = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+        if trials < len(grid):
+            grid = rng.sample(grid, trials)
+        self.trials = {
+            i: {"params": params, "reward": None, "rung": 0, "episodes": 0,
+                "epsilon": None, "alpha": None, "trained": 0, "converged": False}
+            for i, params in enumerate(grid)
+        }
+        self.seed = seed
+        if opponents is None:
+            opponents = {r: SARSA.latest_checkpoint(r) for r in SEARCH_SPACES if r != role}
+        self.opponents = {r: path for r, path in opponents.items() if path}
+        with open(os.path.join(self.folder, "opponents.json"), "w") as f:
+            json.dump(self.opponents, f, indent=2)
+
+    def run(self, min_episodes=10, eta=3, rungs=None, eval_episodes=10, max_ticks=3000, processes=None,
+            stop=None):
+        alive = list(self.trials)
+        if rungs is None:
+            rungs = max(1, int(math.log(len(alive), eta)) + 1)
+        with Pool(processes=processes, initializer=init_worker) as pool:
+            for rung in range(rungs):
+                episodes = min_episodes * eta ** rung
+                eval_seeds = [f"{self.seed}/eval/{rung}/{i}" for i in range(eval_episodes)]
+                tasks = []
+                for trial in alive:
+                    info = self.trials[trial]
+                    if info["converged"]:
+                        info["rung"] = rung
+                        continue
+                    tasks.append({
+                        "trial": trial, "role": self.role, "params": info["params"],
+                        "episodes": episodes - info["episodes"], "eval_seeds": eval_seeds,
+                        "max_ticks": max_ticks, "seed": self.seed * 1000003 + trial * 101 + rung,
+                        "table_path": os.path.join(self.folder, f"trial_{trial}.npz"),
+                        "epsilon": info["epsilon"], "alpha": info["alpha"], "stop": stop,
+                        "opponents": self.opponents,
+                    })
+                for trial, reward, epsilon, alpha, trained, converged in pool.imap_unordered(run_trial, tasks):
+                    info = self.trials[trial]
+                    info.update(reward=reward, rung=rung, episodes=episodes, epsilon=epsilon, alpha=alpha,
+                                trained=info["trained"] + trained, converged=converged)
+
+                alive.sort(key=lambda t: self.trials[t]["reward"], reverse=True)
+                print(f"Rung {rung}: {len(alive)} trials at {episodes} episodes "
+                      f"({len(tasks)} trained, {sum(self.trials[t]['converged'] for t in alive)} converged), "
+                      f"best reward {self.trials[alive[0]]['reward']:.1f}")
+                if rung < rungs - 1:
+                    alive = alive[:max(1, len(alive) // eta)]
+        self.write_results()
+        return alive[0]
+
+    def ranked(self):
+        # Trials that got further rank first, then by their latest reward
+        return sorted(self.trials.items(), key=lambda item: (item[1]["rung"], item[1]["reward"]), reverse=True)
+
+    def write_results(self):
+        names = sorted({name for info in self.trials.values() for name in info["params"]})
+        path = os.path.join(self.folder, "results.csv")
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["rank", "trial", "rung", "episodes", "trained", "converged", "eval_reward"] + names)
+            for rank, (trial, info) in enumerate(self.ranked(), 1):
+                writer.writerow([rank, trial, info["rung"], info["episodes"], info["trained"], int(info["converged"]),
+                                 f"{info['reward']:.3f}"] + [info["params"].get(name) for name in names])
+        print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel SARSA hyperparameter sweep with successive halving")
+    parser.add_argument("role", choices=sorted(SEARCH_SPACES))
+    parser.add_argument("--space", help="JSON file mapping role -> {hyperparameter: [values]}")
+    parser.add_argument("--trials", type=int, default=27)
+    parser.add_argument("--min-episodes", type=int, default=10, help="training episodes in the first rung")
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--rungs", type=int, default=None)
+    parser.add_argument("--eval-episodes", type=int, default=10,
+                        help="greedy episodes per rung, the same seeded battery for every trial")
+    parser.add_argument("--max-ticks", type=int, default=3000)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--folder", default="sweeps")
+    parser.add_argument("--stop", action="store_true",
+                        help="stop training a trial once its table has converged (see convergence.py)")
+    parser.add_argument("--stop-window", type=int, default=25,
+                        help="episodes in the rolling reward; a rung needs twice as many to converge")
+    parser.add_argument("--opponent", action="append", default=[], metavar="ROLE=PATH",
+                        help="checkpoint for an opponent role (default: its latest checkpoint)")
+    args = parser.parse_args()
+
+    space = SEARCH_SPACES[args.role]
+    if args.space:
+        with open(args.space, "r") as f:
+            space = json.load(f)[args.role]
+    opponents = None
+    if args.opponent:
+        opponents = {r: SARSA.latest_checkpoint(r) for r in SEARCH_SPACES if r != args.role}
+        opponents.update(item.split("=", 1) for item in args.opponent)
+    sweep = Sweep(args.role, space, args.trials, folder=args.folder, seed=args.seed, opponents=opponents)
+    stop = {"window": args.stop_window, "check_every": 10, "min_episodes": 0} if args.stop else None
+    best = sweep.run(min_episodes=args.min_episodes, eta=args.eta, rungs=args.rungs,
+                     eval_episodes=args.eval_episodes, max_ticks=args.max_ticks, processes=args.processes,
+                     stop=stop)
+    trained = sum(info["trained"] for info in sweep.trials.values())
+    print(f"Best trial {best}: {sweep.trials[best]['params']} ({trained} training episodes in all)")
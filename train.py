@@ -0,0 +1,103 @@
+import argparse
+import random
+import time
+
+from arena import Arena, init_headless
+from metrics_log import MetricsLog
+from sarsa import SARSA
+
+ROLES = ("enemy", "knight", "bird", "rogue")
+
+
+def train(roles, episodes, max_ticks=3000, epsilon=0.1, stop=True, rule=None, seed=0, checkpoint_format="json",
+          table_stats=False, compact_interval=None, compact_min_visits=2):
+    # Trains `roles` headless against the scripted player, starting from
+    # their latest checkpoints. With `stop`, each role's convergence monitor
+    # decides when it is done: it is saved and frozen there, and the run
+    # ends once every role is. Returns {role: episodes trained}.
+    random.seed(seed)
+    arena = Arena(ai_player=True, rogue="rogue" in roles)
+    learning = {}
+    for agent in arena.agents:
+        role = agent.sarsa.character_type
+        if role in roles:
+            agent.sarsa.epsilon = epsilon
+            agent.sarsa.checkpoint_format = checkpoint_format
+            agent.sarsa.compact_interval = compact_interval
+            agent.sarsa.compact_min_visits = compact_min_visits
+            if table_stats:
+                agent.sarsa.enable_metrics()
+            if stop:
+                agent.sarsa.attach_convergence(**(rule or {}))
+            learning[role] = agent
+        else:
+            agent.sarsa.frozen = True
+            agent.sarsa.epsilon = 0.0
+
+    trained = {role: 0 for role in learning}
+    start = time.perf_counter()
+    for episode in range(1, episodes + 1):
+        arena.reset()
+        arena.run_episode(max_ticks)
+        arena.end_episode()
+        for role, agent in list(learning.items()):
+            trained[role] = episode
+            if agent.sarsa.converged:
+                monitor = agent.sarsa.convergence
+                metrics = monitor.last_check
+                print(f"{role} converged after {episode} episodes: policy change {metrics['policy_change']:.3f}, "
+                      f"mean |dQ| {metrics['delta_mean']:.4f} over the last {monitor.check_every}, "
+                      f"training reward {monitor.last.get('train_reward', 0):.1f}")
+                agent.sarsa.save_q_table()
+                agent.sarsa.frozen = True
+                agent.sarsa.epsilon = 0.0
+                del learning[role]
+        if not learning:
+            break
+    for role, agent in learning.items():
+        print(f"{role} stopped at the episode limit ({episodes})")
+        agent.sarsa.save_q_table()
+    print(f"Trained for {time.perf_counter() - start:.1f}s")
+    return trained
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless training with convergence-based early stopping")
+    parser.add_argument("roles", nargs="+", choices=ROLES)
+    parser.add_argument("--episodes", type=int, default=10000, help="most episodes to train for")
+    parser.add_argument("--max-ticks", type=int, default=3000)
+    parser.add_argument("--epsilon", type=float, default=0.1)
+    parser.add_argument("--no-stop", action="store_true", help="always train for --episodes")
+    parser.add_argument("--check-every", type=int, default=25,
+                        help="episodes between stopping-rule checks (table changes are logged every episode)")
+    parser.add_argument("--window", type=int, default=50, help="training episodes in the rolling reward")
+    parser.add_argument("--max-delta-tol", type=float, default=None)
+    parser.add_argument("--mean-delta-tol", type=float, default=0.1)
+    parser.add_argument("--policy-tol", type=float, default=0.1)
+    parser.add_argument("--reward-tol", type=float, default=1.0,
+                        help="largest change of the rolling training reward, in standard errors")
+    parser.add_argument("--patience", type=int, default=3)
+    parser.add_argument("--min-episodes", type=int, default=100)
+    parser.add_argument("--format", choices=["json", "npz"], default="json")
+    parser.add_argument("--compact-every", type=int, default=None, metavar="N",
+                        help="compact the Q-tables every N episodes (see SARSA.compact)")
+    parser.add_argument("--compact-min-visits", type=int, default=2,
+                        help="rows visited fewer times than this are dropped when compacting")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--metrics-log", metavar="FOLDER", default="metrics",
+                        help="per-episode metrics as rotating CSV files (see metrics_log.py)")
+    parser.add_argument("--rotate-mb", type=float, default=64, help="size at which a metrics file rotates")
+    parser.add_argument("--table-stats", action="store_true",
+                        help="append Q-table coverage, growth and TD-error stats to each role's metrics.jsonl")
+    args = parser.parse_args()
+
+    init_headless()
+    SARSA.metrics_log = MetricsLog(args.metrics_log, max_bytes=int(args.rotate_mb * 1024 * 1024))
+    SARSA.metrics_log.start()
+    rule = {"check_every": args.check_every, "window": args.window, "max_delta_tol": args.max_delta_tol,
+            "mean_delta_tol": args.mean_delta_tol, "policy_tol": args.policy_tol,
+            "reward_tol": args.reward_tol, "patience": args.patience, "min_episodes": args.min_episodes}
+    train(args.roles, args.episodes, max_ticks=args.max_ticks, epsilon=args.epsilon, stop=not args.no_stop,
+          rule=rule, seed=args.seed, checkpoint_format=args.format, table_stats=args.table_stats,
+          compact_interval=args.compact_every, compact_min_visits=args.compact_min_visits)
+    SARSA.metrics_log.close()
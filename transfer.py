@@ -0,0 +1,103 @@
+import argparse
+import itertools
+
+import qtable
+from enemies import Enemy
+from rogue import Rogue
+from sarsa import SARSA
+
+
+class TableMapping:
+    # How a new role reads a trained role's Q-table. factors[i] is the index
+    # of the source state factor that target factor i is read from (values
+    # are matched by name), or None for a factor the source doesn't have:
+    # every value of it gets the same row. actions maps each target action
+    # to the source action whose value it starts from; unmapped actions
+    # start at zero.
+    def __init__(self, source, target, source_codec, target_codec, factors, actions):
+        self.source = source
+        self.target = target
+        self.source_codec = source_codec
+        self.target_codec = target_codec
+        self.factors = factors
+        self.actions = actions
+        if len(factors) != len(target_codec.factors):
+            raise ValueError(f"{target} has {len(target_codec.factors)} state factors, "
+                             f"the mapping declares {len(factors)}")
+        unknown = set(actions) - set(SARSA.ACTIONS[target])
+        unknown |= set(actions.values()) - set(SARSA.ACTIONS[source])
+        if unknown:
+            raise ValueError(f"Unknown actions in {source} -> {target} mapping: {sorted(unknown)}")
+
+    def target_states(self, source_values):
+        # Every target state that reads from the source state with these values
+        choices = []
+        for values, source_index in zip(self.target_codec.factors, self.factors):
+            if source_index is None:
+                choices.append(values)
+            elif source_values[source_index] in values:
+                choices.append((source_values[source_index],))
+            else:
+                return []
+        return ["_".join(values) for values in itertools.product(*choices)]
+
+
+MAPPINGS = {
+    # The rogue sees everything the archer does, plus whether the player is
+    # swinging. Its thrown dagger is the archer's shot; the stab has no
+    # counterpart and starts at zero like in a fresh table (copying the shot
+    # into it as well made the warm rogue stab less and learn slower).
+    ("enemy", "rogue"): TableMapping(
+        "enemy", "rogue", Enemy.state_codec, Rogue.state_codec,
+        factors=[0, 1, 2, 3, 4, 5, 6, 7, None],
+        actions={"move_left": "move_left", "move_right": "move_right",
+                 "far_attack": "shoot", "idle": "idle"},
+    ),
+}
+
+
+def transfer_q_table(source_table, mapping, scale=1.0):
+    # Returns a new target-role table built from source_table's rows; states
+    # the source never visited stay out of it, as in a fresh table
+    target_actions = SARSA.ACTIONS[mapping.target]
+    table = {}
+    for state, row in source_table.items():
+        values = mapping.source_codec.parse(state)
+        if values is None:
+            continue
+        target_row = {a: scale * row.get(mapping.actions[a], 0) if a in mapping.actions else 0
+                      for a in target_actions}
+        for target_state in mapping.target_states(values):
+            table[target_state] = dict(target_row)
+    return table
+
+
+def warm_start(sarsa, source_table, source, scale=1.0):
+    # Replaces sarsa's table with one transferred from `source`'s
+    mapping = MAPPINGS[(source, sarsa.character_type)]
+    sarsa.q_table = transfer_q_table(source_table, mapping, scale)
+    sarsa.visit_counts = {}
+    return len(sarsa.q_table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm-start a role's Q-table from another role's")
+    parser.add_argument("source", choices=sorted({s for s, _ in MAPPINGS}))
+    parser.add_argument("target", choices=sorted({t for _, t in MAPPINGS}))
+    parser.add_argument("--checkpoint", help="source checkpoint (default: the latest one)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for the transferred values")
+    args = parser.parse_args()
+
+    if (args.source, args.target) not in MAPPINGS:
+        raise SystemExit(f"No mapping from {args.source} to {args.target}")
+    if args.checkpoint:
+        source_table, _ = qtable.load_checkpoint(args.checkpoint)
+    else:
+        source_table = SARSA(character_type=args.source).q_table
+    if not source_table:
+        raise SystemExit(f"No {args.source} Q-table to transfer from")
+    SARSA.load_checkpoints = False
+    target = SARSA(character_type=args.target)
+    states = warm_start(target, source_table, args.source, args.scale)
+    print(f"Transferred {len(source_table)} {args.source} states to {states} {args.target} states")
+    target.save_q_table()
@@ -0,0 +1,66 @@
+import argparse
+
+import numpy as np
+
+from offline_trainer import OfflineTrainer
+from recorder import TrajectoryReader
+
+
+class DemoPretrainer(OfflineTrainer):
+    # Warm-starts an agent from human demonstrations recorded with
+    # main.py --demo ROLE. Offline SARSA over the demonstrated transitions
+    # values the human's policy, then an action prior lifts each
+    # demonstrated action by `prior` times the share of the time the human
+    # chose it in that state, so the greedy policy starts out imitating.
+    def __init__(self, character_type, prior=1.0, **kwargs):
+        super().__init__(character_type, **kwargs)
+        self.prior = prior
+        self.counts = np.zeros(self.q.shape, dtype=np.uint32)
+
+    def demo_paths(self, paths):
+        demos = []
+        for path in paths:
+            demonstrator = TrajectoryReader(path).meta.get("demonstrator")
+            if demonstrator == self.character_type:
+                demos.append(path)
+            else:
+                print(f"Skipping {path}: not a {self.character_type} demonstration")
+        return demos
+
+    def count_actions(self, reader, chunk_size=1 << 20):
+        for chunk in reader.chunks(chunk_size):
+            rows = chunk[(chunk["entity"] == self.entity) & (chunk["state"] >= 0) &
+                         (chunk["decision"] >= 0) & (chunk["alive"] == 1)]
+            np.add.at(self.counts, (rows["state"], rows["decision"]), 1)
+
+    def apply_prior(self):
+        totals = self.counts.sum(axis=1)
+        seen = totals > 0
+        self.q[seen] += self.prior * self.counts[seen] / totals[seen, None]
+        self.touched[seen] = True
+        return int(seen.sum())
+
+    def pretrain(self, paths, epochs=1, batch_size=4096):
+        demos = self.demo_paths(paths)
+        for path in demos:
+            self.count_actions(TrajectoryReader(path))
+        self.train(demos, epochs=epochs, batch_size=batch_size)
+        states = self.apply_prior()
+        print(f"Action prior applied to {states} demonstrated states "
+              f"({int(self.counts.sum())} decisions from {len(demos)} files)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm-start a Q-table from human demonstrations")
+    parser.add_argument("character_type", choices=["enemy", "knight", "bird"])
+    parser.add_argument("paths", nargs="+", help="recordings made with main.py --demo")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--prior", type=float, default=5.0,
+                        help="Q-value bonus for an action the human always chose in a state")
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--gamma", type=float, default=0.9)
+    args = parser.parse_args()
+
+    trainer = DemoPretrainer(args.character_type, prior=args.prior, alpha=args.alpha, gamma=args.gamma)
+    trainer.pretrain(args.paths, epochs=args.epochs)
+    trainer.save()